@@ -0,0 +1,7 @@
+from symserver import config
+from symserver import warmup
+from symserver.asgi import app
+
+# like wsgi.py, with gunicorn's preload_app this runs once, in the master, before it forks the workers
+if config.WARMUP:
+    warmup.warm_up()
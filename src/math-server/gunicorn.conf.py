@@ -0,0 +1,21 @@
+# gunicorn settings, used by boot.sh
+
+import os
+import tempfile
+
+bind = '0.0.0.0:5000'
+accesslog = '-'
+errorlog = '-'
+
+# import the app, and warm it up (see wsgi.py), once in the master. The workers
+# are forked from it and share the warm state copy on write.
+preload_app = True
+
+# the workers share their metrics through files, so /metrics covers all of them (see symserver/metrics.py)
+os.environ.setdefault('SYMSERVER_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'symserver-metrics'))
+
+
+def on_starting(server):
+    # forget the metrics of the previous run's workers
+    from symserver import metrics
+    metrics.clear_directory()
@@ -1,4 +1,8 @@
+from symserver import config
+from symserver import warmup
 from symserver.app import app
 
 if __name__ == '__main__':
+    if config.WARMUP:
+        warmup.start()
     app.run(debug=True, host='0.0.0.0', port=5000)
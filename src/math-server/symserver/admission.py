@@ -0,0 +1,332 @@
+"""
+Admission control in front of the computations of handle_request.
+
+Every job which isn't answered from the cache gets a cost, an estimate of
+the seconds it computes for: the seconds similar jobs took before, or
+without any a prior from the operation and the size of the expression
+(for expandExpr and factorExpr, the number of terms it expands to). Then
+
+- jobs estimated over ADMISSION_MAX_COST are refused with a 413,
+- a client with ADMISSION_CLIENT_LIMIT jobs computing or waiting, or any
+  job while ADMISSION_MAX_BACKLOG seconds of work are waiting, is refused
+  with a 429,
+- the rest wait for one of ADMISSION_SLOTS computations per process. The
+  waiting jobs are admitted by arrival time plus cost, so cheap jobs go
+  ahead of expensive ones which arrived shortly before, but not of ones
+  which have waited longer than their cost difference.
+"""
+
+import collections
+import contextlib
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError
+from symserver import config
+from symserver import errors
+from symserver import metrics
+from symserver import sizes
+from symserver.cache import LRUCache
+
+# operation -> (seconds, seconds per unit of size), the prior of estimate
+OPERATION_COSTS = {
+    'derivative': (0.001, 0.00002),
+    'gradient': (0.002, 0.0001),
+    'jacobian': (0.002, 0.0001),
+    'hessian': (0.005, 0.0002),
+    'integral': (0.05, 0.005),
+    'solveFor': (0.02, 0.002),
+    'expandExpr': (0.001, 0.0005),
+    'simplifyExpr': (0.02, 0.002),
+    'factorExpr': (0.005, 0.0001),
+    'evaluate': (0.005, 0.0001),
+    'sample': (0.01, 0.0002),
+}
+DEFAULT_COST = (0.01, 0.001)
+
+# operations whose size is the number of terms of the expanded expression
+EXPANDING = ('expandExpr', 'factorExpr')
+
+# weight of a new latency in the running average of its operation and size
+HISTORY_WEIGHT = 0.2
+
+
+def client_id(headers, remote_addr):
+    """The client a request counts against, named by ADMISSION_CLIENT_HEADER or else by its address."""
+
+    if config.ADMISSION_CLIENT_HEADER:
+        client = headers.get(config.ADMISSION_CLIENT_HEADER)
+        if client:
+            return client
+    return remote_addr
+
+
+@contextlib.contextmanager
+def admitted(job):
+    """
+    Waits in the block until the job may compute, raises RequestTooExpensive,
+    TooManyRequests, or ServerBusy when no slot frees up in time. Records how
+    long the block took for later estimates.
+    """
+
+    ticket = submit(job)
+    if ticket is None:
+        yield
+        return
+
+    wait(ticket, job)
+
+    # a block interrupted by e.g. KeyboardInterrupt frees its slot too, but isn't a latency
+    start = time.monotonic()
+    seconds, exception = None, None
+    try:
+        yield
+        seconds = time.monotonic() - start
+    except Exception as e:
+        seconds, exception = time.monotonic() - start, e
+        raise
+    finally:
+        release(ticket, job, seconds, exception)
+
+
+def submit(job):
+    """
+    Queues the job, returns its Ticket, None when admission control is off.
+    Raises RequestTooExpensive or TooManyRequests.
+    """
+
+    if not config.ADMISSION:
+        return None
+    return get_scheduler().submit(estimate(job), job.client)
+
+
+def wait(ticket, job):
+    """
+    Blocks until the ticket's job may compute. Releases the ticket and raises
+    ServerBusy when no slot frees up within ADMISSION_QUEUE_TIMEOUT.
+    """
+
+    if ticket is None:
+        return
+
+    try:
+        ticket.future.result(config.ADMISSION_QUEUE_TIMEOUT or None)
+    except TimeoutError:
+        release(ticket, job)
+        raise errors.ServerBusy('No computation slot became available for the request.')
+    except BaseException:
+        release(ticket, job)
+        raise
+
+
+def release(ticket, job, seconds=None, exception=None):
+    """Frees the ticket's slot and remembers the `seconds` the job computed for."""
+
+    if ticket is None:
+        return
+
+    # a computation which ran out of time took at least as long, a repeat waits behind cheaper requests
+    if seconds is not None and (exception is None or isinstance(exception, errors.ComputationTimeout)):
+        history.record(job, seconds)
+    get_scheduler().release(ticket)
+
+
+def check(job):
+    """Raises RequestTooExpensive for jobs estimated over the limit, e.g. the requests of a batch."""
+
+    if config.ADMISSION:
+        get_scheduler().check(estimate(job))
+
+
+def estimate(job):
+    """The seconds the job is expected to compute for."""
+
+    seconds = history.lookup(job)
+    if seconds is not None:
+        return seconds
+
+    base, per_unit = OPERATION_COSTS.get(job.operation, DEFAULT_COST)
+    return base + per_unit * size(job)
+
+
+def size(job):
+    """The size costs grow with: nodes of the expression, or terms it expands to weighted by their digits."""
+
+    if job.operation in EXPANDING:
+        return sizes.expansion_cost(job.form.expr)
+    return job.size or 1
+
+
+class History(object):
+    """Seconds jobs computed for, by Job.key and running averages by operation and size."""
+
+    def __init__(self, max_size):
+        self.by_key = LRUCache(max_size)
+        self.by_size = {}  # (operation, log2 of size) -> average seconds
+        self._lock = threading.Lock()
+
+    def record(self, job, seconds):
+        self.by_key.put(job.key, seconds)
+        bucket = _bucket(job)
+        with self._lock:
+            average = self.by_size.get(bucket)
+            self.by_size[bucket] = seconds if average is None else average + HISTORY_WEIGHT * (seconds - average)
+
+    def lookup(self, job):
+        seconds = self.by_key.get(job.key)
+        if seconds is None:
+            seconds = self.by_size.get(_bucket(job))
+        return seconds
+
+    def clear(self):
+        self.by_key.clear()
+        with self._lock:
+            self.by_size.clear()
+
+
+def _bucket(job):
+    return job.operation, int(math.log2(size(job)))
+
+
+history = History(config.ADMISSION_HISTORY_SIZE)
+
+
+class Ticket(object):
+    """A job's place in a Scheduler, its future resolves once it may compute."""
+
+    def __init__(self, cost, client, priority):
+        self.cost = cost
+        self.client = client
+        self.priority = priority
+        self.state = 'waiting'  # waiting, running or done
+        self.future = Future()
+
+
+class Scheduler(object):
+    """
+    Admits jobs to `slots` computations at a time, the waiting ones by
+    priority, and refuses ones over the cost, backlog and per client limits
+    (see the module's docstring). Callers must release every ticket they get,
+    whether it was admitted or not.
+    """
+
+    def __init__(self, slots, max_cost=None, max_backlog=None, client_limit=None, clock=time.monotonic):
+        self.slots = slots
+        self.max_cost = max_cost
+        self.max_backlog = max_backlog
+        self.client_limit = client_limit
+        self.clock = clock
+        self.pid = os.getpid()
+        self._running = 0
+        self._waiting = []  # heap of (priority, sequence, ticket)
+        self._backlog = 0.0  # estimated seconds of the waiting tickets
+        self._clients = collections.Counter()  # client -> tickets not yet released
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, cost, client=None):
+        """Returns a Ticket, or raises RequestTooExpensive or TooManyRequests."""
+
+        self.check(cost)
+
+        with self._lock:
+            if client is not None and self.client_limit and self._clients[client] >= self.client_limit:
+                raise errors.TooManyRequests(
+                    'The client already has ' + str(self.client_limit) + ' requests computing, retry later.')
+            if self.max_backlog and self._backlog > 0 and self._backlog + cost > self.max_backlog:
+                raise errors.TooManyRequests('The server is overloaded, retry later.')
+
+            ticket = Ticket(cost, client, self.clock() + cost)
+            self._clients[client] += 1
+            heapq.heappush(self._waiting, (ticket.priority, next(self._sequence), ticket))
+            self._backlog += cost
+            self._admit()
+
+        return ticket
+
+    def check(self, cost):
+        if self.max_cost and cost > self.max_cost:
+            raise errors.RequestTooExpensive(
+                'The request is estimated to take ' + _seconds(cost) + ', more than the limit of '
+                + _seconds(self.max_cost) + '.')
+
+    def release(self, ticket):
+        with self._lock:
+            if ticket.state == 'done':
+                return
+            if ticket.state == 'running':
+                self._running -= 1
+            else:
+                self._backlog -= ticket.cost  # its heap entry is skipped by _admit
+            ticket.state = 'done'
+
+            self._clients[ticket.client] -= 1
+            if not self._clients[ticket.client]:
+                del self._clients[ticket.client]
+            self._admit()
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                running=self._running,
+                waiting=sum(1 for _, _, ticket in self._waiting if ticket.state == 'waiting'),
+                backlog=self._backlog,
+                clients=len(self._clients),
+            )
+
+    def _admit(self):
+        # caller must hold the lock
+        while self._waiting and self._running < self.slots:
+            _, _, ticket = heapq.heappop(self._waiting)
+            if ticket.state != 'waiting':
+                continue
+            self._backlog -= ticket.cost
+            if not self._waiting:
+                self._backlog = 0.0  # no float drift when the queue empties
+
+            ticket.state = 'running'
+            self._running += 1
+            # the waiter may have stopped waiting, e.g. an asyncio wrapper of the future was cancelled,
+            # its slot is free once it releases the ticket
+            if ticket.future.set_running_or_notify_cancel():
+                ticket.future.set_result(None)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """This process' Scheduler. A forked process starts its own, with none of its parent's jobs."""
+
+    global _scheduler
+
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler.pid != os.getpid():
+            _scheduler = Scheduler(
+                config.ADMISSION_SLOTS or (config.POOL_SIZE if config.POOL_SIZE > 0 else os.cpu_count() or 1),
+                max_cost=config.ADMISSION_MAX_COST,
+                max_backlog=config.ADMISSION_MAX_BACKLOG,
+                client_limit=config.ADMISSION_CLIENT_LIMIT,
+            )
+
+    return _scheduler
+
+
+def _scheduler_gauge(name):
+    def gauge():
+        scheduler = _scheduler
+        return scheduler.stats()[name] if scheduler is not None and scheduler.pid == os.getpid() else 0
+    return gauge
+
+
+metrics.registry.gauge('symserver_admission_waiting', _scheduler_gauge('waiting'))
+metrics.registry.gauge('symserver_admission_backlog_seconds', _scheduler_gauge('backlog'))
+
+
+def _seconds(seconds):
+    return '%.3g seconds' % seconds
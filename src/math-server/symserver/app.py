@@ -1,27 +1,66 @@
+from symserver import admission
+from symserver import batch
+from symserver import engine
+from symserver import errors
+from symserver import metrics
 from symserver import operations
-from flask import request, jsonify
-from flask_api import FlaskAPI, status, exceptions
+from symserver import profiling
+from symserver import warmup
+from flask import request, jsonify, Response, stream_with_context
+from flask_api import FlaskAPI, status
 from flask_cors import CORS
 
 
-app = FlaskAPI(__name__)
+class SymServer(FlaskAPI):
+
+    def handle_api_exception(self, exc):
+        # FlaskAPI renders these itself as {'message': ...}, use the same format as other exceptions
+        return handle_error(exc)
+
+
+app = SymServer(__name__)
 CORS(app)
 
 
 @app.route('/', methods=['POST'])
 @app.route('/api/math', methods=['POST'])
 def do_math():
-    return operations.handle_request(request.get_json())
+    return operations.handle_request(request.get_json(), executor=engine.get_executor(),
+                                     profile=profiling.requested(request.headers),
+                                     client=admission.client_id(request.headers, request.remote_addr))
+
+
+@app.route('/api/math/batch', methods=['POST'])
+def do_math_batch():
+    client = admission.client_id(request.headers, request.remote_addr)
+    if wants_stream():
+        lines = batch.stream_batch(request.get_json(), pool=engine.get_pool(), client=client)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    return batch.handle_batch(request.get_json(), pool=engine.get_pool(), client=client)
+
+
+def wants_stream():
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == 'application/x-ndjson'
 
 
 @app.route('/_health', methods=['GET'])
 def health_check():
-    return '', status.HTTP_200_OK
+    # not ready until the warm-up finished, see warmup.py
+    if not warmup.is_ready():
+        return dict(ready=False), status.HTTP_503_SERVICE_UNAVAILABLE
+
+    return dict(ready=True, warmup=warmup.timings()), status.HTTP_200_OK
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.errorhandler(Exception)
 def handle_error(e):
-    code = 500
-    if isinstance(e, exceptions.APIException):
-        code = e.status_code
-    return jsonify(error=str(e)), code
+    body, code = errors.describe(e)
+    return jsonify(**body), code
@@ -0,0 +1,78 @@
+import base64
+import binascii
+import numpy
+from symserver import errors
+
+# how results of numeric operations are sent back
+ENCODINGS = ('base64', 'json')
+
+# dtypes columns may be sent in, they are evaluated as float64
+DTYPES = ('float64', 'float32', 'int64', 'int32')
+
+
+def decode(value, name):
+    """
+    Decodes a column of numbers sent either as a JSON list, or compactly as
+    {"dtype": "float64", "data": "<base64 of the little endian values>"}.
+    """
+
+    if isinstance(value, list):
+        try:
+            column = numpy.array(value, dtype=numpy.float64)
+        except (TypeError, ValueError):
+            raise errors.InvalidParams('values of \'' + name + '\' must be numbers.')
+
+    elif isinstance(value, dict):
+        dtype = value.get('dtype', 'float64')
+        if dtype not in DTYPES:
+            raise errors.InvalidParams('dtype of \'' + name + '\' must be one of ' + ', '.join(DTYPES) + '.')
+
+        try:
+            raw = base64.b64decode(value.get('data') or '', validate=True)
+        except (binascii.Error, TypeError):
+            raise errors.InvalidParams('data of \'' + name + '\' must be base64 encoded.')
+
+        dtype = numpy.dtype(dtype).newbyteorder('<')
+        if len(raw) % dtype.itemsize:
+            raise errors.InvalidParams('data of \'' + name + '\' is not a whole number of ' + str(dtype) + ' values.')
+        column = numpy.frombuffer(raw, dtype=dtype).astype(numpy.float64)
+
+    else:
+        raise errors.InvalidParams('values of \'' + name + '\' must be a list or an encoded array.')
+
+    if column.ndim != 1:
+        raise errors.InvalidParams('values of \'' + name + '\' must be a flat list.')
+
+    return column
+
+
+def encode(array, encoding='base64'):
+    """
+    Encodes an array of float64 or complex128 results. Complex values are
+    sent as (real, imaginary) pairs.
+    """
+
+    is_complex = numpy.iscomplexobj(array)
+    dtype = 'complex128' if is_complex else 'float64'
+    array = numpy.ascontiguousarray(array, dtype=numpy.dtype(dtype).newbyteorder('<'))
+
+    if encoding == 'json':
+        if is_complex:
+            pairs = numpy.stack([array.real, array.imag], axis=-1)
+            values = _finite_or_none(pairs)
+        else:
+            values = _finite_or_none(array)
+        return dict(dtype=dtype, shape=list(array.shape), values=values)
+
+    return dict(
+        dtype=dtype,
+        shape=list(array.shape),
+        data=base64.b64encode(array.tobytes()).decode('ascii'),
+    )
+
+
+def _finite_or_none(array):
+    # JSON has no NaN or Infinity
+    values = array.astype(object)
+    values[~numpy.isfinite(array)] = None
+    return values.tolist()
@@ -0,0 +1,401 @@
+"""
+The routes of app.py as an asyncio (ASGI) application, e.g. for
+
+    gunicorn --config gunicorn.conf.py --worker-class uvicorn.workers.UvicornWorker asgi:app
+
+A process holds thousands of connections open at once. Requests are parsed,
+looked up in the result cache (which may read the disk store) and rendered
+in threads, so a large expression doesn't stall every other connection.
+Computations are done by the worker pool (see engine.py) and the loop awaits
+the pool's futures instead of a thread blocking on each. Identical requests
+computing at the same time await the same future. Without a pool the
+synchronous code runs in threads too. Batches block on the futures of their
+items, so they run in BATCH_THREADS threads of their own and never hold the
+threads single requests are parsed and rendered in.
+
+The responses are the same as app.py's.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from symserver import admission
+from symserver import batch
+from symserver import config
+from symserver import engine
+from symserver import errors
+from symserver import metrics
+from symserver import operations
+from symserver import profiling
+from symserver import warmup
+
+# Job.key -> asyncio.Future of the canonical result, of the jobs being computed
+_computing = {}
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    request = await _read_request(scope, receive)
+
+    try:
+        response = await _dispatch(request)
+    except Exception as e:
+        response = _error(e)
+
+    if 'origin' in request.headers:
+        response.headers.append(('access-control-allow-origin', '*'))
+    await response.send(send)
+
+
+async def do_math(request):
+    return _json(await handle_request(request.json(), profile=profiling.requested(request.headers),
+                                      client=admission.client_id(request.headers, request.client)))
+
+
+async def do_math_batch(request):
+    # batches block on futures, one thread of the batch executor each
+    loop = asyncio.get_event_loop()
+    executor = get_batch_executor()
+    batch_json = request.json()
+    client = admission.client_id(request.headers, request.client)
+
+    if _wants_stream(request):
+        lines = await loop.run_in_executor(
+            executor, lambda: batch.stream_batch(batch_json, pool=engine.get_pool(), client=client))
+        return Response(200, 'application/x-ndjson', chunks=_iterate_in_thread(lines, executor))
+
+    return _json(await loop.run_in_executor(
+        executor, lambda: batch.handle_batch(batch_json, pool=engine.get_pool(), client=client)))
+
+
+def get_batch_executor():
+    """
+    Returns this process' executor for batches, with BATCH_THREADS threads.
+    Threads don't survive a fork, so a forked process starts its own.
+    """
+
+    global _batch_executor
+
+    with _batch_executor_lock:
+        if _batch_executor is None or _batch_executor.pid != os.getpid():
+            _batch_executor = ThreadPoolExecutor(max(1, config.BATCH_THREADS), thread_name_prefix='symserver-batch')
+            _batch_executor.pid = os.getpid()
+
+    return _batch_executor
+
+
+async def health_check(request):
+    # not ready until the warm-up finished, see warmup.py
+    if not warmup.is_ready():
+        return _json(dict(ready=False), 503)
+
+    return _json(dict(ready=True, warmup=warmup.timings()))
+
+
+async def metrics_endpoint(request):
+    return Response(200, 'text/plain; version=0.0.4', metrics.render().encode())
+
+
+ROUTES = {
+    '/': {'POST': do_math},
+    '/api/math': {'POST': do_math},
+    '/api/math/batch': {'POST': do_math_batch},
+    '/_health': {'GET': health_check},
+    '/metrics': {'GET': metrics_endpoint},
+}
+
+
+async def handle_request(request_json, profile=False, client=None):
+    """
+    operations.handle_request, awaiting the computation instead of blocking
+    on it. Parsing, cache lookups and printing run in threads.
+    """
+
+    loop = asyncio.get_event_loop()
+    operation = request_json.get('operation') if isinstance(request_json, dict) else None
+    label = operation if operation in operations.OPERATIONS else 'unknown'
+    start = time.monotonic()
+
+    try:
+        job, result = await loop.run_in_executor(None, _prepare, request_json, label, profile, client)
+
+        if result is None:
+            result = await _compute(job, label)
+
+        response = await loop.run_in_executor(None, _respond, job, result, label)
+        if job.profile_report is not None:
+            response['profile'] = job.profile_report
+        return response
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        with metrics.labelled(label):
+            metrics.count_error(e)
+        raise
+    finally:
+        metrics.record_request(label, time.monotonic() - start)
+
+
+def _prepare(request_json, label, profile, client):
+    # the job and its cached result, None when it's to be computed
+    with metrics.labelled(label):
+        job = operations.prepare(request_json)
+        job.profile = profile
+        job.client = client
+        return job, operations.cached_result(job) if not profile else None
+
+
+def _respond(job, result, label):
+    with metrics.labelled(label):
+        return operations.respond(job, result)
+
+
+async def _compute(job, label):
+    # like operations.run, but coalescing identical jobs only within this process
+    shared = config.SINGLE_FLIGHT and job.operation in config.RESULT_CACHE_OPERATIONS and not job.profile
+
+    future = _computing.get(job.key) if shared else None
+    if future is None:
+        future = asyncio.ensure_future(_admit_and_submit(job, label))
+        if shared:
+            _computing[job.key] = future
+            future.add_done_callback(lambda done: _forget(job.key, done))
+
+    # a client hanging up mustn't cancel the computation others await
+    return await asyncio.shield(future)
+
+
+async def _admit_and_submit(job, label):
+    ticket = await _admit(job)
+    return await _submit(job, label, ticket)
+
+
+def _forget(key, future):
+    if _computing.get(key) is future:
+        del _computing[key]
+
+
+async def _admit(job):
+    # admission.admitted, awaiting the slot
+    ticket = admission.submit(job)
+    if ticket is None:
+        return None
+
+    try:
+        await asyncio.wait_for(asyncio.wrap_future(ticket.future), config.ADMISSION_QUEUE_TIMEOUT or None)
+    except asyncio.TimeoutError:
+        admission.release(ticket, job)
+        raise errors.ServerBusy('No computation slot became available for the request.')
+    except BaseException:
+        admission.release(ticket, job)
+        raise
+    return ticket
+
+
+async def _submit(job, label, ticket=None):
+    # the job's result, computed by the pool or in a thread without one.
+    # Storing the result and releasing the ticket happen off the loop and the pool's dispatch thread
+    loop = asyncio.get_event_loop()
+    pool = engine.get_pool()
+
+    if pool is None:
+        return await loop.run_in_executor(None, _execute, job, label, ticket)
+
+    start = time.monotonic()
+    result, error = None, None
+    try:
+        result = await asyncio.wrap_future(pool.submit(job), loop=loop)
+    except asyncio.CancelledError:
+        admission.release(ticket, job)
+        raise
+    except Exception as e:
+        error = e
+
+    # waiters are answered once the result is stored, so new requests find it
+    await loop.run_in_executor(None, _finish, job, label, ticket, time.monotonic() - start, result, error)
+    if error is not None:
+        raise error
+    return result
+
+
+def _execute(job, label, ticket):
+    start = time.monotonic()
+    try:
+        with metrics.labelled(label):
+            result = operations.execute(job)
+    except Exception as e:
+        _finish(job, label, ticket, time.monotonic() - start, error=e)
+        raise
+    _finish(job, label, ticket, time.monotonic() - start, result=result)
+    return result
+
+
+def _finish(job, label, ticket, seconds, result=None, error=None):
+    with metrics.labelled(label):
+        metrics.observe('symserver_phase_seconds', seconds, phase='compute')
+        if error is None:
+            operations.store_result(job, result)
+    admission.release(ticket, job, seconds, error)
+
+
+async def _iterate_in_thread(iterator, executor=None):
+    # the items of a blocking iterator, each taken in a thread of the executor
+    loop = asyncio.get_event_loop()
+    done = object()
+    while True:
+        item = await loop.run_in_executor(executor, next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+class Request(object):
+
+    def __init__(self, method, path, query, headers, body, client=None):
+        self.method = method
+        self.path = path
+        self.query = query  # name -> list of values
+        self.headers = headers
+        self.body = body
+        self.client = client  # the peer's address
+
+    def json(self):
+        """The JSON body, None without one, like Flask's get_json."""
+
+        if not self.body or 'json' not in self.headers.get('content-type', ''):
+            return None
+        try:
+            return json.loads(self.body.decode('utf-8'))
+        except ValueError:
+            raise errors.InvalidParams('The request body is not valid JSON.')
+
+
+class Headers(dict):
+    """Request headers, looked up regardless of case."""
+
+    def get(self, name, default=None):
+        return dict.get(self, name.lower(), default)
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name.lower())
+
+
+class Response(object):
+
+    def __init__(self, status, content_type, body=b'', chunks=None):
+        self.status = status
+        self.headers = [('content-type', content_type)]
+        self.body = body
+        self.chunks = chunks  # async iterator of str, streamed instead of body
+
+    async def send(self, send):
+        await send(dict(
+            type='http.response.start',
+            status=self.status,
+            headers=[(name.encode('latin-1'), value.encode('latin-1')) for name, value in self.headers],
+        ))
+
+        if self.chunks is not None:
+            async for chunk in self.chunks:
+                await send(dict(type='http.response.body', body=chunk.encode('utf-8'), more_body=True))
+        await send(dict(type='http.response.body', body=self.body))
+
+
+async def _dispatch(request):
+    methods = ROUTES.get(request.path)
+    if methods is None:
+        return _json(dict(error='Not found.', errorType='NotFound'), 404)
+
+    if request.method == 'OPTIONS':
+        return _preflight(request, methods)
+
+    handler = methods.get(request.method)
+    if handler is None:
+        return _json(dict(error='Method not allowed.', errorType='MethodNotAllowed'), 405)
+
+    return await handler(request)
+
+
+async def _read_request(scope, receive):
+    body = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+
+    return Request(
+        method=scope['method'],
+        path=scope['path'],
+        query=urllib.parse.parse_qs(scope.get('query_string', b'').decode('latin-1')),
+        headers=Headers((name.decode('latin-1').lower(), value.decode('latin-1'))
+                        for name, value in scope.get('headers', [])),
+        body=b''.join(body),
+        client=scope['client'][0] if scope.get('client') else None,
+    )
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send(dict(type='lifespan.startup.complete'))
+        elif message['type'] == 'lifespan.shutdown':
+            await send(dict(type='lifespan.shutdown.complete'))
+            return
+
+
+def _wants_stream(request):
+    if request.query.get('stream', [''])[0].lower() in ('1', 'true', 'yes'):
+        return True
+    return _best_accepted(request.headers.get('accept', '')) == 'application/x-ndjson'
+
+
+def _best_accepted(accept):
+    # the media type of an Accept header with the highest quality, the first of equals
+    best, best_quality = None, 0
+    for item in accept.split(','):
+        media_type, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if media_type and quality > best_quality:
+            best, best_quality = media_type.strip(), quality
+    return best
+
+
+def _preflight(request, methods):
+    response = Response(200, 'text/plain')
+    response.headers.append(('access-control-allow-methods', ', '.join(sorted(methods) + ['OPTIONS'])))
+    requested_headers = request.headers.get('access-control-request-headers')
+    if requested_headers:
+        response.headers.append(('access-control-allow-headers', requested_headers))
+    return response
+
+
+def _json(body, status=200):
+    return Response(status, 'application/json', json.dumps(body).encode('utf-8'))
+
+
+def _error(e):
+    body, code = errors.describe(e)
+    return _json(body, code)
@@ -0,0 +1,210 @@
+import collections
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import wait
+from symserver import admission
+from symserver import config
+from symserver import errors
+from symserver import metrics
+from symserver import operations
+
+
+def handle_batch(batch_json, pool=None, client=None):
+    """
+    Computes a list of requests in the handle_request format. Identical
+    requests are computed once and the rest are spread over the pool's
+    workers, admitted like single requests of `client` (see admission.py)
+    and at most BATCH_STREAM_WINDOW at a time. Returns a result or an error
+    for every request, in input order.
+    """
+
+    with metrics.request('batch'):
+        jobs = prepare_batch(batch_json, client=client)
+        results = [None] * len(jobs)
+        for index, response in _responses(jobs, pool, _window(pool)):
+            results[index] = response
+
+        return dict(results=results)
+
+
+def stream_batch(batch_json, pool=None, window=None, client=None):
+    """
+    Like handle_batch, but returns a generator of NDJSON lines, one per
+    request as soon as its result is ready, tagged with the request's index.
+    At most `window` distinct requests are computed at a time so memory
+    stays flat however large the batch is. Without a pool they're computed
+    one at a time, each yielded before the next starts.
+    """
+
+    start = time.monotonic()
+    try:
+        with metrics.labelled('batch'):
+            jobs = prepare_batch(batch_json, client=client)
+    except Exception as e:
+        with metrics.labelled('batch'):
+            metrics.count_error(e)
+        metrics.record_request('batch', time.monotonic() - start)
+        raise
+    window = _window(pool, window)
+
+    def generate():
+        # the request lasts until its last line is sent, or the client hangs up
+        try:
+            for index, response in _responses(jobs, pool, window):
+                yield _line(index, response)
+        finally:
+            metrics.record_request('batch', time.monotonic() - start)
+
+    return generate()
+
+
+def _window(pool, window=None):
+    # without a pool the jobs are computed as they're submitted
+    if pool is None:
+        return 1
+    return window or config.BATCH_STREAM_WINDOW
+
+
+def _responses(jobs, pool, window):
+    # (index, response) of every job, as soon as each is ready
+    indices = {}  # requests sharing a key are answered together
+    for index, job in enumerate(jobs):
+        if isinstance(job, Exception):
+            yield index, _error_response(job)
+        else:
+            indices.setdefault(_share_key(job), []).append(index)
+
+    pending = collections.deque(indices)
+    running = {}  # future -> key
+
+    while pending or running:
+        while pending and len(running) < window:
+            key = pending[0]
+            try:
+                future = _submit(jobs[indices[key][0]], pool)
+            except errors.TooManyRequests as e:
+                if running:
+                    break  # over the client's limit, retried once one of the batch's jobs finished
+                future = _resolved(exception=e)
+            pending.popleft()
+            running[future] = key
+
+        done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            key = running.pop(future)
+            futures = {key: future}
+            for index in indices.pop(key):
+                yield index, item_response(jobs[index], futures)
+                jobs[index] = None  # done with it, let it be collected
+
+
+def prepare_batch(batch_json, client=None):
+    """
+    Returns a Job for every request in the batch, or the exception which
+    made the request invalid. The jobs count against `client`'s limits.
+    """
+
+    # a list of requests, optionally wrapped like {"requests": [...]}
+    if isinstance(batch_json, dict):
+        batch_json = batch_json.get('requests')
+
+    if not isinstance(batch_json, list):
+        raise errors.InvalidParams('A list of requests is required.')
+
+    if len(batch_json) > config.BATCH_MAX_SIZE:
+        raise errors.InvalidParams('A batch may contain at most ' + str(config.BATCH_MAX_SIZE) + ' requests.')
+
+    return [_prepare(request_json, client) for request_json in batch_json]
+
+
+def item_response(job, futures):
+    if isinstance(job, Exception):
+        return _error_response(job)
+
+    try:
+        return operations.respond(job, futures[_share_key(job)].result())
+    except Exception as e:
+        return _error_response(e)
+
+
+def _prepare(request_json, client):
+    try:
+        if not isinstance(request_json, dict):
+            raise errors.InvalidParams('Every request in a batch must be an object.')
+        job = operations.prepare(request_json)
+        job.client = client
+        admission.check(job)
+        return job
+    except Exception as e:
+        return e
+
+
+def _share_key(job):
+    # identical requests are computed once, but the keys of uncached operations leave out their inputs
+    if job.operation in config.RESULT_CACHE_OPERATIONS:
+        return job.key
+    return job
+
+
+def _submit(job, pool):
+    # a Future of the job's result, once it's admitted. Raises TooManyRequests when it's refused
+    result = operations.cached_result(job)
+    if result is not None:
+        return _resolved(result=result)
+
+    if pool is None:
+        try:
+            with admission.admitted(job):
+                result = operations.execute(job)
+        except errors.TooManyRequests:
+            raise
+        except Exception as e:
+            return _resolved(exception=e)
+        operations.store_result(job, result)
+        return _resolved(result=result)
+
+    try:
+        ticket = admission.submit(job)
+        admission.wait(ticket, job)
+    except errors.TooManyRequests:
+        raise
+    except Exception as e:
+        return _resolved(exception=e)
+
+    start = time.monotonic()
+    try:
+        future = pool.submit(job)
+    except Exception as e:
+        admission.release(ticket, job)
+        return _resolved(exception=e)
+
+    def computed(future):
+        admission.release(ticket, job, time.monotonic() - start, future.exception())
+        if future.exception() is None:
+            operations.store_result(job, future.result())
+
+    future.add_done_callback(computed)
+    return future
+
+
+def _resolved(result=None, exception=None):
+    future = Future()
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+    return future
+
+
+def _error_response(e):
+    metrics.count_error(e)
+    body, code = errors.describe(e)
+    body['status'] = code
+    return body
+
+
+def _line(index, response):
+    return json.dumps(dict(response, index=index)) + '\n'
@@ -0,0 +1,60 @@
+import contextlib
+import logging
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+_warned = False
+
+
+class TimeLimitExceeded(BaseException):
+    """
+    Raised into a computation which ran past its time_limit. Derives from
+    BaseException so SymPy's own `except Exception` blocks don't swallow it.
+    """
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    """
+    Interrupts the block with TimeLimitExceeded after `seconds` of wall clock
+    time. Uses SIGALRM, so the limit only applies in the main thread (e.g. in
+    the pool's workers); elsewhere, or when `seconds` is falsy, the block runs
+    unbounded, which is logged once. Limits don't nest.
+    """
+
+    if not seconds:
+        yield
+        return
+    if not enforced():
+        warn_unenforced()
+        yield
+        return
+
+    previous = signal.signal(signal.SIGALRM, _raise_time_limit_exceeded)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _raise_time_limit_exceeded(signum, frame):
+    raise TimeLimitExceeded()
+
+
+def enforced():
+    """Whether time_limit interrupts blocks in this thread."""
+    return threading.current_thread() is threading.main_thread()
+
+
+def warn_unenforced():
+    """Logs, once per process, that time budgets can't be enforced here."""
+
+    global _warned
+    if not _warned:
+        _warned = True
+        logger.warning('time budgets are disabled off the main thread, computing without a worker pool '
+                       'lets e.g. integrals and simplifications run unbounded')
@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A thread safe, size bounded cache which evicts the least recently used
+    entry when full. Entries older than `ttl` seconds are treated as missing.
+    When given `weigh`, a function returning e.g. the approximate bytes used by
+    a value, entries are also evicted while their total weight exceeds
+    `max_weight`.
+    """
+
+    def __init__(self, max_size, ttl=None, clock=time.monotonic, max_weight=None, weigh=None):
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self.clock = clock
+        self.max_weight = max_weight
+        self.weigh = weigh
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value, weight)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._lookup(key) is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        weight = self.weigh(value) if self.weigh is not None else 0
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (self.clock(), value, weight)
+            self.weight += weight
+            while len(self._entries) > self.max_size or self._overweight():
+                _, (_, _, evicted_weight) = self._entries.popitem(last=False)
+                self.weight -= evicted_weight
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.weight = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        return dict(
+            size=len(self._entries),
+            maxSize=self.max_size,
+            weight=self.weight,
+            maxWeight=self.max_weight,
+            ttl=self.ttl,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+    def _lookup(self, key):
+        # caller must hold the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl is not None and self.clock() - entry[0] > self.ttl:
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key):
+        # caller must hold the lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.weight -= entry[2]
+
+    def _overweight(self):
+        # never evict the entry which was just stored
+        return self.max_weight is not None and self.weight > self.max_weight and len(self._entries) > 1
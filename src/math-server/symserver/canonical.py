@@ -0,0 +1,121 @@
+import hashlib
+from symserver import config
+from symserver import metrics
+from symserver import parser
+from symserver.cache import LRUCache
+from sympy import Basic
+from sympy import Symbol
+from sympy.printing import srepr
+
+# prefix of the placeholder symbols the request's variables are renamed to
+PLACEHOLDER_PREFIX = '_v'
+
+# parsed expressions, keyed by the whitespace normalized input string
+parse_cache = LRUCache(config.PARSE_CACHE_SIZE)
+
+
+def parse(raw_expr):
+    """
+    Parses a python safe string into a SymPy expression. Expressions are
+    immutable so the same tree is handed out for repeated inputs.
+    """
+
+    key = ' '.join(raw_expr.split())
+    expr = parse_cache.get(key)
+
+    if expr is None:
+        with metrics.phase('parse_expr'):
+            expr = parser.parse(raw_expr)
+        parse_cache.put(key, expr)
+
+    return expr
+
+
+def structural_key(*parts):
+    """
+    Hashes SymPy trees (and plain python values) by structure. The key is
+    stable across processes, unlike hash().
+    """
+
+    return hashlib.sha1(srepr(parts).encode('utf-8')).hexdigest()
+
+
+def digest(values):
+    """
+    Hashes a dict of plain python values and arrays (anything with .tobytes(),
+    e.g. numpy arrays) by content.
+    """
+
+    sha = hashlib.sha1()
+
+    for name in sorted(values):
+        value = values[name]
+        sha.update(name.encode('utf-8'))
+        if hasattr(value, 'tobytes'):
+            sha.update(str((value.dtype, value.shape)).encode('utf-8'))
+            sha.update(value.tobytes())
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                sha.update(digest({'': item}).encode('utf-8'))
+        else:
+            sha.update(repr(value).encode('utf-8'))
+
+    return sha.hexdigest()
+
+
+class CanonicalForm(object):
+    """
+    An expression with the request's variables renamed to positional
+    placeholders, so `f(x)` with variables [x] and `f(t)` with variables [t]
+    have the same form. Results computed on the form are rewritten back into
+    the caller's symbols with `from_canonical`.
+    """
+
+    def __init__(self, expr, variables, required=()):
+        self.original = expr
+
+        # only variables which appear in the expression or are referenced by
+        # the operation (e.g. wrt) can affect the result
+        free_names = set(sym.name for sym in expr.free_symbols)
+        names = []
+        for name in list(variables) + list(required):
+            if name not in names and (name in free_names or name in required):
+                names.append(name)
+
+        if any(name.startswith(PLACEHOLDER_PREFIX) for name in free_names | set(names)):
+            # renaming could capture the caller's own symbols
+            placeholders = [Symbol(name) for name in names]
+        else:
+            placeholders = [Symbol(PLACEHOLDER_PREFIX + str(i)) for i in range(len(names))]
+
+        self._to_canonical = {}
+        self._from_canonical = {}
+        for name, placeholder in zip(names, placeholders):
+            self._to_canonical[Symbol(name)] = placeholder
+            self._from_canonical[placeholder] = Symbol(name)
+
+        self.names = names
+        self.expr = self.to_canonical(expr)
+
+    def symbol(self, name):
+        """Returns the placeholder standing in for the variable `name`."""
+        return self._to_canonical[Symbol(name)]
+
+    def to_canonical(self, obj):
+        return _replace(obj, self._to_canonical)
+
+    def from_canonical(self, obj):
+        return _replace(obj, self._from_canonical)
+
+    def key(self, operation, *args):
+        return structural_key(operation, self.expr, *args)
+
+
+def _replace(obj, mapping):
+    if isinstance(obj, Basic):
+        return obj.xreplace(mapping)
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_replace(item, mapping) for item in obj)
+    if isinstance(obj, dict):
+        return dict((_replace(k, mapping), _replace(v, mapping)) for k, v in obj.items())
+    return obj
@@ -0,0 +1,148 @@
+import os
+import tempfile
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    if value is None or value.strip() == '':
+        return default
+    return int(value)
+
+
+def _env_float(name, default):
+    value = os.environ.get(name)
+    if value is None or value.strip() == '':
+        return default
+    return float(value)
+
+
+def _env_str(name, default):
+    value = os.environ.get(name)
+    if value is None or value.strip() == '':
+        return default
+    return value.strip()
+
+
+def _env_list(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+# result cache in front of operations.handle_request
+RESULT_CACHE_SIZE = _env_int('SYMSERVER_RESULT_CACHE_SIZE', 1024)  # max number of entries, 0 disables the cache
+RESULT_CACHE_TTL = _env_float('SYMSERVER_RESULT_CACHE_TTL', 3600)  # seconds, 0 means entries never expire
+RESULT_CACHE_OPERATIONS = _env_list('SYMSERVER_RESULT_CACHE_OPERATIONS', [
+    'derivative',
+    'gradient',
+    'jacobian',
+    'hessian',
+    'integral',
+    'solveFor',
+    'expandExpr',
+    'simplifyExpr',
+    'factorExpr',
+    'sample',
+    'det',
+    'inverse',
+    'rref',
+    'charpoly',
+    'eigenvals',
+    'matmul',
+])
+
+# persistent result store behind the result cache, see store.py
+RESULT_STORE = _env_str('SYMSERVER_RESULT_STORE', '')  # path of its SQLite database, empty disables the store
+RESULT_STORE_BYTES = _env_int('SYMSERVER_RESULT_STORE_BYTES', 512 * 1024 * 1024)  # max bytes of pickled results it keeps
+
+# coalescing of concurrent identical requests, see singleflight.py
+SINGLE_FLIGHT = _env_int('SYMSERVER_SINGLE_FLIGHT', 1)  # 0 computes every request on its own
+SINGLE_FLIGHT_LOCKS = _env_str('SYMSERVER_SINGLE_FLIGHT_LOCKS', os.path.join(tempfile.gettempdir(), 'symserver-flights'))
+SINGLE_FLIGHT_TIMEOUT = _env_float('SYMSERVER_SINGLE_FLIGHT_TIMEOUT', 35)  # seconds to wait for another request's result
+
+# parsed expressions, keyed by the input string
+PARSE_CACHE_SIZE = _env_int('SYMSERVER_PARSE_CACHE_SIZE', 4096)
+
+# printed latex and python strings of results and inputs, see printing.py
+PRINT_CACHE_SIZE = _env_int('SYMSERVER_PRINT_CACHE_SIZE', 4096)  # max number of strings, 0 disables the cache
+PRINT_CACHE_BYTES = _env_int('SYMSERVER_PRINT_CACHE_BYTES', 64 * 1024 * 1024)  # approx max memory they use
+
+# pool of worker processes which run the operations for the app
+POOL_SIZE = _env_int('SYMSERVER_POOL_SIZE', os.cpu_count() or 1)  # 0 runs operations in the request thread
+POOL_TIMEOUT = _env_float('SYMSERVER_POOL_TIMEOUT', 20)  # wall clock seconds a request may compute for
+POOL_CPU_LIMIT = _env_float('SYMSERVER_POOL_CPU_LIMIT', 15)  # cpu seconds a request may compute for
+POOL_QUEUE_TIMEOUT = _env_float('SYMSERVER_POOL_QUEUE_TIMEOUT', 10)  # seconds a request may wait for a free worker
+POOL_MAX_RSS = _env_int('SYMSERVER_POOL_MAX_RSS', 1024 * 1024 * 1024)  # bytes of resident memory after which a worker is replaced, 0 never
+
+# admission control in front of the computations, see admission.py
+ADMISSION = _env_int('SYMSERVER_ADMISSION', 1)  # 0 computes every request as it comes
+ADMISSION_SLOTS = _env_int('SYMSERVER_ADMISSION_SLOTS', 0)  # computations at a time per process, 0 for the pool size or cpu count
+ADMISSION_QUEUE_TIMEOUT = _env_float('SYMSERVER_ADMISSION_QUEUE_TIMEOUT', 10)  # seconds a request may wait for a slot
+ADMISSION_MAX_COST = _env_float('SYMSERVER_ADMISSION_MAX_COST', 60)  # estimated seconds over which a request is refused
+ADMISSION_MAX_BACKLOG = _env_float('SYMSERVER_ADMISSION_MAX_BACKLOG', 300)  # estimated seconds of waiting requests over which new ones are shed
+ADMISSION_CLIENT_LIMIT = _env_int('SYMSERVER_ADMISSION_CLIENT_LIMIT', 16)  # requests a client may have computing or waiting, 0 for no limit
+ADMISSION_CLIENT_HEADER = _env_str('SYMSERVER_ADMISSION_CLIENT_HEADER', 'X-Client-Id')  # header naming the client, else its address
+ADMISSION_HISTORY_SIZE = _env_int('SYMSERVER_ADMISSION_HISTORY_SIZE', 4096)  # past latencies remembered for estimating costs
+
+# max number of requests in one /api/math/batch request
+BATCH_MAX_SIZE = _env_int('SYMSERVER_BATCH_MAX_SIZE', 1000)
+BATCH_STREAM_WINDOW = _env_int('SYMSERVER_BATCH_STREAM_WINDOW', 64)  # max requests of a batch computed or waiting at a time
+BATCH_THREADS = _env_int('SYMSERVER_BATCH_THREADS', 4)  # batches asgi.py runs at a time, the others wait for a thread
+
+# max number of rows the evaluate operation computes in one request
+EVALUATE_MAX_ROWS = _env_int('SYMSERVER_EVALUATE_MAX_ROWS', 5000000)
+
+# compiled evaluators of the evaluate operation
+EVALUATOR_CACHE_SIZE = _env_int('SYMSERVER_EVALUATOR_CACHE_SIZE', 512)  # max number of compiled functions
+EVALUATOR_CACHE_BYTES = _env_int('SYMSERVER_EVALUATOR_CACHE_BYTES', 64 * 1024 * 1024)  # approx max memory they use
+EVALUATOR_HANDLES = _env_int('SYMSERVER_EVALUATOR_HANDLES', 4096)  # max number of handles clients can reuse
+
+# plot sampling of the sample operation
+SAMPLE_DEFAULT_PIXELS = _env_int('SYMSERVER_SAMPLE_DEFAULT_PIXELS', 800)  # plot width when none is sent
+SAMPLE_MAX_PIXELS = _env_int('SYMSERVER_SAMPLE_MAX_PIXELS', 8000)
+SAMPLE_OVERSAMPLING = _env_int('SYMSERVER_SAMPLE_OVERSAMPLING', 8)  # max evaluations per pixel of width
+SAMPLE_MAX_BEND = _env_float('SYMSERVER_SAMPLE_MAX_BEND', 5)  # degrees the curve may bend between samples
+SAMPLE_TOLERANCE = _env_float('SYMSERVER_SAMPLE_TOLERANCE', 0.5)  # pixels the returned polyline may deviate
+SAMPLE_JUMP_BISECTIONS = _env_int('SYMSERVER_SAMPLE_JUMP_BISECTIONS', 24)  # bisections telling steep curves from jumps
+
+# intermediate derivatives memoized by the derivative operation
+DERIVATIVE_CACHE_SIZE = _env_int('SYMSERVER_DERIVATIVE_CACHE_SIZE', 4096)
+
+# tiered integration of the integral operation
+INTEGRAL_TIER_TIMEOUT = _env_float('SYMSERVER_INTEGRAL_TIER_TIMEOUT', 1)  # seconds each cheap method may try
+INTEGRAL_SYMBOLIC_TIMEOUT = _env_float('SYMSERVER_INTEGRAL_SYMBOLIC_TIMEOUT', 5)  # seconds before numeric bounds fall back to quadrature
+
+# size guards of expandExpr and factorExpr, see sizes.py
+EXPAND_MAX_TERMS = _env_int('SYMSERVER_EXPAND_MAX_TERMS', 10000)  # predicted terms, weighted by their digits, over which they are refused, 0 for no limit
+RESULT_MAX_TERMS = _env_int('SYMSERVER_RESULT_MAX_TERMS', 5000)  # results with more terms are summarized, 0 for no limit
+RESULT_SUMMARY_TERMS = _env_int('SYMSERVER_RESULT_SUMMARY_TERMS', 20)  # leading terms of a summarized result
+
+# simplification of results, see simplification.simplify_result
+INTEGRAL_SIMPLIFY = _env_str('SYMSERVER_INTEGRAL_SIMPLIFY', 'cheap')  # policy integral uses when the request sends none
+SIMPLIFY_MIN_OPS = _env_int('SYMSERVER_SIMPLIFY_MIN_OPS', 4)  # results with at most this many operations are left as is
+SIMPLIFY_TIMEOUT = _env_float('SYMSERVER_SIMPLIFY_TIMEOUT', 2)  # seconds full simplify may take before settling for cheap
+
+# systems of equations in solveFor
+SOLVE_SYSTEM_MAX_EQUATIONS = _env_int('SYMSERVER_SOLVE_SYSTEM_MAX_EQUATIONS', 100)
+SOLVE_SYSTEM_TIMEOUT = _env_float('SYMSERVER_SOLVE_SYSTEM_TIMEOUT', 10)  # seconds a system may take to solve
+
+# matrix operations
+MATRIX_MAX_SIZE = _env_int('SYMSERVER_MATRIX_MAX_SIZE', 100)  # max number of rows or columns of a matrix
+
+# metrics served at /metrics, see metrics.py
+METRICS_DIR = _env_str('SYMSERVER_METRICS_DIR', '')  # directory the processes of a host share their metrics in, empty for per process ones
+METRICS_FLUSH_INTERVAL = _env_float('SYMSERVER_METRICS_FLUSH_INTERVAL', 1)  # seconds between writes of a process' metrics
+
+# profiling of the computations, see profiling.py
+PROFILE_HEADER = _env_str('SYMSERVER_PROFILE_HEADER', 'X-Symserver-Profile')  # header requests opt in to profiling with, empty ignores it
+PROFILE_SAMPLE_RATE = _env_float('SYMSERVER_PROFILE_SAMPLE_RATE', 0)  # share of the requests profiled without asking
+PROFILE_TOP = _env_int('SYMSERVER_PROFILE_TOP', 20)  # functions in the summary of a profile
+PROFILE_DIR = _env_str('SYMSERVER_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'symserver-profiles'))  # empty writes no files
+PROFILE_MAX_FILES = _env_int('SYMSERVER_PROFILE_MAX_FILES', 100)  # profiles kept in PROFILE_DIR, the oldest are removed
+PROFILE_SLOW_SECONDS = _env_float('SYMSERVER_PROFILE_SLOW_SECONDS', 0)  # computations logged with their sampled profile, 0 samples none
+PROFILE_SAMPLE_INTERVAL = _env_float('SYMSERVER_PROFILE_SAMPLE_INTERVAL', 0.01)  # seconds between stack samples
+
+# warm-up of the server's code paths before it takes requests, see warmup.py
+WARMUP = _env_int('SYMSERVER_WARMUP', 1)  # 0 skips the warm-up
+WARMUP_REQUESTS = _env_str('SYMSERVER_WARMUP_REQUESTS', '')  # JSON file with a list of requests to warm up with
@@ -0,0 +1,332 @@
+import collections
+import logging
+import math
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from symserver import config
+from symserver import errors
+from symserver import metrics
+from symserver import operations
+
+logger = logging.getLogger(__name__)
+
+# signals the worker must not handle like its parent (e.g. a gunicorn worker) does
+_RESET_SIGNALS = ('SIGTERM', 'SIGQUIT', 'SIGHUP', 'SIGUSR1', 'SIGUSR2', 'SIGWINCH', 'SIGABRT', 'SIGTTIN', 'SIGTTOU')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Returns this process' worker pool, starting it on first use. Returns None
+    when the pool is disabled. Pools don't survive a fork, so a forked process
+    (e.g. a gunicorn worker) starts its own.
+    """
+
+    global _pool
+
+    if config.POOL_SIZE <= 0:
+        return None
+
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = WorkerPool(
+                config.POOL_SIZE,
+                timeout=config.POOL_TIMEOUT,
+                cpu_limit=config.POOL_CPU_LIMIT,
+                queue_timeout=config.POOL_QUEUE_TIMEOUT,
+                max_rss=config.POOL_MAX_RSS,
+            )
+
+    return _pool
+
+
+def _pool_gauge(measure):
+    # the gauge of this process' pool, 0 before it starts
+    def gauge():
+        pool = _pool
+        return measure(pool) if pool is not None and pool.pid == os.getpid() else 0
+    return gauge
+
+
+metrics.registry.gauge('symserver_pool_queue_depth', _pool_gauge(lambda pool: pool.queue_depth()))
+metrics.registry.gauge('symserver_pool_busy_workers', _pool_gauge(lambda pool: pool.busy_workers()))
+
+
+def get_executor():
+    """Returns the executor handle_request should use, None to compute in process."""
+    pool = get_pool()
+    return pool.run if pool is not None else None
+
+
+class CPUTimeExceeded(BaseException):
+    """
+    Raised into a worker's computation by SIGXCPU. Derives from BaseException
+    so SymPy's own `except Exception` blocks don't swallow it, like
+    budget.TimeLimitExceeded.
+    """
+
+
+class WorkerPool(object):
+    """
+    A fixed number of forked worker processes which compute operations.Job's.
+
+    Every job gets a wall clock budget, enforced here by killing and replacing
+    the worker, and a cpu budget, enforced by the worker through RLIMIT_CPU.
+    A worker whose resident memory grew past `max_rss` bytes, e.g. SymPy's
+    caches after a large expansion, is replaced once it finished its job.
+    Workers are forked from the current process so they start with SymPy
+    already imported.
+    """
+
+    def __init__(self, size, timeout=None, cpu_limit=None, queue_timeout=None, max_rss=None):
+        self.size = size
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.queue_timeout = queue_timeout
+        self.max_rss = max_rss
+        self.pid = os.getpid()
+
+        self._context = multiprocessing.get_context('fork')
+        self._lock = threading.Lock()
+        self._pending = collections.deque()  # (job, future, timeout, queued_at)
+        self._closed = False
+        self._wakeup_r, self._wakeup_w = self._context.Pipe(duplex=False)
+        self._workers = [self._spawn() for _ in range(size)]
+
+        self._thread = threading.Thread(target=self._dispatch_loop, name='symserver-pool')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def queue_depth(self):
+        return len(self._pending)
+
+    def busy_workers(self):
+        return sum(1 for worker in self._workers if worker.task is not None)
+
+    def submit(self, job, timeout=None):
+        """Queues the job, returns a concurrent.futures.Future of its canonical result."""
+
+        future = Future()
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('worker pool is closed')
+            self._pending.append((job, future, timeout or self.timeout, time.monotonic()))
+            self._wakeup_w.send_bytes(b'.')
+
+        return future
+
+    def run(self, job, timeout=None):
+        return self.submit(job, timeout=timeout).result()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup_w.send_bytes(b'.')
+
+        self._thread.join()
+
+        for worker in self._workers:
+            if worker.task is not None:
+                worker.task[0].set_exception(errors.ServerBusy('The server is shutting down.'))
+            worker.kill()
+
+        while self._pending:
+            _, future, _, _ = self._pending.popleft()
+            future.set_exception(errors.ServerBusy('The server is shutting down.'))
+
+    def _spawn(self):
+        return _Worker(self._context, self.cpu_limit)
+
+    def _replace(self, worker):
+        worker.kill()
+        self._workers[self._workers.index(worker)] = self._spawn()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                self._assign()
+
+            busy = [worker.conn for worker in self._workers if worker.task is not None]
+            ready = wait(busy + [self._wakeup_r], timeout=self._wait_timeout())
+
+            for conn in ready:
+                if conn is self._wakeup_r:
+                    while self._wakeup_r.poll():
+                        self._wakeup_r.recv_bytes()
+                else:
+                    self._collect(next(w for w in self._workers if w.conn is conn))
+
+            self._expire()
+
+    def _assign(self):
+        # caller must hold the lock
+        for index in range(len(self._workers)):
+            if not self._pending:
+                return
+            worker = self._workers[index]
+            if worker.task is not None:
+                continue
+            if not worker.process.is_alive():
+                self._replace(worker)
+                worker = self._workers[index]
+
+            job, future, timeout, _ = self._pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                worker.conn.send(job)
+            except (OSError, EOFError):
+                future.set_exception(errors.WorkerCrashed('The worker computing the request crashed.'))
+                self._replace(worker)
+                continue
+
+            deadline = time.monotonic() + timeout if timeout else None
+            worker.task = (future, deadline, timeout, job)
+
+    def _collect(self, worker):
+        future, _, _, job = worker.task
+        worker.task = None
+
+        try:
+            status, value, profile_report, rss = worker.conn.recv()
+        except (OSError, EOFError):
+            future.set_exception(errors.WorkerCrashed('The worker computing the request crashed.'))
+            self._replace(worker)
+            return
+
+        if self.max_rss and rss > self.max_rss and status != 'cpu':
+            logger.warning('replacing worker %d, it uses %d MB after a %s request', worker.process.pid,
+                           rss // (1024 * 1024), job.operation)
+            metrics.count('symserver_worker_recycles_total', operation=job.operation)
+            self._replace(worker)
+
+        if status == 'ok':
+            job.profile_report = profile_report
+            future.set_result(value)
+        elif status == 'cpu':
+            future.set_exception(errors.ComputationTimeout(
+                'The request exceeded its cpu budget of ' + str(self.cpu_limit) + ' seconds.'))
+            self._replace(worker)
+        else:
+            future.set_exception(value)
+
+    def _expire(self):
+        now = time.monotonic()
+
+        for worker in list(self._workers):
+            if worker.task is None or worker.task[1] is None or worker.task[1] > now:
+                continue
+            future, _, timeout, _ = worker.task
+            worker.task = None
+            self._replace(worker)
+            future.set_exception(errors.ComputationTimeout(
+                'The request exceeded its time budget of ' + str(timeout) + ' seconds.'))
+
+        if not self.queue_timeout:
+            return
+
+        with self._lock:
+            while self._pending and self._pending[0][3] + self.queue_timeout <= now:
+                _, future, _, _ = self._pending.popleft()
+                future.set_exception(errors.ServerBusy('No worker became available to compute the request.'))
+
+    def _wait_timeout(self):
+        deadlines = [worker.task[1] for worker in self._workers if worker.task is not None and worker.task[1]]
+        if self.queue_timeout and self._pending:
+            deadlines.append(self._pending[0][3] + self.queue_timeout)
+        if not deadlines:
+            return None
+        return max(0, min(deadlines) - time.monotonic())
+
+
+class _Worker(object):
+
+    def __init__(self, context, cpu_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, cpu_limit))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.task = None  # (future, deadline, timeout, job) while computing
+
+    def kill(self):
+        if self.process.is_alive():
+            os.kill(self.process.pid, signal.SIGKILL)
+        self.process.join()
+        self.conn.close()
+
+
+def _worker_main(conn, cpu_limit):
+    for name in _RESET_SIGNALS:
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGXCPU, _raise_cpu_time_exceeded)
+
+    while True:
+        try:
+            job = conn.recv()
+        except (OSError, EOFError):
+            return  # the pool went away
+
+        try:
+            _limit_cpu(cpu_limit)
+            reply = ('ok', operations.execute(job), job.profile_report)
+        except CPUTimeExceeded:
+            reply = ('cpu', None, None)
+        except Exception as e:
+            reply = ('error', e, None)
+        finally:
+            _unlimit_cpu()
+
+        # (status, result or exception, profile, resident bytes)
+        reply += (_rss(),)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # e.g. the exception could not be pickled
+            conn.send(('error', Exception(str(reply[1]) if reply[0] == 'error' else str(e)), None, reply[3]))
+
+        if reply[0] == 'cpu':
+            return  # interrupted computations may leave SymPy's caches inconsistent
+
+
+def _rss():
+    # resident bytes of this process, its peak where /proc isn't available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _raise_cpu_time_exceeded(signum, frame):
+    raise CPUTimeExceeded()
+
+
+def _limit_cpu(cpu_limit):
+    if not cpu_limit:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(math.ceil(usage.ru_utime + usage.ru_stime + cpu_limit))
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _unlimit_cpu():
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
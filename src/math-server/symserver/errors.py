@@ -3,6 +3,67 @@ from flask_api.exceptions import APIException
 class InvalidParams(APIException):
     status_code = 400
 
+    def __init__(self, message, position=None):
+        Exception.__init__(self, message)
+        self.detail = message
+        self.position = position  # offset of the error in the expression, when parsing failed
+
+
+class ComputationTimeout(APIException):
+    status_code = 503
+
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.detail = message
+
+
+class ServerBusy(APIException):
+    status_code = 503
+
     def __init__(self, message):
-        Exception.__init__(self)
+        Exception.__init__(self, message)
         self.detail = message
+
+
+class TooManyRequests(APIException):
+    status_code = 429
+
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.detail = message
+
+
+class RequestTooExpensive(APIException):
+    status_code = 413
+
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.detail = message
+
+
+class WorkerCrashed(APIException):
+    status_code = 500
+
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.detail = message
+
+
+class UnknownHandle(APIException):
+    status_code = 404
+
+    def __init__(self, message):
+        Exception.__init__(self, message)
+        self.detail = message
+
+
+def describe(e):
+    """Returns the (body, status code) the server responds with for the exception."""
+
+    if isinstance(e, APIException):
+        body = dict(error=str(e), errorType=type(e).__name__, message=e.detail)
+        if getattr(e, 'position', None) is not None:
+            body['position'] = e.position
+        return body, e.status_code
+
+    return dict(error=str(e), errorType='InternalError'), 500
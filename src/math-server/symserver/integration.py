@@ -0,0 +1,120 @@
+import mpmath
+from symserver import budget
+from symserver import config
+from symserver import errors
+from symserver.budget import TimeLimitExceeded
+from symserver.budget import time_limit
+from sympy import Float
+from sympy import Integral
+from sympy import Piecewise
+from sympy import integrate
+from sympy import lambdify
+from sympy import sympify
+from sympy import true
+from sympy.integrals.heurisch import heurisch
+from sympy.integrals.manualintegrate import manualintegrate
+from sympy.integrals.rationaltools import ratint
+
+
+def antiderivative(expr, wrt):
+    """
+    Integrates expr with respect to wrt, trying the cheap methods under short
+    budgets before SymPy's full (Risch and Meijer G) integrate. Once one of
+    them runs out of time the rest are skipped, the integrand is likely hard
+    for them all. Where budgets can't be enforced (see budget.time_limit) the
+    cheap methods aren't tried at all. Returns the result and the name of
+    the tier which produced it.
+    """
+
+    if not budget.enforced():
+        budget.warn_unenforced()
+    else:
+        for tier, method in CHEAP_TIERS:
+            try:
+                result = _attempt(method, expr, wrt, config.INTEGRAL_TIER_TIMEOUT)
+            except TimeLimitExceeded:
+                break
+            if result is not None:
+                return result, tier
+
+    return integrate(expr, wrt), 'risch'
+
+
+def definite_integral(expr, wrt, left, right):
+    """
+    Integrates expr with respect to wrt from left to right. When the bounds
+    and integrand are numeric and SymPy can't finish within its budget, the
+    integral is computed by mpmath quadrature instead. Where the budget can't
+    be enforced (see budget.time_limit) such integrals are computed by
+    quadrature right away. Returns the result and the name of the tier which
+    produced it.
+    """
+
+    left, right = sympify(left), sympify(right)
+
+    if not _is_numeric(expr, wrt, left, right):
+        return integrate(expr, (wrt, left, right)), 'risch'
+
+    if not budget.enforced():
+        budget.warn_unenforced()
+        return _quadrature(expr, wrt, left, right), 'quadrature'
+
+    try:
+        with time_limit(config.INTEGRAL_SYMBOLIC_TIMEOUT):
+            result = integrate(expr, (wrt, left, right))
+        if not result.has(Integral):
+            return result, 'risch'
+    except TimeLimitExceeded:
+        pass
+
+    return _quadrature(expr, wrt, left, right), 'quadrature'
+
+
+def _attempt(method, expr, wrt, timeout):
+    # returns None when the method gave up or failed, raises TimeLimitExceeded when it ran out of time
+    try:
+        with time_limit(timeout):
+            result = method(expr, wrt)
+    except Exception:
+        return None
+
+    if result is None or result.has(Integral) or _is_partial(result):
+        return None
+    return result
+
+
+def _is_partial(result):
+    # e.g. manualintegrate's antiderivative of sqrt(1 - x**2), only defined on -1 < x < 1
+    return any(piecewise.args[-1].cond != true for piecewise in result.atoms(Piecewise))
+
+
+def _rational(expr, wrt):
+    if not expr.is_rational_function(wrt):
+        return None
+    return ratint(expr, wrt)
+
+
+def _is_numeric(expr, wrt, left, right):
+    return not (expr.free_symbols - {wrt}) and not left.free_symbols and not right.free_symbols
+
+
+def _quadrature(expr, wrt, left, right):
+    f = lambdify(wrt, expr, modules='mpmath')
+
+    # running out of time raises TimeLimitExceeded or kills the worker, errors here are the integrand's
+    try:
+        value = mpmath.quad(f, [mpmath.mpmathify(left.evalf()), mpmath.mpmathify(right.evalf())])
+    except (ArithmeticError, TypeError, ValueError) as e:
+        raise errors.InvalidParams('the integral could not be computed numerically: ' + str(e))
+
+    if isinstance(value, mpmath.mpc):
+        return sympify(complex(value))
+    return Float(value)
+
+
+# (tier name, method) tried in order before integrate, see antiderivative
+CHEAP_TIERS = (
+    ('rational', _rational),
+    ('manual', manualintegrate),
+    ('heurisch', heurisch),
+)
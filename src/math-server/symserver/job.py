@@ -0,0 +1,29 @@
+from symserver import canonical
+from symserver import config
+from symserver import printing
+
+
+class Job(object):
+    """
+    A validated and parsed request. Operations compute on the canonical form
+    of the expression, so equivalent requests share a key and a result.
+    """
+
+    def __init__(self, operation, request_json, parsed_expr, form, args=(), inputs=None):
+        self.operation = operation
+        self.request_json = request_json
+        self.parsed_expr = parsed_expr  # the expression as the caller wrote it
+        self.form = form  # canonical.CanonicalForm of parsed_expr
+        self.args = args  # operation params, in terms of the canonical symbols
+        self.inputs = inputs or {}  # non symbolic params (e.g. arrays), passed to compute as keywords
+        self.size = None  # nodes of parsed_expr, set by operations.prepare
+        self.client = None  # who sent the request, for admission.py's per client limits
+        self.formats = printing.FORMATS  # formats the response is printed in, see printing.get_formats
+        self.profile = False  # compute under cProfile, see profiling.py
+        self.profile_report = None  # the profile's summary, once computed
+
+        # only cached results are looked up by their inputs, hashing e.g. the columns of evaluate costs time
+        key_args = args
+        if self.inputs and operation in config.RESULT_CACHE_OPERATIONS:
+            key_args = args + (canonical.digest(self.inputs),)
+        self.key = form.key(operation, *key_args)
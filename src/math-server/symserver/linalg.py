@@ -0,0 +1,228 @@
+"""
+Linear algebra on matrices of polys domain elements (e.g. QQ or QQ(a, b)),
+which is much faster than on Matrix's SymPy expressions. Matrices are stored
+sparsely, as lists of rows which are dicts of column -> nonzero element.
+"""
+
+
+def rref(rows, ncols, domain):
+    """
+    Gauss-Jordan eliminates the first `ncols` columns of the sparse rows,
+    whose elements belong to `domain`, a field. Returns the nonzero rows of
+    the reduced row echelon form, the pivot columns and the rows which are
+    left after elimination. Those only have entries in columns >= ncols, e.g.
+    the right hand side of an inconsistent linear system.
+    """
+
+    ring = _ring_of(domain)
+    rows = [_clear_denominators(row, domain, ring) for row in rows if row]
+
+    rows, pivots, divisor = _fraction_free_rref(rows, ncols, ring)
+
+    # every pivot is now divisor, divide it out in the field
+    reduced = []
+    for row in rows[:len(pivots)]:
+        pivot = _to_field(divisor, domain, ring)
+        reduced.append(dict((c, _to_field(value, domain, ring) / pivot) for c, value in row.items()))
+
+    rest = [dict((c, _to_field(value, domain, ring)) for c, value in row.items()) for row in rows[len(pivots):]]
+    return reduced, pivots, [row for row in rest if row]
+
+
+def det(rows, n, domain):
+    """
+    The determinant of the n x n matrix, by fraction free Bareiss elimination
+    in domain's ring.
+    """
+
+    ring = _ring_of(domain)
+    dense = _to_dense(rows, n, domain)
+
+    # det(A) = det(rows scaled to the ring) / product of the scales
+    scale = domain.one
+    matrix = []
+    for row in dense:
+        common = _common_denominator(row, domain, ring)
+        scale *= _to_field(common, domain, ring)
+        matrix.append([_times_in_ring(value, common, domain, ring) for value in row])
+
+    sign = 1
+    previous = ring.one
+    for k in range(n - 1):
+        if not matrix[k][k]:
+            swap = next((i for i in range(k + 1, n) if matrix[i][k]), None)
+            if swap is None:
+                return domain.zero
+            matrix[k], matrix[swap] = matrix[swap], matrix[k]
+            sign = -sign
+        for i in range(k + 1, n):
+            for j in range(k + 1, n):
+                matrix[i][j] = ring.exquo(matrix[i][j] * matrix[k][k] - matrix[i][k] * matrix[k][j], previous)
+        previous = matrix[k][k]
+
+    result = _to_field(matrix[n - 1][n - 1], domain, ring) / scale
+    return result if sign > 0 else -result
+
+
+def inverse(rows, n, domain):
+    """The inverse of the n x n matrix, None when it is singular."""
+
+    augmented = []
+    for i, row in enumerate(rows):
+        augmented.append(dict(row))
+        augmented[i][n + i] = domain.one
+
+    reduced, pivots, _ = rref(augmented, n, domain)
+    if len(pivots) < n:
+        return None
+
+    return [dict((c - n, value) for c, value in row.items() if c >= n) for row in reduced]
+
+
+def charpoly(rows, n, domain):
+    """
+    The coefficients of det(x*I - A), highest degree first. Uses Berkowitz'
+    division free algorithm on A scaled into domain's ring, since the
+    intermediate fractions of e.g. the Hessenberg method grow out of hand.
+    """
+
+    ring = _ring_of(domain)
+    common = _common_denominator([value for row in rows for value in row.values()], domain, ring)
+    matrix = [[_times_in_ring(value, common, domain, ring) for value in row] for row in _to_dense(rows, n, domain)]
+
+    # the charpoly of the trailing 1x1 block, then extend it one row and column at a time
+    vector = [ring.one, -matrix[n - 1][n - 1]] if n else [ring.one]
+    for k in range(n - 2, -1, -1):
+        size = n - k
+        a = matrix[k][k]
+        r = matrix[k][k + 1:]
+        column = [matrix[i][k] for i in range(k + 1, n)]
+        block = [row[k + 1:] for row in matrix[k + 1:]]
+
+        # -a, then -r * block**i * column
+        diagonals = [ring.one, -a, -_dot(r, column, ring)]
+        for _ in range(size - 2):
+            column = [_dot(row, column, ring) for row in block]
+            diagonals.append(-_dot(r, column, ring))
+
+        # multiply by the lower triangular toeplitz matrix of the diagonals
+        vector = [_sum((diagonals[i - j] * vector[j] for j in range(min(i, size - 1) + 1)), ring) for i in range(size + 1)]
+
+    # charpoly(A)(x) = charpoly(common * A)(common * x) / common**n
+    field_common = _to_field(common, domain, ring)
+    return [_to_field(coeff, domain, ring) / field_common**i for i, coeff in enumerate(vector)]
+
+
+def matmul(left, right, ncols, domain):
+    """The product of the sparse matrices, `ncols` is the width of right."""
+
+    ring = _ring_of(domain)
+    left_common = _common_denominator([value for row in left for value in row.values()], domain, ring)
+    right_common = _common_denominator([value for row in right for value in row.values()], domain, ring)
+    right = [dict((c, _times_in_ring(value, right_common, domain, ring)) for c, value in row.items()) for row in right]
+    divisor = _to_field(left_common * right_common, domain, ring)
+
+    product = []
+    for row in left:
+        result = {}
+        for k, value in row.items():
+            value = _times_in_ring(value, left_common, domain, ring)
+            for c, other in right[k].items():
+                result[c] = result.get(c, ring.zero) + value * other
+        product.append(dict((c, _to_field(value, domain, ring) / divisor) for c, value in result.items() if value))
+    return product
+
+
+def _fraction_free_rref(rows, ncols, ring):
+    """
+    Fraction free Gauss-Jordan elimination, which keeps the entries in the
+    ring: every division by the previous pivot is exact. Returns the rows,
+    the pivot columns and the final divisor, which every pivot equals.
+    """
+
+    rows = [dict(row) for row in rows]
+    pivots = []
+    divisor = ring.one
+
+    for col in range(ncols):
+        r = len(pivots)
+        found = next((i for i in range(r, len(rows)) if col in rows[i]), None)
+        if found is None:
+            continue
+
+        rows[r], rows[found] = rows[found], rows[r]
+        pivot_row = rows[r]
+        pivot = pivot_row[col]
+
+        for i, row in enumerate(rows):
+            if i == r:
+                continue
+            if col in row:
+                rows[i] = _combine(row, pivot, pivot_row, row[col], divisor, ring)
+            else:
+                rows[i] = _scale(row, pivot, divisor, ring)
+
+        divisor = pivot
+        pivots.append(col)
+
+    return rows, pivots, divisor
+
+
+def _combine(row, pivot, pivot_row, factor, divisor, ring):
+    # (pivot * row - factor * pivot_row) / divisor, dropping zeros
+    result = {}
+    for c in set(row) | set(pivot_row):
+        value = pivot * row.get(c, ring.zero) - factor * pivot_row.get(c, ring.zero)
+        if value:
+            result[c] = ring.exquo(value, divisor)
+    return result
+
+
+def _scale(row, pivot, divisor, ring):
+    return dict((c, ring.exquo(pivot * value, divisor)) for c, value in row.items())
+
+
+def _clear_denominators(row, domain, ring):
+    common = _common_denominator(row.values(), domain, ring)
+    return dict((c, _times_in_ring(value, common, domain, ring)) for c, value in row.items())
+
+
+def _common_denominator(row, domain, ring):
+    common = ring.one
+    if ring is not domain:
+        for value in row:
+            common = ring.lcm(common, domain.denom(value))
+    return common
+
+
+def _times_in_ring(value, common, domain, ring):
+    if ring is domain:
+        return value
+    return ring.exquo(domain.numer(value) * common, domain.denom(value))
+
+
+def _to_field(value, domain, ring):
+    return value if ring is domain else domain.convert_from(value, ring)
+
+
+def _ring_of(domain):
+    # the ring whose field of fractions domain is, e.g. ZZ for QQ
+    try:
+        return domain.get_ring()
+    except Exception:
+        return domain
+
+
+def _to_dense(rows, n, domain):
+    return [[row.get(c, domain.zero) for c in range(n)] for row in rows]
+
+
+def _dot(u, v, ring):
+    return _sum((a * b for a, b in zip(u, v)), ring)
+
+
+def _sum(values, ring):
+    total = ring.zero
+    for value in values:
+        total += value
+    return total
@@ -0,0 +1,200 @@
+import mpmath
+from symserver import canonical
+from symserver import config
+from symserver import errors
+from symserver import linalg
+from symserver import printing
+from symserver.job import Job
+from sympy import Float
+from sympy import ImmutableMatrix
+from sympy import Poly
+from sympy import Symbol
+from sympy import Tuple
+from sympy import roots
+from sympy import sympify
+from sympy.polys.constructor import construct_domain
+
+# the variable of characteristic polynomials
+LAMBDA = Symbol('lamda')  # sympy's spelling, lambda is a python keyword
+
+
+def prepare_matrix(operation, request_json):
+    """Prepares operations which take a single square matrix, e.g. det."""
+
+    # get params
+    raw_matrix = request_json.get('matrix')  # list of rows of python safe strings or numbers
+    variables = request_json.get('variables')  # list of python safe strings
+
+    # verify required params
+    if variables is None:
+        raise errors.InvalidParams('a list of variables is required')
+
+    matrix = _parse_matrix(raw_matrix, 'matrix')
+
+    if operation != 'rref' and matrix.rows != matrix.cols:
+        raise errors.InvalidParams('param \'matrix\' must be square.')
+
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(matrix, variables)
+
+    return Job(operation, request_json, matrix, form)
+
+
+def prepare_matmul(request_json):
+
+    # get params
+    raw_matrices = request_json.get('matrices')  # list of matrices to multiply, in order
+    variables = request_json.get('variables')  # list of python safe strings
+
+    # verify required params
+    if not isinstance(raw_matrices, list) or len(raw_matrices) < 2:
+        raise errors.InvalidParams('param \'matrices\' must be a list of at least two matrices.')
+    if variables is None:
+        raise errors.InvalidParams('a list of variables is required')
+
+    matrices = [_parse_matrix(raw_matrix, 'matrices') for raw_matrix in raw_matrices]
+
+    for left, right in zip(matrices, matrices[1:]):
+        if left.cols != right.rows:
+            raise errors.InvalidParams('the matrices\' shapes don\'t allow multiplying them.')
+
+    matrices = Tuple(*matrices)
+
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(matrices, variables)
+
+    return Job('matmul', request_json, matrices, form)
+
+
+def compute_det(matrix):
+    if _is_floating(matrix):
+        return sympify(mpmath.det(_to_mpmath(matrix)))
+
+    domain, rows = _to_domain(matrix)
+    return domain.to_sympy(linalg.det(rows, matrix.rows, domain))
+
+
+def compute_inverse(matrix):
+    if _is_floating(matrix):
+        try:
+            return _from_mpmath(mpmath.inverse(_to_mpmath(matrix)))
+        except ZeroDivisionError:
+            raise errors.InvalidParams('the matrix is singular.')
+
+    domain, rows = _to_domain(matrix)
+    inverse = linalg.inverse(rows, matrix.rows, domain)
+    if inverse is None:
+        raise errors.InvalidParams('the matrix is singular.')
+
+    return _from_domain(inverse, matrix.rows, matrix.cols, domain)
+
+
+def compute_rref(matrix):
+    domain, rows = _to_domain(matrix)
+    reduced, pivots, _ = linalg.rref(rows, matrix.cols, domain)
+
+    reduced += [{}] * (matrix.rows - len(reduced))
+    return dict(matrix=_from_domain(reduced, matrix.rows, matrix.cols, domain), pivots=tuple(pivots))
+
+
+def compute_charpoly(matrix):
+    domain, rows = _to_domain(matrix)
+    coeffs = linalg.charpoly(rows, matrix.rows, domain)
+
+    return Poly([domain.to_sympy(coeff) for coeff in coeffs], LAMBDA).as_expr()
+
+
+def compute_eigenvals(matrix):
+    """Returns a dict of eigenvalue -> multiplicity."""
+
+    if _is_floating(matrix):
+        eigenvalues = {}
+        for value in mpmath.eig(_to_mpmath(matrix), left=False, right=False):
+            value = sympify(value)
+            eigenvalues[value] = eigenvalues.get(value, 0) + 1
+        return eigenvalues
+
+    domain, rows = _to_domain(matrix)
+    poly = Poly([domain.to_sympy(coeff) for coeff in linalg.charpoly(rows, matrix.rows, domain)], LAMBDA)
+
+    eigenvalues = roots(poly)
+    if sum(eigenvalues.values()) < matrix.rows:
+        # roots has no formula for e.g. most quintics, numeric ones have CRootOf's
+        if poly.free_symbols - {LAMBDA}:
+            raise errors.InvalidParams('the eigenvalues of the matrix have no closed form.')
+        eigenvalues = {}
+        for root in poly.all_roots():
+            eigenvalues[root] = eigenvalues.get(root, 0) + 1
+
+    return eigenvalues
+
+
+def compute_matmul(matrices):
+    if any(_is_floating(matrix) for matrix in matrices):
+        product = _to_mpmath(matrices[0])
+        for matrix in matrices[1:]:
+            product = product * _to_mpmath(matrix)
+        return _from_mpmath(product)
+
+    # one domain for all the matrices, so their elements can be multiplied
+    entries = [entry for matrix in matrices for entry in matrix]
+    domain, elements = construct_domain(entries, field=True, extension=True)
+
+    product = None
+    offset = 0
+    for matrix in matrices:
+        rows = _sparse_rows(elements[offset:offset + len(matrix)], matrix.rows, matrix.cols)
+        offset += len(matrix)
+        product = rows if product is None else linalg.matmul(product, rows, matrix.cols, domain)
+
+    return _from_domain(product, matrices[0].rows, matrices[-1].cols, domain)
+
+
+def render_rref(job, result):
+    response = dict(requestParams=job.request_json)
+    response.update(printing.fields(job, result['matrix']))
+    response['pivots'] = list(result['pivots'])
+    return response
+
+
+def _parse_matrix(raw_matrix, name):
+    if not isinstance(raw_matrix, list) or not raw_matrix or not all(isinstance(row, list) for row in raw_matrix):
+        raise errors.InvalidParams('param \'' + name + '\' must be a list of rows.')
+
+    if len(set(len(row) for row in raw_matrix)) != 1 or not raw_matrix[0]:
+        raise errors.InvalidParams('the rows of param \'' + name + '\' must have the same, nonzero length.')
+
+    if len(raw_matrix) > config.MATRIX_MAX_SIZE or len(raw_matrix[0]) > config.MATRIX_MAX_SIZE:
+        raise errors.InvalidParams('matrices may have at most ' + str(config.MATRIX_MAX_SIZE) + ' rows and columns.')
+
+    return ImmutableMatrix([[canonical.parse(str(entry)) for entry in row] for row in raw_matrix])
+
+
+def _is_floating(matrix):
+    # numeric matrices with float entries are computed with mpmath
+    return matrix.has(Float) and not matrix.free_symbols
+
+
+def _to_domain(matrix):
+    domain, elements = construct_domain(list(matrix), field=True, extension=True)
+    return domain, _sparse_rows(elements, matrix.rows, matrix.cols)
+
+
+def _sparse_rows(elements, nrows, ncols):
+    return [
+        dict((c, elements[r * ncols + c]) for c in range(ncols) if elements[r * ncols + c])
+        for r in range(nrows)
+    ]
+
+
+def _from_domain(rows, nrows, ncols, domain):
+    return ImmutableMatrix(nrows, ncols, lambda r, c: domain.to_sympy(rows[r].get(c, domain.zero)))
+
+
+def _to_mpmath(matrix):
+    return mpmath.matrix([[complex(entry) if not entry.is_real else float(entry) for entry in matrix.row(r)]
+                          for r in range(matrix.rows)])
+
+
+def _from_mpmath(matrix):
+    return ImmutableMatrix(matrix.rows, matrix.cols, lambda r, c: sympify(matrix[r, c]))
@@ -0,0 +1,349 @@
+"""
+Request metrics in the Prometheus text format, served at /metrics.
+
+Every process records into its own registry. With SYMSERVER_METRICS_DIR set
+(gunicorn.conf.py sets it), a background thread writes the registry to
+<dir>/<pid>.json every METRICS_FLUSH_INTERVAL seconds and /metrics sums the
+files of all processes, so any worker answers for the whole host. Counters and
+histograms of exited processes keep counting, gauges only of live ones.
+"""
+
+import atexit
+import contextlib
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from symserver import config
+from symserver import errors
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 3, 10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'symserver_requests_total': ('counter', 'Requests by operation.', None),
+    'symserver_errors_total': ('counter', 'Failed requests by operation and error type.', None),
+    'symserver_cache_lookups_total': ('counter', 'Result lookups by operation and outcome: hit, store_hit or miss.', None),
+    'symserver_print_cache_lookups_total': ('counter', 'Printed string lookups by operation, format and outcome: hit or miss.', None),
+    'symserver_request_seconds': ('histogram', 'Time spent answering requests, by operation.', LATENCY_BUCKETS),
+    'symserver_phase_seconds': ('histogram', 'Time spent in parse_expr, compute, latex and str, by operation.', LATENCY_BUCKETS),
+    'symserver_expression_size': ('histogram', 'Nodes of the parsed expressions, by operation.', SIZE_BUCKETS),
+    'symserver_pool_queue_depth': ('gauge', 'Jobs waiting for a free worker process.', None),
+    'symserver_pool_busy_workers': ('gauge', 'Worker processes computing a job.', None),
+    'symserver_admission_waiting': ('gauge', 'Jobs waiting for admission to compute.', None),
+    'symserver_admission_backlog_seconds': ('gauge', 'Estimated seconds of computation the waiting jobs add up to.', None),
+    'symserver_worker_recycles_total': ('counter', 'Worker processes replaced for their memory use, by the operation they computed last.', None),
+    'symserver_in_flight': ('gauge', 'Distinct jobs being computed while identical requests wait for them.', None),
+}
+
+_local = threading.local()  # operation of the request this thread answers, and whether it's recorded
+
+
+class Registry(object):
+    """The counters and histograms of one process, keyed by name and sorted label pairs."""
+
+    def __init__(self):
+        self.counters = {}  # name -> {labels: value}
+        self.histograms = {}  # name -> {labels: [count per bucket..., count above, sum]}
+        self.gauges = {}  # name -> function returning this process' value
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            values = self.counters.setdefault(name, {})
+            values[key] = values.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = _labels(labels)
+        index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+        with self._lock:
+            values = self.histograms.setdefault(name, {})
+            counts = values.setdefault(key, [0] * (len(buckets) + 2))
+            counts[index] += 1
+            counts[-1] += value
+
+    def gauge(self, name, function):
+        self.gauges[name] = function
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """This process' values as plain, JSON serializable python values."""
+
+        with self._lock:
+            snapshot = dict(
+                pid=os.getpid(),
+                counters=dict((name, [[list(key), value] for key, value in values.items()])
+                              for name, values in self.counters.items()),
+                histograms=dict((name, [[list(key), list(counts)] for key, counts in values.items()])
+                                for name, values in self.histograms.items()),
+            )
+
+        snapshot['gauges'] = {}
+        for name, function in self.gauges.items():
+            try:
+                snapshot['gauges'][name] = function()
+            except Exception:
+                logger.exception('failed to collect gauge %s', name)
+
+        return snapshot
+
+
+registry = Registry()
+
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def request(operation):
+    """Counts and times the request the block answers, labelling what's recorded in it with `operation`."""
+
+    start = time.monotonic()
+    try:
+        with labelled(operation):
+            yield
+    except Exception as e:
+        with labelled(operation):
+            count_error(e)
+        raise
+    finally:
+        record_request(operation, time.monotonic() - start)
+
+
+@contextlib.contextmanager
+def labelled(operation):
+    """
+    Labels what's recorded in the block with `operation`, without counting a
+    request. Code answering requests concurrently in one thread (see asgi.py)
+    must not await in the block: the label belongs to the thread.
+    """
+
+    previous = getattr(_local, 'operation', None)
+    _local.operation = operation
+    try:
+        yield
+    finally:
+        _local.operation = previous
+
+
+def record_request(operation, seconds):
+    """Counts a request which took `seconds`, for requests not answered in a request block."""
+
+    _record(registry.count, 'symserver_requests_total', operation=operation)
+    _record(registry.observe, 'symserver_request_seconds', seconds, operation=operation)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Times the block as a phase of the current request."""
+
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe('symserver_phase_seconds', time.monotonic() - start, phase=name)
+
+
+def count(name, value=1, **labels):
+    labels.setdefault('operation', _operation())
+    _record(registry.count, name, value, **labels)
+
+
+def observe(name, value, **labels):
+    labels.setdefault('operation', _operation())
+    _record(registry.observe, name, value, **labels)
+
+
+def count_error(e):
+    count('symserver_errors_total', type=errors.describe(e)[0]['errorType'])
+
+
+@contextlib.contextmanager
+def suppressed():
+    """Records nothing in the block's thread, e.g. for the warm-up's requests."""
+
+    _local.suppressed = True
+    try:
+        yield
+    finally:
+        _local.suppressed = False
+
+
+def render():
+    """The metrics of this host in the Prometheus text exposition format."""
+
+    if config.METRICS_DIR:
+        flush()
+        snapshots = _read_snapshots()
+    else:
+        snapshots = [registry.snapshot()]
+
+    counters, histograms, gauges = _merge(snapshots)
+
+    lines = []
+    for name in sorted(METRICS):
+        kind, help_text, buckets = METRICS[name]
+        lines.append('# HELP ' + name + ' ' + help_text)
+        lines.append('# TYPE ' + name + ' ' + kind)
+
+        if kind == 'counter':
+            for key, value in sorted(counters.get(name, {}).items()):
+                lines.append(name + _format_labels(key) + ' ' + _format_value(value))
+        elif kind == 'gauge':
+            if name in gauges:
+                lines.append(name + ' ' + _format_value(gauges[name]))
+        else:
+            for key, counts in sorted(histograms.get(name, {}).items()):
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(name + '_bucket' + _format_labels(key + (('le', _format_value(bound)),))
+                                 + ' ' + _format_value(cumulative))
+                lines.append(name + '_sum' + _format_labels(key) + ' ' + _format_value(counts[-1]))
+                lines.append(name + '_count' + _format_labels(key) + ' ' + _format_value(cumulative))
+
+    return '\n'.join(lines) + '\n'
+
+
+def flush():
+    """Writes this process' snapshot to METRICS_DIR."""
+
+    if not config.METRICS_DIR:
+        return
+
+    os.makedirs(config.METRICS_DIR, exist_ok=True)
+    path = os.path.join(config.METRICS_DIR, str(os.getpid()) + '.json')
+
+    # readers must never see a partial file
+    with open(path + '.tmp', 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def clear_directory():
+    """Removes the files of previous runs, call it once per host before the workers start."""
+
+    for path in glob.glob(os.path.join(config.METRICS_DIR, '*.json')):
+        os.unlink(path)
+
+
+def _record(method, *args, **labels):
+    if getattr(_local, 'suppressed', False):
+        return
+    method(*args, **labels)
+    _start_flusher()
+
+
+def _operation():
+    return getattr(_local, 'operation', None) or 'none'
+
+
+def _start_flusher():
+    # one per process which records, a forked child starts its own
+    global _flusher_pid
+
+    if not config.METRICS_DIR or _flusher_pid == os.getpid():
+        return
+
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+        thread = threading.Thread(target=_flush_loop, name='symserver-metrics')
+        thread.daemon = True
+        thread.start()
+        atexit.register(_flush_quietly)
+
+
+def _flush_loop():
+    pid = os.getpid()
+    while pid == os.getpid():
+        time.sleep(config.METRICS_FLUSH_INTERVAL)
+        _flush_quietly()
+
+
+def _flush_quietly():
+    try:
+        flush()
+    except Exception:
+        logger.exception('failed to write metrics to %s', config.METRICS_DIR)
+
+
+def _read_snapshots():
+    snapshots = []
+    for path in glob.glob(os.path.join(config.METRICS_DIR, '*.json')):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # e.g. removed since globbing
+    return snapshots
+
+
+def _merge(snapshots):
+    counters, histograms, gauges = {}, {}, {}
+
+    for snapshot in snapshots:
+        for name, values in snapshot['counters'].items():
+            merged = counters.setdefault(name, {})
+            for key, value in values:
+                key = tuple(tuple(pair) for pair in key)
+                merged[key] = merged.get(key, 0) + value
+
+        for name, values in snapshot['histograms'].items():
+            merged = histograms.setdefault(name, {})
+            for key, counts in values:
+                key = tuple(tuple(pair) for pair in key)
+                if key in merged:
+                    merged[key] = [a + b for a, b in zip(merged[key], counts)]
+                else:
+                    merged[key] = counts
+
+        if _is_alive(snapshot['pid']):
+            for name, value in snapshot['gauges'].items():
+                gauges[name] = gauges.get(name, 0) + value
+
+    return counters, histograms, gauges
+
+
+def _is_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(name + '="' + value + '"' for (name, _), value in zip(key, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return value
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
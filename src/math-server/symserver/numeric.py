@@ -0,0 +1,369 @@
+import sys
+import numpy
+from symserver import arrays
+from symserver import canonical
+from symserver import config
+from symserver import errors
+from symserver import printing
+from symserver.cache import LRUCache
+from symserver.job import Job
+from sympy import lambdify
+
+# compiled evaluators, keyed by (canonical expr, argument symbols)
+evaluator_cache = LRUCache(
+    config.EVALUATOR_CACHE_SIZE,
+    max_weight=config.EVALUATOR_CACHE_BYTES,
+    weigh=lambda evaluator: _sizeof_evaluator(evaluator),
+)
+
+# handle -> (parsed expr, canonical form) of previous evaluate requests
+evaluator_handles = LRUCache(config.EVALUATOR_HANDLES)
+
+
+def prepare_evaluate(request_json):
+
+    # get params
+    raw_expr = request_json.get('expr')  # python safe string
+    variables = request_json.get('variables')  # list of python safe strings
+    handle = request_json.get('handle')  # from a previous response, instead of expr and variables
+    values = request_json.get('values')  # dict of variable -> column of values, see arrays.decode
+    encoding = request_json.get('encoding', 'base64')  # how to send the result, see arrays.encode
+
+    # verify required params
+    if not isinstance(values, dict):
+        raise errors.InvalidParams('param \'values\' is required.')
+    if encoding not in arrays.ENCODINGS:
+        raise errors.InvalidParams('param \'encoding\' must be one of ' + ', '.join(arrays.ENCODINGS) + '.')
+
+    if handle is not None:
+        registered = evaluator_handles.get(handle)
+        if registered is None:
+            raise errors.UnknownHandle('unknown handle, send \'expr\' and \'variables\' instead')
+        expr, form = registered
+    else:
+        if not isinstance(raw_expr, str):
+            raise errors.InvalidParams('param \'expr\' is required without a \'handle\'.')
+        if variables is None:
+            raise errors.InvalidParams('a list of variables is required')
+        if len(raw_expr.split("=")) > 1:
+            raise errors.InvalidParams('input must be an expression and therefore contain no equals sign')
+
+        expr = canonical.parse(raw_expr)
+
+        # rename the variables to canonical placeholders
+        form = canonical.CanonicalForm(expr, variables)
+        handle = canonical.structural_key(form.expr, tuple(form.names))
+        evaluator_handles.put(handle, (expr, form))
+
+    missing = sorted(sym.name for sym in expr.free_symbols if sym.name not in values)
+    if missing:
+        raise errors.InvalidParams('no values for variables ' + ', '.join(missing))
+    undeclared = sorted(sym.name for sym in expr.free_symbols if sym.name not in form.names)
+    if undeclared:
+        raise errors.InvalidParams(
+            'variables ' + ', '.join(undeclared) + ' have values but are not listed in param \'variables\'')
+
+    columns = dict((name, arrays.decode(column, name)) for name, column in values.items())
+
+    rows = set(len(column) for column in columns.values())
+    if len(rows) > 1:
+        raise errors.InvalidParams('every variable must have the same number of values')
+    rows = rows.pop() if rows else 1
+    if rows > config.EVALUATE_MAX_ROWS:
+        raise errors.InvalidParams('at most ' + str(config.EVALUATE_MAX_ROWS) + ' rows can be evaluated at once')
+
+    job = Job('evaluate', request_json, expr, form,
+              args=tuple(form.symbol(name) for name in form.names),
+              inputs=dict(columns=[columns[name] for name in form.names], rows=rows))
+    job.handle = handle
+
+    return job
+
+
+def compute_evaluate(expr, *symbols, columns=(), rows=1):
+    evaluator = get_evaluator(expr, symbols)
+
+    with numpy.errstate(all='ignore'):
+        result = evaluator(*columns)
+
+    return numpy.broadcast_to(_as_numbers(result), (rows,))
+
+
+def render_evaluate(job, values):
+    # echoing the values back would defeat the compact payload
+    request_params = dict((k, v) for k, v in job.request_json.items() if k != 'values')
+
+    response = dict(
+        requestParams=request_params,
+        result=arrays.encode(values, job.request_json.get('encoding', 'base64')),
+        handle=job.handle,
+    )
+    if 'latex' in job.formats:
+        response['parsedExprAsLatex'] = printing.latex(job.parsed_expr)
+    return response
+
+
+def get_evaluator(expr, symbols):
+    """Returns expr compiled to a NumPy function of symbols."""
+
+    key = (expr, tuple(symbols))
+    evaluator = evaluator_cache.get(key)
+
+    if evaluator is None:
+        evaluator = lambdify(symbols, expr, modules='numpy')
+        evaluator_cache.put(key, evaluator)
+
+    return evaluator
+
+
+def _sizeof_evaluator(evaluator):
+    # lambdify gives every function its own copy of the numpy namespace
+    return (
+        sys.getsizeof(evaluator.__globals__) +
+        sys.getsizeof(evaluator.__code__.co_code) +
+        len(evaluator.__doc__ or '')
+    )
+
+
+def _as_numbers(result):
+    result = numpy.asarray(result)
+
+    if result.dtype.kind not in 'fc':
+        # e.g. an integer constant, or SymPy objects lambdify could not translate
+        try:
+            result = result.astype(numpy.float64)
+        except (TypeError, ValueError):
+            try:
+                result = result.astype(numpy.complex128)
+            except (TypeError, ValueError):
+                raise errors.InvalidParams('expression can not be evaluated numerically')
+
+    if result.dtype.kind == 'c' and not numpy.any(result.imag):
+        result = result.real
+
+    return result
+
+
+def prepare_sample(request_json):
+
+    # get params
+    raw_expr = request_json.get('expr')  # python safe string
+    variables = request_json.get('variables')  # list of python safe strings
+    wrt = request_json.get('wrt')  # variable on the x axis
+    leftBound = request_json.get('leftBound')
+    rightBound = request_json.get('rightBound')
+    pixels = request_json.get('pixels', config.SAMPLE_DEFAULT_PIXELS)  # width of the plot
+    height = request_json.get('height', pixels)  # height of the plot, in pixels
+
+    # verify required params
+    if not isinstance(raw_expr, str):
+        raise errors.InvalidParams('param \'expr\' is required.')
+    if wrt is None:
+        raise errors.InvalidParams('param \'wrt\' is required.')
+    if variables is None:
+        raise errors.InvalidParams('list of variables are required')
+    if leftBound is None or rightBound is None:
+        raise errors.InvalidParams('params \'leftBound\' and \'rightBound\' are required.')
+
+    for name, value in (('pixels', pixels), ('height', height)):
+        if not isinstance(value, int) or not 2 <= value <= config.SAMPLE_MAX_PIXELS:
+            raise errors.InvalidParams('param \'' + name + '\' must be a whole number between 2 and ' + str(config.SAMPLE_MAX_PIXELS) + '.')
+
+    # wrt may also be sent like derivative's, as a list with one entry
+    if isinstance(wrt, list):
+        if len(wrt) != 1:
+            raise errors.InvalidParams('param \'wrt\' must contain exactly one variable.')
+        wrt = wrt[0]
+
+    if len(raw_expr.split("=")) > 1:
+        raise errors.InvalidParams('input must be an expression and therefore contain no equals sign')
+
+    expr = canonical.parse(raw_expr)
+
+    others = sorted(sym.name for sym in expr.free_symbols if sym.name != wrt)
+    if others:
+        raise errors.InvalidParams('the expression may only depend on \'' + wrt + '\', not on ' + ', '.join(others))
+
+    left = _number(leftBound, 'leftBound')
+    right = _number(rightBound, 'rightBound')
+    if not left < right:
+        raise errors.InvalidParams('\'leftBound\' must be less than \'rightBound\'')
+
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(expr, variables, required=[wrt])
+
+    return Job('sample', request_json, expr, form, args=(form.symbol(wrt), left, right, pixels, height))
+
+
+def compute_sample(expr, wrt, left, right, pixels, height):
+    """
+    Samples expr over [left, right] for a plot `pixels` wide and `height`
+    high. Starts from a coarse uniform grid and bisects, all at once, every
+    segment next to a point where the curve bends by more than a few degrees
+    on screen, until the curve is smooth or the evaluation budget is spent.
+    The curve is split where it is undefined or jumps, and each piece is
+    reduced to the fewest points within half a pixel of it.
+    """
+
+    evaluator = get_evaluator(expr, (wrt,))
+
+    def f(xs):
+        with numpy.errstate(all='ignore'):
+            ys = numpy.broadcast_to(_as_numbers(evaluator(xs)), xs.shape)
+        if ys.dtype.kind == 'c':
+            # only the real parts of the curve can be drawn
+            ys = numpy.where(numpy.abs(ys.imag) <= 1e-12 * numpy.abs(ys.real), ys.real, numpy.nan)
+        return numpy.asarray(ys, dtype=numpy.float64)
+
+    max_points = pixels * config.SAMPLE_OVERSAMPLING
+    min_dx = (right - left) / (pixels * config.SAMPLE_OVERSAMPLING)
+    min_cos = numpy.cos(numpy.radians(config.SAMPLE_MAX_BEND))
+
+    xs = numpy.linspace(left, right, max(16, pixels // 4))
+    ys = f(xs)
+
+    while len(xs) < max_points:
+        px, py = _to_pixels(xs, ys, left, right, pixels, height)
+        finite = numpy.isfinite(py)
+
+        # locate where the curve becomes undefined
+        refine = finite[:-1] != finite[1:]
+
+        # bisect both segments around a bend
+        dx, dy = numpy.diff(px), numpy.diff(py)
+        with numpy.errstate(all='ignore'):
+            cos = (dx[:-1] * dx[1:] + dy[:-1] * dy[1:]) / (numpy.hypot(dx[:-1], dy[:-1]) * numpy.hypot(dx[1:], dy[1:]))
+            bent = ~(cos >= min_cos) & finite[1:-1] & finite[:-2] & finite[2:]
+        refine[:-1] |= bent
+        refine[1:] |= bent
+
+        refine &= numpy.diff(xs) > min_dx
+        indices = numpy.nonzero(refine)[0][:max_points - len(xs)]
+        if not len(indices):
+            break
+
+        mids = (xs[indices] + xs[indices + 1]) / 2
+        xs = numpy.insert(xs, indices + 1, mids)
+        ys = numpy.insert(ys, indices + 1, f(mids))
+
+    px, py = _to_pixels(xs, ys, left, right, pixels, height)
+    finite = numpy.isfinite(py)
+
+    # split the curve where it's undefined or jumps (e.g. at poles)
+    with numpy.errstate(invalid='ignore'):
+        steep = numpy.nonzero(finite[:-1] & finite[1:] & (numpy.abs(numpy.diff(py)) > height / 4))[0]
+    jumps, discontinuities = _find_jumps(f, xs[steep], ys[steep], xs[steep + 1], ys[steep + 1])
+    breaks = numpy.zeros(len(xs) - 1, dtype=bool)
+    breaks[steep[jumps]] = True
+
+    segments = []
+    start = None
+    for i in range(len(xs)):
+        if finite[i] and start is None:
+            start = i
+        if start is not None and (i == len(xs) - 1 or not finite[i + 1] or breaks[i]):
+            # a lone sample between two breaks is a pole hit head on
+            if start < i or not (start > 0 and breaks[start - 1] and i < len(breaks) and breaks[i]):
+                keep = _simplify(px[start:i + 1], py[start:i + 1], config.SAMPLE_TOLERANCE)
+                segments.append([[float(x), float(y)] for x, y in zip(xs[start:i + 1][keep], ys[start:i + 1][keep])])
+            start = None
+
+    # both sides of a pole hit head on find the same discontinuity
+    merged = []
+    for x in sorted(discontinuities):
+        if not merged or x - merged[-1] > min_dx:
+            merged.append(float(x))
+
+    return dict(segments=segments, discontinuities=merged)
+
+
+def render_sample(job, result):
+    response = dict(
+        requestParams=job.request_json,
+        segments=result['segments'],
+        discontinuities=result['discontinuities'],
+    )
+    if 'latex' in job.formats:
+        response['parsedExprAsLatex'] = printing.latex(job.parsed_expr)
+    return response
+
+
+def _number(value, name):
+    try:
+        number = canonical.parse(str(value))
+        if number.free_symbols:
+            raise TypeError()
+        number = float(number.evalf())
+    except (TypeError, ValueError, SyntaxError, AttributeError):
+        raise errors.InvalidParams('param \'' + name + '\' must be a number.')
+    if not numpy.isfinite(number):
+        raise errors.InvalidParams('param \'' + name + '\' must be finite.')
+    return number
+
+
+def _find_jumps(f, xa, ya, xb, yb):
+    """
+    Tells which of the segments (xa, ya) - (xb, yb) contain a jump or a pole.
+    Bisects every segment, keeping the half where y changes most: the change
+    shrinks with the segment where the curve is continuous, and stays or
+    grows across a discontinuity. Returns the mask of segments with a
+    discontinuity and where it is.
+    """
+
+    initial = numpy.abs(yb - ya)
+
+    with numpy.errstate(invalid='ignore'):
+        for _ in range(config.SAMPLE_JUMP_BISECTIONS):
+            xm = (xa + xb) / 2
+            ym = f(xm)
+            # an undefined midpoint counts as the bigger change
+            left = ~(numpy.abs(ym - ya) <= numpy.abs(yb - ym))
+            xa, ya, xb, yb = (
+                numpy.where(left, xa, xm), numpy.where(left, ya, ym),
+                numpy.where(left, xm, xb), numpy.where(left, ym, yb),
+            )
+
+        jumps = ~(numpy.abs(yb - ya) < initial / 4)
+
+    return jumps, ((xa + xb) / 2)[jumps]
+
+
+def _to_pixels(xs, ys, left, right, pixels, height):
+    # scale y to the central range of the values, so poles don't flatten the rest of the curve
+    finite = ys[numpy.isfinite(ys)]
+    span = 1.0
+    if len(finite):
+        low, high = numpy.percentile(finite, [5, 95])
+        span = max(high - low, 1e-12 * max(abs(high), abs(low)), 1e-300)
+    return (xs - left) * (pixels / (right - left)), ys * (height / span)
+
+
+def _simplify(px, py, tolerance):
+    """
+    Ramer-Douglas-Peucker: returns a mask of the fewest points of the
+    polyline which keep it within `tolerance` pixels of the original.
+    """
+
+    keep = numpy.zeros(len(px), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(px) - 1)]
+
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+
+        dx, dy = px[b] - px[a], py[b] - py[a]
+        length = numpy.hypot(dx, dy)
+        if length == 0:
+            distances = numpy.hypot(px[a + 1:b] - px[a], py[a + 1:b] - py[a])
+        else:
+            distances = numpy.abs(dy * (px[a + 1:b] - px[a]) - dx * (py[a + 1:b] - py[a])) / length
+
+        i = int(numpy.argmax(distances))
+        if distances[i] > tolerance:
+            keep[a + 1 + i] = True
+            stack.append((a, a + 1 + i))
+            stack.append((a + 1 + i, b))
+
+    return keep
@@ -1,16 +1,72 @@
+from symserver import admission
+from symserver import canonical
+from symserver import config
 from symserver import errors
-from sympy import Symbol
+from symserver import integration
+from symserver import matrices
+from symserver import metrics
+from symserver import printing
+from symserver import profiling
+from symserver import simplification
+from symserver import singleflight
+from symserver import sizes
+from symserver import solvers
+from symserver import store
+from symserver import numeric
+from symserver.cache import LRUCache
+from symserver.job import Job
 from sympy import diff
-from sympy import integrate
-from sympy import solve
 from sympy import expand
 from sympy import simplify
 from sympy import factor
-from sympy.parsing.sympy_parser import parse_expr
-from sympy.printing import latex
+from sympy import cse
+from sympy import numbered_symbols
+from sympy import ImmutableMatrix
+from sympy import Add
+from sympy import Basic
+from sympy import preorder_traversal
 
 
-def handle_request(request_json):
+# canonical results of previous requests, keyed by Job.key
+result_cache = LRUCache(config.RESULT_CACHE_SIZE, ttl=config.RESULT_CACHE_TTL)
+
+# the same on local disk, shared by the host's processes and kept across restarts, None when disabled
+result_store = store.open_store()
+
+# concurrent computations of the same job, coalesced across processes when they share result_store
+flights = singleflight.SingleFlight(
+    lock_dir=config.SINGLE_FLIGHT_LOCKS if result_store is not None else None,
+    timeout=config.SINGLE_FLIGHT_TIMEOUT,
+)
+metrics.registry.gauge('symserver_in_flight', lambda: flights.stats()['inFlight'])
+
+# canonical derivatives, keyed by (expr, sorted tuple of the symbols differentiated by)
+derivative_cache = LRUCache(config.DERIVATIVE_CACHE_SIZE)
+
+
+def handle_request(request_json, executor=None, profile=False, client=None):
+    """
+    Computes the request. `executor` computes a Job whose result isn't cached,
+    it defaults to computing in this thread (see engine.get_executor). With
+    `profile` the result is computed, never looked up, under cProfile and the
+    response gets a summary of the profile. Computations are admitted per
+    admission.py, `client` names who sent the request for its limits.
+    """
+
+    operation = request_json.get('operation') if isinstance(request_json, dict) else None
+
+    with metrics.request(operation if operation in OPERATIONS else 'unknown'):
+        job = prepare(request_json)
+        job.profile = profile
+        job.client = client
+
+        response = respond(job, run(job, executor=executor))
+        if job.profile_report is not None:
+            response['profile'] = job.profile_report
+        return response
+
+
+def prepare(request_json):
     if request_json is None:
         raise errors.InvalidParams('A request body is required.')
 
@@ -19,29 +75,93 @@ def handle_request(request_json):
     if operation is None:
         raise errors.InvalidParams('No operation provided.')
 
-    if operation == 'derivative':
-        return derivative(request_json=request_json)
+    if operation not in OPERATIONS:
+        raise errors.InvalidParams('Operation ' + operation + ' not supported.')
 
-    if operation == 'integral':
-        return integral(request_json=request_json)
+    prepare_operation, _, _ = OPERATIONS[operation]
+    job = prepare_operation(request_json)
+    job.formats = printing.get_formats(request_json)
 
-    if operation == 'solveFor':
-        return solveFor(request_json=request_json)
+    job.size = _tree_size(job.parsed_expr)
+    metrics.observe('symserver_expression_size', job.size)
+    return job
 
-    if operation == 'expandExpr':
-        return expandExpr(request_json=request_json)
 
-    if operation == 'simplifyExpr':
-        return simplifyExpr(request_json=request_json)
+def run(job, executor=None):
+    executor = executor or execute
+    result = cached_result(job) if not job.profile else None
+    if result is not None:
+        return result
 
-    if operation == 'factorExpr':
-        return factorExpr(request_json=request_json)
+    def compute():
+        with admission.admitted(job), metrics.phase('compute'):
+            computed = executor(job)
+        store_result(job, computed)
+        return computed
 
-    else:
-        raise errors.InvalidParams('Operation ' + operation + ' not supported.')
+    if config.SINGLE_FLIGHT and job.operation in config.RESULT_CACHE_OPERATIONS and not job.profile:
+        return flights.run(job.key, compute, lambda: cached_result(job))
+    return compute()
+
+
+def cached_result(job):
+    """Returns the cached canonical result of the job, None when not cached."""
+    if job.operation not in config.RESULT_CACHE_OPERATIONS:
+        return None
+
+    outcome = 'hit'
+    result = result_cache.get(job.key)
+    if result is None and result_store is not None:
+        outcome = 'store_hit'
+        result = result_store.get(job.key)
+        if result is not None:
+            result_cache.put(job.key, result)
+
+    metrics.count('symserver_cache_lookups_total', outcome=outcome if result is not None else 'miss')
+    return result
+
+
+def store_result(job, result):
+    if job.operation in config.RESULT_CACHE_OPERATIONS:
+        result_cache.put(job.key, result)
+        if result_store is not None:
+            result_store.put(job.key, result)
+
+
+def _tree_size(obj):
+    # nodes of the expression tree(s), for the expression size metric and admission's cost estimates
+    if isinstance(obj, Basic):
+        return sum(1 for _ in preorder_traversal(obj))
+    if isinstance(obj, (list, tuple)):
+        return sum(_tree_size(item) for item in obj)
+    return 1
+
+
+def execute(job):
+    _, compute_operation, _ = OPERATIONS[job.operation]
+    with profiling.profiled(job):
+        return compute_operation(job.form.expr, *job.args, **job.inputs)
+
+
+def respond(job, result):
+    _, _, render_operation = OPERATIONS[job.operation]
+
+    # rewrite the canonical result back into the caller's symbols
+    return render_operation(job, job.form.from_canonical(result))
+
+
+def render_expression(job, result):
+    response = dict(requestParams=job.request_json)
+    response.update(printing.fields(job, result))
+    return response
 
 
 def derivative(request_json):
+    job = prepare_derivative(request_json)
+    return respond(job, execute(job))
+
+
+def prepare_derivative(request_json):
 
     # get params
     raw_expr = request_json.get('expr')  # python safe string
@@ -49,39 +169,188 @@ def derivative(request_json):
     wrt = request_json.get('wrt')  # list of python safe strings
 
     # verify required params
+    if not isinstance(raw_expr, str):
+        raise errors.InvalidParams('param \'expr\' is required.')
     if wrt is None:
         raise errors.InvalidParams('param \'wrt\' is required.')
     if variables is None:
         raise errors.InvalidParams('list of variables are required')
 
+    policy = simplification.get_policy(request_json, 'none')
+
     # parse the expression
-    expr = parse_expr(raw_expr)
+    expr = canonical.parse(raw_expr)
+
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(expr, variables, required=wrt)
+
+    # mixed partials commute, so the order of wrt doesn't matter
+    sym_wrt = tuple(sorted((form.symbol(var) for var in wrt), key=str))
+
+    job = Job('derivative', request_json, expr, form, args=sym_wrt, inputs=dict(policy=policy))
+    # added after the key, it only saves work: the worker computing the job needn't be the one which computed it
+    job.inputs['known'] = _known_derivative(form, sym_wrt)
+    return job
+
+
+def _known_derivative(form, wrt):
+    # (order, derivative) of the highest order lower derivative a previous request left in the result cache
+    for order in range(len(wrt) - 1, 0, -1):
+        lower = Job('derivative', None, form.original, form, args=wrt[:order], inputs=dict(policy='none'))
+        result = result_cache.get(lower.key)
+        if result is None and result_store is not None:
+            result = result_store.get(lower.key)
+        if result is not None:
+            return order, result
+    return None
+
+
+def compute_derivative(expr, *wrt, policy='none', known=None):
+    """
+    Differentiates expr once per entry of wrt. Every intermediate derivative
+    is memoized in this process, so d3/dx3 after d2/dx2 only costs one more
+    diff. Pool workers don't share that memo, so prepare_derivative also
+    passes the highest order derivative found in the shared result cache
+    and store as `known`. The result is then simplified according to policy
+    (see simplification).
+    """
+
+    # start from the highest order derivative already computed
+    result = expr
+    done = 0
+    for order in range(len(wrt), 0, -1):
+        cached = derivative_cache.get((expr, wrt[:order]))
+        if cached is not None:
+            result = cached
+            done = order
+            break
 
-    # extract variables and define them as SymPy Symbols
-    all_variables = variables + list(set(wrt) - set(variables))
-    sym_vars = {}
+    if known is not None and known[0] > done:
+        done, result = known
 
-    i = 0
-    for var in all_variables:
-        sym_vars[str(i)] = Symbol(var)
-        i = i + 1
+    for order in range(done, len(wrt)):
+        result = diff(result, wrt[order])
+        derivative_cache.put((expr, wrt[:order + 1]), result)
 
-    result = expr
+    return simplification.simplify_result(result, policy)
+
+
+def gradient(request_json):
+    job = prepare_partials('gradient', request_json)
+    return respond(job, execute(job))
+
+
+def compute_gradient(expr, *wrt):
+    return _with_cse(ImmutableMatrix([compute_derivative(expr, sym) for sym in wrt]))
+
+
+def hessian(request_json):
+    job = prepare_partials('hessian', request_json)
+    return respond(job, execute(job))
+
+
+def compute_hessian(expr, *wrt):
+    # second partials commute, only compute the upper triangle
+    n = len(wrt)
+    partials = {}
+    for i in range(n):
+        for j in range(i, n):
+            partials[i, j] = compute_derivative(expr, *sorted((wrt[i], wrt[j]), key=str))
+
+    return _with_cse(ImmutableMatrix(n, n, lambda i, j: partials[min(i, j), max(i, j)]))
+
+
+def prepare_partials(operation, request_json):
+    """Prepares operations which take an expression and a list of variables to differentiate by."""
+
+    # get params
+    raw_expr = request_json.get('expr')  # python safe string
+    variables = request_json.get('variables')  # list of python safe strings
+    wrt = request_json.get('wrt')  # list of python safe strings
+
+    # verify required params
+    if not isinstance(raw_expr, str):
+        raise errors.InvalidParams('param \'expr\' is required.')
+    if not isinstance(wrt, list) or not wrt:
+        raise errors.InvalidParams('param \'wrt\' must be a list of variables.')
+    if variables is None:
+        raise errors.InvalidParams('list of variables are required')
+
+    if len(raw_expr.split("=")) > 1:
+        raise errors.InvalidParams('input must be an expression and therefore contain no equals sign')
+
+    # parse the expression
+    expr = canonical.parse(raw_expr)
+
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(expr, variables, required=wrt)
+
+    return Job(operation, request_json, expr, form, args=tuple(form.symbol(var) for var in wrt))
+
+
+def jacobian(request_json):
+    job = prepare_jacobian(request_json)
+    return respond(job, execute(job))
+
+
+def prepare_jacobian(request_json):
+
+    # get params
+    raw_exprs = request_json.get('expr')  # list of python safe strings, the components of the function
+    variables = request_json.get('variables')  # list of python safe strings
+    wrt = request_json.get('wrt')  # list of python safe strings
+
+    # verify required params
+    if not isinstance(raw_exprs, list) or not raw_exprs or not all(isinstance(raw, str) for raw in raw_exprs):
+        raise errors.InvalidParams('param \'expr\' must be a list of expressions.')
+    if not isinstance(wrt, list) or not wrt:
+        raise errors.InvalidParams('param \'wrt\' must be a list of variables.')
+    if variables is None:
+        raise errors.InvalidParams('list of variables are required')
+
+    if any(len(raw_expr.split("=")) > 1 for raw_expr in raw_exprs):
+        raise errors.InvalidParams('input must be an expression and therefore contain no equals sign')
 
-    derivative_order = len(wrt)
-    for deriv in list(range(derivative_order)):
-        deriv_var_index = all_variables.index(wrt[deriv])
-        result = diff(result, sym_vars[str(deriv_var_index)])
+    # parse the expressions, as a column vector
+    exprs = ImmutableMatrix([canonical.parse(raw_expr) for raw_expr in raw_exprs])
 
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(exprs, variables, required=wrt)
+
+    return Job('jacobian', request_json, exprs, form, args=tuple(form.symbol(var) for var in wrt))
+
+
+def compute_jacobian(exprs, *wrt):
+    return _with_cse(ImmutableMatrix(len(exprs), len(wrt), lambda i, j: compute_derivative(exprs[i], wrt[j])))
+
+
+def render_matrix(job, result):
+    replacements, reduced = result['cse']
+
+    response = render_expression(job, result['matrix'])
+    if 'python' in job.formats:
+        response['resultAsCse'] = dict(
+            replacements=[[printing.python(sym), printing.python(value)] for sym, value in replacements],
+            result=printing.python(reduced),
+        )
+    return response
+
+
+def _with_cse(matrix):
+    # factor out the subexpressions the entries share, e.g. for evaluating them
+    replacements, reduced = cse(list(matrix), symbols=numbered_symbols('_cse'))
     return dict(
-        requestParams=request_json,
-        parsedExprAsLatex=latex(expr),
-        resultAsLatex=latex(result),
-        resultAsPython=str(result),
+        matrix=matrix,
+        cse=(replacements, ImmutableMatrix(matrix.rows, matrix.cols, reduced)),
     )
 
 
 def integral(request_json):
+    job = prepare_integral(request_json)
+    return respond(job, execute(job))
+
+
+def prepare_integral(request_json):
 
     # get params
     raw_expr = request_json.get('expr')  # python safe string
@@ -91,37 +360,70 @@ def integral(request_json):
     rightBound = request_json.get('rightBound')
 
     # verify required params
+    if not isinstance(raw_expr, str):
+        raise errors.InvalidParams('param \'expr\' is required.')
     if wrt is None:
         raise errors.InvalidParams('param \'wrt\' is required.')
     if variables is None:
         raise errors.InvalidParams('list of variables are required')
 
+    policy = simplification.get_policy(request_json, config.INTEGRAL_SIMPLIFY)
+
+    # wrt may also be sent like derivative's, as a list with one entry
+    if isinstance(wrt, list):
+        if len(wrt) != 1:
+            raise errors.InvalidParams('param \'wrt\' must contain exactly one variable.')
+        wrt = wrt[0]
+
     # parse the expression
-    expr = parse_expr(raw_expr)
+    expr = canonical.parse(raw_expr)
+
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(expr, variables, required=[wrt])
 
+    bounds = (None, None)
     if leftBound is not None and rightBound is not None:
-        result = integrate(expr, (Symbol(wrt), leftBound, rightBound))
+        bounds = (
+            form.to_canonical(canonical.parse(str(leftBound))),
+            form.to_canonical(canonical.parse(str(rightBound))),
+        )
+
+    return Job('integral', request_json, expr, form, args=(form.symbol(wrt),) + bounds, inputs=dict(policy=policy))
+
+
+def compute_integral(expr, wrt, leftBound=None, rightBound=None, policy='full'):
+    if leftBound is not None and rightBound is not None:
+        result, tier = integration.definite_integral(expr, wrt, leftBound, rightBound)
     else:
-        result = integrate(expr, Symbol(wrt))
+        result, tier = integration.antiderivative(expr, wrt)
 
-    result = simplify(result)
+    if tier != 'quadrature':
+        result = simplification.simplify_result(result, policy)
 
-    return dict(
-        requestParams=request_json,
-        parsedExprAsLatex=latex(expr),
-        resultAsLatex=latex(result),
-        resultAsPython=str(result),
-    )
+    return dict(result=result, tier=tier)
+
+
+def render_integral(job, result):
+    response = render_expression(job, result['result'])
+    response['tier'] = result['tier']
+    return response
 
 
 def solveFor(request_json):
+    job = prepare_solveFor(request_json)
+    return respond(job, execute(job))
+
+
+def prepare_solveFor(request_json):
 
     # get params
-    raw_expr = request_json.get('expr')  # python safe string
+    raw_expr = request_json.get('expr')  # python safe string, or a list of them for a system of equations
     variables = request_json.get('variables')  # list of python safe strings
-    target_var = request_json.get('target_var')  # list containing on python safe string
+    target_var = request_json.get('target_var')  # list containing on python safe string, or several for a system
 
     # verify required params
+    if not isinstance(raw_expr, (str, list)):
+        raise errors.InvalidParams('param \'expr\' is required.')
     if target_var is None:
         raise errors.InvalidParams('param \'target_var\' is required.')
     if variables is None:
@@ -129,137 +431,198 @@ def solveFor(request_json):
     # if target_var[0] not in variables:
     #     raise errors.InvalidParams('\'target_var\' is not in variables list')
 
-    # rearrange the expression
-    split_expr = raw_expr.split("=")
-
-    if len(split_expr) == 2:
-        if split_expr[0].strip() and split_expr[1].strip():
-            rearranged_expr = split_expr[0] + '- (' + split_expr[1] + ')'
-        else:
-            raise errors.InvalidParams('values required on both sides of the \'=\'')
+    policy = simplification.get_policy(request_json, 'none')
+
+    numeric = request_json.get('numeric', False)  # all roots of a polynomial as floats
+    if not isinstance(numeric, bool):
+        raise errors.InvalidParams('param \'numeric\' must be true or false.')
+
+    if isinstance(raw_expr, list):
+        if not raw_expr or len(raw_expr) > config.SOLVE_SYSTEM_MAX_EQUATIONS:
+            raise errors.InvalidParams(
+                'a system must have between 1 and ' + str(config.SOLVE_SYSTEM_MAX_EQUATIONS) + ' equations.')
+        if not all(isinstance(raw, str) for raw in raw_expr):
+            raise errors.InvalidParams('param \'expr\' must be a list of equations.')
+        if not isinstance(target_var, list) or not target_var or len(set(target_var)) != len(target_var):
+            raise errors.InvalidParams('param \'target_var\' must be a list of distinct variables.')
+        if numeric:
+            raise errors.InvalidParams('param \'numeric\' is not supported for systems of equations.')
+
+        # the equations, as a column vector
+        expr = ImmutableMatrix([canonical.parse(_rearrange(raw)) for raw in raw_expr])
+        targets = target_var
     else:
-        raise errors.InvalidParams('exactly one \'=\' is required')
+        expr = canonical.parse(_rearrange(raw_expr))
+        targets = target_var[:1]
 
-    expr = parse_expr(rearranged_expr)
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(expr, variables, required=targets)
 
-    # extract variables and define them as SymPy Symbols
-    all_variables = variables + list(set(target_var) - set(variables))
-    sym_vars = {}
+    inputs = dict(policy=policy, numeric=numeric)
+    return Job('solveFor', request_json, expr, form, args=tuple(form.symbol(var) for var in targets), inputs=inputs)
 
-    i = 0
-    for var in all_variables:
-        sym_vars[str(i)] = Symbol(var)
-        i = i + 1
 
-    target_var_index = all_variables.index(target_var[0])
-    result = None
-    result = solve(expr, sym_vars[str(target_var_index)])
-
-    return dict(
-        requestParams=request_json,
-        parsedExprAsLatex=latex(expr),
-        resultAsLatex=latex(result),
-        resultAsPython=str(result),
-    )
+def compute_solveFor(expr, *targets, policy='none', numeric=False):
+    if isinstance(expr, ImmutableMatrix):
+        solutions, method = solvers.solve_system(list(expr), targets)
+        solutions = [
+            dict((target, simplification.simplify_result(value, policy)) for target, value in solution.items())
+            for solution in solutions
+        ]
+    else:
+        solutions, method = solvers.solve_for(expr, targets[0], numeric=numeric)
+        solutions = [simplification.simplify_result(solution, policy) for solution in solutions]
 
+    return dict(solutions=solutions, method=method)
 
-def expandExpr(request_json):
 
-    # get params
-    raw_expr = request_json.get('expr')  # python safe string
-    variables = request_json.get('variables')  # list of python safe strings
+def _rearrange(raw_expr):
+    # 'lhs = rhs' as 'lhs - (rhs)'
+    split_expr = raw_expr.split("=")
 
-    # verify required params
-    if variables is None:
-        raise errors.InvalidParams('a list of variables is required')
+    if len(split_expr) == 2:
+        if split_expr[0].strip() and split_expr[1].strip():
+            return split_expr[0] + '- (' + split_expr[1] + ')'
+        else:
+            raise errors.InvalidParams('values required on both sides of the \'=\'')
+    else:
+        raise errors.InvalidParams('exactly one \'=\' is required')
 
-    if len(raw_expr.split("=")) > 1:
-        raise errors.InvalidParams('input must be an expression and therefore contain no equals sign')
 
-    expr = parse_expr(raw_expr)
+def render_solveFor(job, result):
+    response = render_expression(job, result['solutions'])
+    response['method'] = result['method']
+    return response
 
-    # extract variables and define them as SymPy Symbols
-    sym_vars = {}
 
-    i = 0
-    for var in variables:
-        sym_vars[str(i)] = Symbol(var)
-        i = i + 1
+def expandExpr(request_json):
+    job = prepare_expression('expandExpr', request_json)
+    return respond(job, execute(job))
 
-    result = None
-    result = expand(expr)
 
-    return dict(
-        requestParams=request_json,
-        parsedExprAsLatex=latex(expr),
-        resultAsLatex=latex(result),
-        resultAsPython=str(result),
-    )
+def compute_expandExpr(expr):
+    return expand(expr)
 
 
 def simplifyExpr(request_json):
+    job = prepare_expression('simplifyExpr', request_json)
+    return respond(job, execute(job))
 
-    # get params
-    raw_expr = request_json.get('expr')  # python safe string
-    variables = request_json.get('variables')  # list of python safe strings
 
-    # verify required params
-    if variables is None:
-        raise errors.InvalidParams('a list of variables is required')
+def compute_simplifyExpr(expr):
+    return simplify(expr)
 
-    if len(raw_expr.split("=")) > 1:
-        raise errors.InvalidParams('input must be an expression and therefore contain no equals sign')
-
-    expr = parse_expr(raw_expr)
 
-    # extract variables and define them as SymPy Symbols
-    sym_vars = {}
-
-    i = 0
-    for var in variables:
-        sym_vars[str(i)] = Symbol(var)
-        i = i + 1
+def factorExpr(request_json):
+    job = prepare_expression('factorExpr', request_json)
+    return respond(job, execute(job))
 
-    result = None
-    result = simplify(expr)
 
-    return dict(
-        requestParams=request_json,
-        parsedExprAsLatex=latex(expr),
-        resultAsLatex=latex(result),
-        resultAsPython=str(result),
-    )
+def compute_factorExpr(expr):
+    return factor(expr)
 
 
-def factorExpr(request_json):
+def prepare_expression(operation, request_json):
+    """Prepares operations which take a single expression and no other params."""
 
     # get params
     raw_expr = request_json.get('expr')  # python safe string
     variables = request_json.get('variables')  # list of python safe strings
 
     # verify required params
+    if not isinstance(raw_expr, str):
+        raise errors.InvalidParams('param \'expr\' is required.')
     if variables is None:
         raise errors.InvalidParams('a list of variables is required')
 
     if len(raw_expr.split("=")) > 1:
         raise errors.InvalidParams('input must be an expression and therefore contain no equals sign')
 
-    expr = parse_expr(raw_expr)
-
-    # extract variables and define them as SymPy Symbols
-    sym_vars = {}
-
-    i = 0
-    for var in variables:
-        sym_vars[str(i)] = Symbol(var)
-        i = i + 1
-
-    result = None
-    result = factor(expr)
-
-    return dict(
-        requestParams=request_json,
-        parsedExprAsLatex=latex(expr),
-        resultAsLatex=latex(result),
-        resultAsPython=str(result),
-    )
+    expr = canonical.parse(raw_expr)
+
+    if operation in admission.EXPANDING:
+        if not isinstance(request_json.get('truncate', True), bool):
+            raise errors.InvalidParams('param \'truncate\' must be true or false.')
+        _check_expansion(expr)
+
+    # rename the variables to canonical placeholders
+    form = canonical.CanonicalForm(expr, variables)
+
+    return Job(operation, request_json, expr, form)
+
+
+def _check_expansion(expr):
+    # refuse what would expand to more terms than can be computed in time, before expanding it
+    cost = sizes.expansion_cost(expr)
+    if config.EXPAND_MAX_TERMS and cost > config.EXPAND_MAX_TERMS:
+        terms = sizes.largest_expansion(expr)
+        raise errors.RequestTooExpensive(
+            'Expanding the expression could build up to ' + _count(terms) + ' terms'
+            + (' of up to ' + _count(int(sizes.coefficient_digits(expr))) + ' digits'
+               if terms <= config.EXPAND_MAX_TERMS else '')
+            + ', more than the limit of ' + str(config.EXPAND_MAX_TERMS) + '.')
+
+
+def _count(count):
+    return str(count) if count < 1e12 else '%.3g' % count
+
+
+def render_terms(job, result):
+    """
+    render_expression, summarizing results with more than RESULT_MAX_TERMS
+    terms by their leading RESULT_SUMMARY_TERMS, or refusing them when the
+    request sends "truncate": false.
+    """
+
+    terms = Add.make_args(result)
+    if not config.RESULT_MAX_TERMS or len(terms) <= config.RESULT_MAX_TERMS:
+        return render_expression(job, result)
+
+    if not job.request_json.get('truncate', True):
+        raise errors.RequestTooExpensive(
+            'The result has ' + str(len(terms)) + ' terms, more than the limit of ' + str(config.RESULT_MAX_TERMS)
+            + '. Send "truncate": true for a summary of it.')
+
+    head = Add(*result.as_ordered_terms()[:config.RESULT_SUMMARY_TERMS])
+    response = render_expression(job, head)
+    if 'resultAsLatex' in response:
+        response['resultAsLatex'] += ' + \\ldots'
+    if 'resultAsPython' in response:
+        response['resultAsPython'] += ' + ...'
+    response['truncated'] = True
+    response['terms'] = len(terms)
+    return response
+
+
+def _expression_operation(operation):
+    return lambda request_json: prepare_expression(operation, request_json)
+
+
+def _partials_operation(operation):
+    return lambda request_json: prepare_partials(operation, request_json)
+
+
+def _matrix_operation(operation):
+    return lambda request_json: matrices.prepare_matrix(operation, request_json)
+
+
+# operation name -> (prepare, compute, render)
+OPERATIONS = {
+    'derivative': (prepare_derivative, compute_derivative, render_expression),
+    'gradient': (_partials_operation('gradient'), compute_gradient, render_matrix),
+    'jacobian': (prepare_jacobian, compute_jacobian, render_matrix),
+    'hessian': (_partials_operation('hessian'), compute_hessian, render_matrix),
+    'integral': (prepare_integral, compute_integral, render_integral),
+    'solveFor': (prepare_solveFor, compute_solveFor, render_solveFor),
+    'expandExpr': (_expression_operation('expandExpr'), compute_expandExpr, render_terms),
+    'simplifyExpr': (_expression_operation('simplifyExpr'), compute_simplifyExpr, render_expression),
+    'factorExpr': (_expression_operation('factorExpr'), compute_factorExpr, render_terms),
+    'evaluate': (numeric.prepare_evaluate, numeric.compute_evaluate, numeric.render_evaluate),
+    'sample': (numeric.prepare_sample, numeric.compute_sample, numeric.render_sample),
+    'det': (_matrix_operation('det'), matrices.compute_det, render_expression),
+    'inverse': (_matrix_operation('inverse'), matrices.compute_inverse, render_expression),
+    'rref': (_matrix_operation('rref'), matrices.compute_rref, matrices.render_rref),
+    'charpoly': (_matrix_operation('charpoly'), matrices.compute_charpoly, render_expression),
+    'eigenvals': (_matrix_operation('eigenvals'), matrices.compute_eigenvals, render_expression),
+    'matmul': (matrices.prepare_matmul, matrices.compute_matmul, render_expression),
+}
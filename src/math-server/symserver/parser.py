@@ -0,0 +1,279 @@
+"""
+A parser for the python safe expression strings of requests, e.g.
+'sin(x)**2 + 3*x/2'. It builds the same SymPy trees as parse_expr does, but
+straight from the tokens instead of by transforming and eval'ing them as
+python: only numbers, names, + - * / % ** !, calls of the FUNCTIONS and
+parentheses are accepted, and tuples as the arguments of calls, e.g. the
+limits of Sum(1/k**2, (k, 1, oo)). Names which aren't FUNCTIONS or CONSTANTS
+are symbols, and calling them fails.
+"""
+
+import keyword
+import re
+import sympy
+from symserver import errors
+from sympy import Add
+from sympy import Float
+from sympy import Integer
+from sympy import Mod
+from sympy import Mul
+from sympy import Pow
+from sympy import Symbol
+from sympy import factorial
+from sympy.core.alphabets import greeks
+
+FUNCTIONS = {
+    'sin': sympy.sin, 'cos': sympy.cos, 'tan': sympy.tan, 'cot': sympy.cot, 'sec': sympy.sec, 'csc': sympy.csc,
+    'asin': sympy.asin, 'acos': sympy.acos, 'atan': sympy.atan, 'acot': sympy.acot, 'asec': sympy.asec,
+    'acsc': sympy.acsc, 'atan2': sympy.atan2,
+    'sinh': sympy.sinh, 'cosh': sympy.cosh, 'tanh': sympy.tanh, 'coth': sympy.coth, 'sech': sympy.sech,
+    'csch': sympy.csch, 'asinh': sympy.asinh, 'acosh': sympy.acosh, 'atanh': sympy.atanh, 'acoth': sympy.acoth,
+    'asech': sympy.asech, 'acsch': sympy.acsch,
+    'exp': sympy.exp, 'log': sympy.log, 'ln': sympy.log, 'sqrt': sympy.sqrt, 'cbrt': sympy.cbrt, 'root': sympy.root,
+    'Abs': sympy.Abs, 'sign': sympy.sign, 'floor': sympy.floor, 'ceiling': sympy.ceiling,
+    're': sympy.re, 'im': sympy.im, 'arg': sympy.arg, 'conjugate': sympy.conjugate,
+    'Min': sympy.Min, 'Max': sympy.Max, 'Mod': sympy.Mod,
+    'factorial': sympy.factorial, 'binomial': sympy.binomial, 'gamma': sympy.gamma, 'loggamma': sympy.loggamma,
+    'erf': sympy.erf, 'erfc': sympy.erfc, 'Heaviside': sympy.Heaviside, 'DiracDelta': sympy.DiracDelta,
+    'beta': sympy.beta, 'zeta': sympy.zeta, 'Rational': sympy.Rational,
+    'diff': sympy.diff, 'Derivative': sympy.Derivative, 'integrate': sympy.integrate, 'Integral': sympy.Integral,
+    'limit': sympy.limit, 'Limit': sympy.Limit, 'summation': sympy.summation, 'Sum': sympy.Sum,
+    'product': sympy.product, 'Product': sympy.Product,
+}
+
+CONSTANTS = {
+    'pi': sympy.pi,
+    'E': sympy.E,
+    'I': sympy.I,
+    'oo': sympy.oo,
+    'EulerGamma': sympy.EulerGamma,
+    'GoldenRatio': sympy.GoldenRatio,
+}
+
+# nesting deeper than this is rejected before it exhausts python's stack
+MAX_DEPTH = 100
+
+_TOKENS = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+  | (?P<op>\*\*|[-+*/%!(),^])
+''', re.VERBOSE)
+
+
+def parse(text):
+    """Parses text into a SymPy expression, raises InvalidParams with the position of any error."""
+
+    return _Parser(text).parse()
+
+
+class _Parser(object):
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = list(_tokenize(text))
+        self.index = 0
+        self.depth = 0
+
+    def parse(self):
+        if self.tokens[0][0] == 'end':
+            self.fail('the expression is empty', 0)
+
+        expr = self.expr()
+
+        kind, value, position = self.tokens[self.index]
+        if kind != 'end':
+            self.fail('unexpected ' + _describe(kind, value) + ', an operator is missing', position)
+
+        return expr
+
+    # expr := term (('+' | '-') term)*, summed at once instead of pairwise like python would
+    def expr(self):
+        terms = [self.term()]
+        while self.peek('+', '-'):
+            op = self.take()[0]
+            term = self.term()
+            terms.append(term if op == '+' else -term)
+        return Add(*terms) if len(terms) > 1 else terms[0]
+
+    # term := unary (('*' | '/' | '%') unary)*
+    def term(self):
+        factors = [self.unary()]
+        while self.peek('*', '/', '%'):
+            op, _, position = self.take()
+            factor = self.unary()
+            if op == '*':
+                factors.append(factor)
+            elif op == '/':
+                factors.append(self.apply(lambda: Pow(factor, -1), position))
+            else:
+                left = Mul(*factors)
+                factors = [self.apply(lambda: Mod(left, factor), position)]
+        return Mul(*factors) if len(factors) > 1 else factors[0]
+
+    # unary := ('+' | '-') unary | power
+    def unary(self):
+        if self.peek('+', '-'):
+            op, _, position = self.take()
+            self.descend(position)
+            operand = self.unary()
+            self.depth -= 1
+            return operand if op == '+' else -operand
+        return self.power()
+
+    # power := postfix ('**' unary)?, so 2**-1 works and a**b**c is a**(b**c)
+    def power(self):
+        base = self.postfix()
+        if self.peek('**'):
+            position = self.take()[2]
+            exponent = self.unary()
+            return self.apply(lambda: Pow(base, exponent), position)
+        if self.peek('^'):
+            self.fail('\'^\' is not a power, use \'**\'', self.tokens[self.index][2])
+        return base
+
+    # postfix := atom '!'*
+    def postfix(self):
+        expr = self.atom()
+        while self.peek('!'):
+            self.take()
+            expr = factorial(expr)
+        return expr
+
+    # atom := number | name | name '(' arguments ')' | '(' expr ')'
+    def atom(self):
+        kind, value, position = self.take()
+
+        if kind == 'number':
+            if '.' in value or 'e' in value or 'E' in value:
+                return Float(value)
+            return Integer(value)
+
+        if kind == 'name':
+            if self.peek('('):
+                return self.call(value, position)
+            if value in CONSTANTS:
+                return CONSTANTS[value]
+            if value in FUNCTIONS and value not in greeks:
+                self.fail('the function \'' + value + '\' must be called, e.g. ' + value + '(x)', position)
+            if keyword.iskeyword(value):
+                self.fail('\'' + value + '\' is not allowed in expressions', position)
+            return Symbol(value)
+
+        if kind == '(':
+            self.descend(position)
+            expr = self.expr()
+            self.expect(')', position)
+            self.depth -= 1
+            return expr
+
+        if kind == 'end':
+            self.fail('the expression ends unexpectedly', position)
+        self.fail('unexpected ' + _describe(kind, value), position)
+
+    def call(self, name, position):
+        if name in CONSTANTS or keyword.iskeyword(name):
+            self.fail('\'' + name + '\' is not a function', position)
+        if name not in FUNCTIONS:
+            self.fail('unknown function \'' + name + '\'', position)
+
+        self.take()  # (
+        self.descend(position)
+        args = []
+        if not self.peek(')'):
+            args.append(self.argument())
+            while self.peek(','):
+                self.take()
+                args.append(self.argument())
+        self.expect(')', position)
+        self.depth -= 1
+
+        function = FUNCTIONS[name]
+        return self.apply(lambda: function(*args), position, 'wrong arguments for \'' + name + '\'')
+
+    # argument := '(' expr (',' expr)+ ')' | expr, a tuple only when its parentheses hold a top level comma
+    def argument(self):
+        if not (self.peek('(') and self.tuple_ahead()):
+            return self.expr()
+
+        position = self.take()[2]
+        self.descend(position)
+        items = [self.expr()]
+        while self.peek(','):
+            self.take()
+            items.append(self.expr())
+        self.expect(')', position)
+        self.depth -= 1
+        return tuple(items)
+
+    def tuple_ahead(self):
+        # whether the parentheses at the current token hold a comma outside of any nested ones
+        nesting = 0
+        for kind, _, _ in self.tokens[self.index:]:
+            if kind == '(':
+                nesting += 1
+            elif kind == ')':
+                nesting -= 1
+                if nesting == 0:
+                    return False
+            elif kind == ',' and nesting == 1:
+                return True
+        return False
+
+    def apply(self, build, position, message=None):
+        # SymPy evaluates as it builds, e.g. log() raises
+        try:
+            return build()
+        except (TypeError, ValueError, ArithmeticError) as e:
+            self.fail((message or 'cannot evaluate') + ' (' + str(e) + ')', position)
+
+    def descend(self, position):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            self.fail('the expression is nested more than ' + str(MAX_DEPTH) + ' levels deep', position)
+
+    def peek(self, *kinds):
+        return self.tokens[self.index][0] in kinds
+
+    def take(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def expect(self, kind, opened_at):
+        if not self.peek(kind):
+            self.fail('\'' + kind + '\' expected to close the \'(\' at position ' + str(opened_at),
+                      self.tokens[self.index][2])
+        self.take()
+
+    def fail(self, message, position):
+        raise errors.InvalidParams(
+            'could not parse ' + repr(self.text) + ' at position ' + str(position) + ': ' + message + '.',
+            position=position)
+
+
+def _tokenize(text):
+    # (kind, value, position) of every token but whitespace, then an 'end'
+    # token. Operators are their own kind.
+    position = 0
+    while position < len(text):
+        match = _TOKENS.match(text, position)
+        if match is None:
+            raise errors.InvalidParams(
+                'could not parse ' + repr(text) + ' at position ' + str(position) + ': unexpected character '
+                + repr(text[position]) + '.', position=position)
+        kind = match.lastgroup
+        if kind == 'op':
+            yield match.group(), match.group(), position
+        elif kind != 'space':
+            yield kind, match.group(), position
+        position = match.end()
+    yield 'end', '', position
+
+
+def _describe(kind, value):
+    if kind == 'number':
+        return 'number ' + value
+    if kind == 'name':
+        return 'name \'' + value + '\''
+    return '\'' + value + '\''
@@ -0,0 +1,117 @@
+"""
+The printers renderers format results with, timed as the latex and str
+phases of the request (see metrics.py).
+
+Printed strings are memoized by expression, so a result served from the
+cache, or the parsedExprAsLatex of an input a client keeps sending, is
+printed once. The printers are built once per thread instead of per call,
+a printer keeps state while it prints.
+"""
+
+import threading
+from symserver import config
+from symserver import errors
+from symserver import metrics
+from symserver.cache import LRUCache
+from sympy import Basic
+from sympy.printing.latex import LatexPrinter
+from sympy.printing.str import StrPrinter
+
+# the formats a request may ask for in its 'formats' param, all by default
+FORMATS = ('latex', 'python')
+
+# the settings sympy's latex() and str() print with
+LATEX_SETTINGS = dict(LatexPrinter._default_settings)
+STR_SETTINGS = dict(StrPrinter._default_settings, order=None)
+
+# printed strings, keyed by (format, expr)
+print_cache = LRUCache(config.PRINT_CACHE_SIZE, max_weight=config.PRINT_CACHE_BYTES, weigh=len)
+
+_printers = threading.local()
+
+
+def get_formats(request_json):
+    """The formats of the request's 'formats' param, raises InvalidParams for unknown ones."""
+
+    formats = request_json.get('formats', list(FORMATS))
+    if not isinstance(formats, list) or not all(f in FORMATS for f in formats):
+        raise errors.InvalidParams('param \'formats\' must be a list of \'latex\' and \'python\', or empty.')
+    return tuple(f for f in FORMATS if f in formats)
+
+
+def fields(job, result):
+    """The parsedExprAsLatex, resultAsLatex and resultAsPython of a response, in the formats the job asks for."""
+
+    response = {}
+    if 'latex' in job.formats:
+        response['parsedExprAsLatex'] = latex(job.parsed_expr)
+        response['resultAsLatex'] = latex(result)
+    if 'python' in job.formats:
+        response['resultAsPython'] = python(result)
+    return response
+
+
+def latex(expr):
+    with metrics.phase('latex'):
+        return _memoized('latex', expr, lambda: _printer('latex', LatexPrinter, LATEX_SETTINGS).doprint(expr))
+
+
+def python(expr):
+    """The resultAsPython string, as str prints it."""
+    with metrics.phase('str'):
+        return _memoized('python', expr, lambda: _str(expr))
+
+
+def _str(obj):
+    # str(obj), printing the expressions in lists, tuples and dicts like their
+    # repr does, but through the memoized printer. Matrices print themselves
+    if type(obj).__str__ is Basic.__str__:
+        return _printer('python', StrPrinter, STR_SETTINGS).doprint(obj)
+    if isinstance(obj, list):
+        return '[' + ', '.join(_repr(item) for item in obj) + ']'
+    if isinstance(obj, tuple):
+        return '(' + ', '.join(_repr(item) for item in obj) + (',)' if len(obj) == 1 else ')')
+    if isinstance(obj, dict):
+        return '{' + ', '.join(_repr(k) + ': ' + _repr(v) for k, v in obj.items()) + '}'
+    return str(obj)
+
+
+def _repr(obj):
+    if isinstance(obj, (Basic, list, tuple, dict)):
+        return _memoized('python', obj, lambda: _str(obj))
+    return repr(obj)
+
+
+def _memoized(format, obj, print_obj):
+    key = _key(obj)
+    if key is None:
+        return print_obj()
+
+    key = (format, key)
+    printed = print_cache.get(key)
+    metrics.count('symserver_print_cache_lookups_total', format=format, outcome='hit' if printed is not None else 'miss')
+    if printed is None:
+        printed = print_obj()
+        print_cache.put(key, printed)
+    return printed
+
+
+def _key(obj):
+    # a hashable key telling apart what prints differently, None for what
+    # isn't worth caching. The type goes along since containers of the same
+    # items print differently
+    if isinstance(obj, Basic):
+        return obj
+    if isinstance(obj, (list, tuple)):
+        keys = tuple(_key(item) for item in obj)
+        return None if any(key is None for key in keys) else (type(obj), keys)
+    return None
+
+
+def _printer(format, cls, settings):
+    # this thread's printer of the format
+    printer = getattr(_printers, format, None)
+    if printer is None:
+        printer = cls(dict(settings))
+        setattr(_printers, format, printer)
+    return printer
@@ -0,0 +1,261 @@
+"""
+Profiles of the operations' computations, around operations.execute.
+
+Requests opt in with the SYMSERVER_PROFILE_HEADER header, or a random
+PROFILE_SAMPLE_RATE of them is picked. Those are computed under cProfile and
+get the top PROFILE_TOP functions by cumulative time in their response.
+With PROFILE_SLOW_SECONDS set, every other computation is watched by a stack
+sampling thread, and ones taking longer have their sampled profile logged.
+Full profiles are written to PROFILE_DIR: pstats files for cProfile, collapsed stacks (e.g. for flamegraph.pl) for samples.
+"""
+
+import collections
+import contextlib
+import cProfile
+import itertools
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from symserver import config
+
+logger = logging.getLogger(__name__)
+
+TRUTHY = ('1', 'true', 'yes')
+
+
+def requested(headers):
+    """Whether the request asks to be profiled, or is picked by PROFILE_SAMPLE_RATE."""
+
+    if config.PROFILE_HEADER and headers.get(config.PROFILE_HEADER, '').strip().lower() in TRUTHY:
+        return True
+    return config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE
+
+
+@contextlib.contextmanager
+def profiled(job):
+    """
+    Profiles the computation of the job in the block, with cProfile when
+    job.profile is set, else by sampling when PROFILE_SLOW_SECONDS is. Sets
+    job.profile_report to the summary of a cProfile profile.
+    """
+
+    if job.profile:
+        with _cprofiled(job):
+            yield
+    elif config.PROFILE_SLOW_SECONDS > 0:
+        with _sampled(job):
+            yield
+    else:
+        yield
+
+
+@contextlib.contextmanager
+def _cprofiled(job):
+    profiler = cProfile.Profile()
+    start = time.monotonic()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.monotonic() - start
+
+        stats = pstats.Stats(profiler)
+        job.profile_report = dict(
+            seconds=elapsed,
+            top=summarize(stats, config.PROFILE_TOP),
+            file=_write(job, '.prof', stats.dump_stats),
+        )
+
+
+@contextlib.contextmanager
+def _sampled(job):
+    thread_id = threading.get_ident()
+    sampler = get_sampler()
+    start = time.monotonic()
+    sampler.watch(thread_id)
+    try:
+        yield
+    finally:
+        stacks = sampler.unwatch(thread_id)
+        elapsed = time.monotonic() - start
+
+        if elapsed > config.PROFILE_SLOW_SECONDS:
+            path = _write(job, '.folded', lambda path: _write_collapsed(stacks, path))
+            logger.warning('slow %s request took %.2fs, %s:\n%s', job.operation, elapsed,
+                           'profile in ' + path if path else 'sampled profile',
+                           '\n'.join(_format_row(row) for row in summarize_samples(stacks, config.PROFILE_TOP)))
+
+
+def summarize(stats, top):
+    """The `top` functions of pstats.Stats by cumulative time, as JSON serializable dicts."""
+
+    rows = []
+    for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append(dict(
+            function=_where(filename, line, name),
+            calls=calls,
+            seconds=total,
+            cumulativeSeconds=cumulative,
+        ))
+
+    rows.sort(key=lambda row: row['cumulativeSeconds'], reverse=True)
+    return rows[:top]
+
+
+def summarize_samples(stacks, top):
+    """The `top` functions of a Counter of sampled stacks, by the share of samples they appear in."""
+
+    total = sum(stacks.values()) or 1
+    own = collections.Counter()
+    cumulative = collections.Counter()
+
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for frame in set(stack):
+            cumulative[frame] += count
+
+    return [
+        dict(function=_where(*frame), samples=own[frame] / total, cumulativeSamples=count / total)
+        for frame, count in cumulative.most_common(top)
+    ]
+
+
+class Sampler(object):
+    """
+    A thread which records the stacks of the threads it watches every
+    `interval` seconds. It only wakes up while it watches any.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.pid = os.getpid()
+        self._stacks = {}  # thread id -> Counter of stacks, root first
+        self._lock = threading.Lock()
+        self._watching = threading.Event()
+
+        self._thread = threading.Thread(target=self._loop, name='symserver-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def watch(self, thread_id):
+        with self._lock:
+            self._stacks[thread_id] = collections.Counter()
+            self._watching.set()
+
+    def unwatch(self, thread_id):
+        """Stops watching the thread, returns its stacks."""
+
+        with self._lock:
+            stacks = self._stacks.pop(thread_id, collections.Counter())
+            if not self._stacks:
+                self._watching.clear()
+        return stacks
+
+    def _loop(self):
+        while True:
+            self._watching.wait()
+            time.sleep(self.interval)
+
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._stacks.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[_stack(frame)] += 1
+
+
+_sequence = itertools.count()  # tells apart the profiles a process writes in the same second
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """This process' Sampler. Threads don't survive a fork, so a forked process starts its own."""
+
+    global _sampler
+
+    with _sampler_lock:
+        if _sampler is None or _sampler.pid != os.getpid():
+            _sampler = Sampler(config.PROFILE_SAMPLE_INTERVAL)
+
+    return _sampler
+
+
+def _stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _write(job, suffix, dump):
+    # writes a full profile with dump(path), returns the path, None without PROFILE_DIR
+    if not config.PROFILE_DIR:
+        return None
+
+    try:
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        name = '%s-%d.%d-%s-%s%s' % (
+            time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(_sequence), job.operation, job.key[:12], suffix)
+        path = os.path.join(config.PROFILE_DIR, name)
+        dump(path)
+        _prune()
+        return path
+    except Exception:
+        logger.exception('failed to write a profile to %s', config.PROFILE_DIR)
+        return None
+
+
+def _prune():
+    # keeps the newest PROFILE_MAX_FILES profiles
+    paths = [os.path.join(config.PROFILE_DIR, name) for name in os.listdir(config.PROFILE_DIR)]
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:max(0, len(paths) - config.PROFILE_MAX_FILES)]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass  # pruned by another process
+
+
+def _write_collapsed(stacks, path):
+    with open(path, 'w') as f:
+        for stack, count in stacks.items():
+            f.write(';'.join(_where(*frame) for frame in stack) + ' ' + str(count) + '\n')
+
+
+# directories the files of profiled functions are shown relative to, the deepest first
+_ROOTS = sorted(
+    {os.path.join(os.path.abspath(root), '') for root in (
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        sys.prefix, sys.base_prefix, sys.exec_prefix,
+    )},
+    key=len, reverse=True)
+
+
+def _where(filename, line, name):
+    # e.g. sympy/integrals/risch.py:1600(risch_integrate), without the server's or Python's directories,
+    # so profiles don't tell clients where things are installed
+    index = filename.rfind('site-packages' + os.sep)
+    if index >= 0:
+        filename = filename[index + len('site-packages' + os.sep):]
+    elif os.path.isabs(filename):
+        for root in _ROOTS:
+            if filename.startswith(root):
+                filename = filename[len(root):]
+                break
+        else:
+            filename = os.path.basename(filename)
+    return filename + ':' + str(line) + '(' + name + ')'
+
+
+def _format_row(row):
+    return '  %5.1f%% %5.1f%%  %s' % (100 * row['cumulativeSamples'], 100 * row['samples'], row['function'])
@@ -0,0 +1,64 @@
+from symserver import config
+from symserver import errors
+from symserver.budget import TimeLimitExceeded
+from symserver.budget import time_limit
+from sympy import Basic
+from sympy import cancel
+from sympy import count_ops
+from sympy import powsimp
+from sympy import simplify
+from sympy import together
+
+# how hard operations try to tidy up their result, see simplify_result
+POLICIES = ('none', 'cheap', 'full')
+
+
+def get_policy(request_json, default):
+    """Returns the request's 'simplify' param, validated."""
+
+    policy = request_json.get('simplify', default)
+
+    if policy not in POLICIES:
+        raise errors.InvalidParams('param \'simplify\' must be one of ' + ', '.join(POLICIES) + '.')
+
+    return policy
+
+
+def simplify_result(expr, policy):
+    """
+    Simplifies expr as far as the policy allows:
+
+    - none returns it as is
+    - cheap tries together, cancel and powsimp, keeping the shortest result
+    - full runs simplify for at most SIMPLIFY_TIMEOUT seconds, then settles
+      for the cheap result
+
+    Results with at most SIMPLIFY_MIN_OPS operations are already as tidy as
+    they will get and are returned as is.
+    """
+
+    if policy == 'none' or not isinstance(expr, Basic):
+        return expr
+
+    if count_ops(expr) <= config.SIMPLIFY_MIN_OPS:
+        return expr
+
+    if policy == 'full':
+        try:
+            with time_limit(config.SIMPLIFY_TIMEOUT):
+                return simplify(expr)
+        except TimeLimitExceeded:
+            pass
+
+    return _cheap(expr)
+
+
+def _cheap(expr):
+    candidates = [expr]
+    for rewrite in (together, cancel):
+        try:
+            candidates.append(rewrite(expr))
+        except Exception:
+            pass  # e.g. cancel on a Piecewise
+
+    return powsimp(min(candidates, key=count_ops))
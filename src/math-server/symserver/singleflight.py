@@ -0,0 +1,153 @@
+"""
+Coalesces concurrent computations of the same job. The first request for a
+key computes it, identical requests arriving meanwhile wait for and share
+its result: threads of a process through an Event, processes of a host
+through a file lock per key and the result store the leader writes to.
+"""
+
+import fcntl
+import logging
+import os
+import threading
+import time
+from symserver import errors
+
+logger = logging.getLogger(__name__)
+
+# errors which computing the job again would raise again, shared with the waiting requests
+SHARED_ERRORS = (errors.InvalidParams, errors.ComputationTimeout, errors.RequestTooExpensive)
+
+
+class _Flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Runs compute() once for concurrent calls with the same key. With a
+    `lock_dir`, other processes computing the same key are waited for too and
+    lookup() is expected to return what they stored, None when they failed.
+
+    Waiters wait at most `timeout` seconds, then compute on their own. When
+    the leader fails they share its error if computing again would fail the
+    same way (SHARED_ERRORS), otherwise (e.g. its worker crashed) they retry.
+    """
+
+    def __init__(self, lock_dir=None, timeout=30, poll_interval=0.01, max_poll_interval=0.2):
+        self.lock_dir = lock_dir
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.leaders = 0
+        self.followers = 0
+        self.waits = 0
+        self._flights = {}  # key -> _Flight of the thread computing it
+        self._lock = threading.Lock()
+
+    def run(self, key, compute, lookup):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+
+        if not leader:
+            if flight.done.wait(self.timeout):
+                if flight.error is None:
+                    return flight.result
+                if isinstance(flight.error, SHARED_ERRORS):
+                    raise flight.error
+            # the leader is stuck or failed by chance, try on our own
+            return self._run_locked(key, compute, lookup)
+
+        try:
+            flight.result = self._run_locked(key, compute, lookup)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        return dict(
+            inFlight=len(self._flights),
+            leaders=self.leaders,
+            followers=self.followers,
+            waits=self.waits,
+        )
+
+    def _run_locked(self, key, compute, lookup):
+        # computes while holding the key's file lock, unless another process
+        # computed it while we waited for the lock
+        if self.lock_dir is None:
+            return compute()
+
+        path = os.path.join(self.lock_dir, key + '.lock')
+        fd, waited = self._acquire(path, time.monotonic() + self.timeout)
+
+        try:
+            if waited:
+                self.waits += 1
+                result = lookup()
+                if result is not None:
+                    return result
+            return compute()
+        finally:
+            if fd is not None:
+                _release(path, fd)
+
+    def _acquire(self, path, deadline):
+        # returns the locked fd, None after the deadline, and whether we waited
+        os.makedirs(self.lock_dir, exist_ok=True)
+        interval = self.poll_interval
+        waited = False
+
+        while True:
+            fd = _try_lock(path)
+            if fd is not None:
+                return fd, waited
+
+            if time.monotonic() >= deadline:
+                logger.warning('gave up waiting for %s after %ss, computing it again', path, self.timeout)
+                return None, waited
+
+            waited = True
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+
+
+def _try_lock(path):
+    # the holder unlinks the file before unlocking it, so a lock on an inode
+    # which is no longer at path is stale and we try again
+    while True:
+        fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def _release(path, fd):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    os.close(fd)
@@ -0,0 +1,135 @@
+"""
+Predicted sizes of expanded expressions, from the terms of their sums,
+products and integer powers, without expanding anything. Used to estimate
+costs (admission.py) and to refuse expansions too expensive to compute.
+"""
+
+import math
+from sympy import Add
+from sympy import Integer
+from sympy import Mul
+from sympy import Pow
+from sympy import Rational
+
+# counts are exact integers up to EXACT_MAX_COUNT, approximate floats up to MAX_COUNT
+EXACT_MAX_COUNT = 2 ** 53
+MAX_COUNT = 1e300
+EXACT_MAX_FACTORS = 64  # larger binomials are approximated
+
+# digits of a coefficient which cost as much as a term of its own, see expansion_cost. Printing a
+# coefficient takes time quadratic in its digits, e.g. (123456789*x + 987654321)**2000 has 2001
+# terms of about 18000 digits which cost as much as 40000 small ones.
+DIGITS_PER_TERM = 4000
+MAX_DIGITS = 1e100  # digits are counted up to this, so weights don't overflow
+
+
+def expanded_terms(expr):
+    """An upper bound of the number of terms expand(expr) has."""
+
+    return _expansion(expr)[0]
+
+
+def largest_expansion(expr):
+    """
+    An upper bound of the number of terms of the largest sum expand(expr)
+    builds, including the ones in function arguments and denominators which
+    it expands as well.
+    """
+
+    terms, inner = _expansion(expr)
+    return max(terms, inner)
+
+
+def expansion_cost(expr):
+    """
+    largest_expansion(expr) weighted by the digits of the largest
+    coefficients it could have, in terms with small coefficients which cost
+    as much to expand and print.
+    """
+
+    weight = 1 + (coefficient_digits(expr) / DIGITS_PER_TERM) ** 2
+    return _saturated(largest_expansion(expr) * weight)
+
+
+def coefficient_digits(expr):
+    """An upper bound of the digits of the largest coefficient in expand(expr), or of its function arguments."""
+
+    return min(max(_digits(expr)), MAX_DIGITS)
+
+
+def _digits(expr):
+    # (log10 of the sum of the absolute coefficients of expand(expr), digits of the largest inside)
+    if isinstance(expr, Rational):
+        return math.log10(max(abs(expr.p), expr.q)), 0
+
+    if isinstance(expr, Add):
+        parts = [_digits(arg) for arg in expr.args]
+        largest = max(digits for digits, _ in parts)
+        return largest + math.log10(len(parts)), max(inner for _, inner in parts)
+
+    if isinstance(expr, Mul):
+        parts = [_digits(arg) for arg in expr.args]
+        return sum(digits for digits, _ in parts), max(inner for _, inner in parts)
+
+    if isinstance(expr, Pow) and isinstance(expr.exp, Integer) and abs(expr.exp) > 1:
+        digits, inner = _digits(expr.base)
+        expanded = min(digits * min(abs(int(expr.exp)), MAX_COUNT), MAX_DIGITS)
+        if expr.exp > 0:
+            return expanded, inner
+        return 0, max(expanded, inner)  # an expanded denominator
+
+    if expr.args:
+        return 0, max(max(_digits(arg)) for arg in expr.args)
+
+    return 0, 0
+
+
+def _expansion(expr):
+    # (terms of expand(expr), terms of the largest sum inside them)
+    if isinstance(expr, Add):
+        parts = [_expansion(arg) for arg in expr.args]
+        return _saturated(sum(terms for terms, _ in parts)), max(inner for _, inner in parts)
+
+    if isinstance(expr, Mul):
+        terms, inner = 1, 0
+        for arg in expr.args:
+            arg_terms, arg_inner = _expansion(arg)
+            terms = _saturated(terms * arg_terms)
+            inner = max(inner, arg_inner)
+        return terms, inner
+
+    if isinstance(expr, Pow) and isinstance(expr.exp, Integer) and abs(expr.exp) > 1:
+        base_terms, inner = _expansion(expr.base)
+        expanded = _monomials(base_terms, abs(int(expr.exp)))
+        if expr.exp > 0:
+            return expanded, inner
+        return 1, max(expanded, inner)  # an expanded denominator
+
+    if expr.args:
+        # e.g. sin((x + 1)**2) is one term with an expanded argument
+        return 1, max(max(_expansion(arg)) for arg in expr.args)
+
+    return 1, 0
+
+
+def _monomials(terms, degree):
+    # the number of monomials of the degree in that many terms, C(terms + degree - 1, degree)
+    n = terms + degree - 1
+    k = min(degree, terms - 1)
+    if k > EXACT_MAX_FACTORS:
+        try:
+            return min(math.exp(math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)), MAX_COUNT)
+        except OverflowError:
+            return MAX_COUNT
+
+    result = 1
+    for i in range(1, k + 1):
+        result = result * (n - k + i) // i
+    return _saturated(result)
+
+
+def _saturated(count):
+    # exact counts while they're small, floats up to MAX_COUNT beyond
+    if count <= EXACT_MAX_COUNT:
+        return count
+    return float(min(count, MAX_COUNT))
@@ -0,0 +1,164 @@
+from symserver import config
+from symserver import errors
+from symserver import linalg
+from symserver.budget import TimeLimitExceeded
+from symserver.budget import time_limit
+from sympy import FiniteSet
+from sympy import Poly
+from sympy import PolynomialError
+from sympy import Set
+from sympy import cancel
+from sympy import count_ops
+from sympy import default_sort_key
+from sympy import nonlinsolve
+from sympy import nroots
+from sympy import preorder_traversal
+from sympy import roots
+from sympy import solve
+from sympy import solve_poly_system
+from sympy.polys.rings import sring
+
+
+def solve_for(expr, target, numeric=False):
+    """
+    Solves expr = 0 for target. Equations which are polynomial in target
+    are solved from the polynomial's coefficients, which is much cheaper than
+    solve, everything else falls back to solve. Beyond linear equations only
+    rational coefficients take that path, solve writes e.g. the roots of
+    a*x**2 + b*x + c differently than roots does. With `numeric`, polynomials
+    with numeric coefficients get all their roots as floats from nroots.
+    Returns the solutions and the name of the method which found them.
+    """
+
+    poly = _as_poly(expr, target)
+
+    if numeric:
+        if poly is None or poly.free_symbols_in_domain:
+            raise errors.InvalidParams('numeric solutions need a polynomial equation with numeric coefficients.')
+        return nroots(poly), 'numeric'
+
+    if poly is not None:
+        if poly.degree() == 1:
+            a, b = poly.all_coeffs()
+            return [_tidy(-b / a)], 'linear'
+
+        if poly.degree() >= 2 and (poly.domain.is_ZZ or poly.domain.is_QQ):
+            found = roots(poly)
+            # roots only knows formulas for some polynomials, e.g. not most quintics
+            if sum(found.values()) == poly.degree():
+                method = 'quadratic' if poly.degree() == 2 else 'polynomial'
+                return sorted(found, key=default_sort_key), method
+
+    return solve(expr, target), 'solve'
+
+
+def solve_system(exprs, targets):
+    """
+    Solves the system of equations expr = 0 for every expr in exprs, for the
+    targets. Linear systems are eliminated over the coefficients' polys
+    domain, polynomial ones with finitely many solutions solved with Groebner
+    bases and anything else with nonlinsolve, within SOLVE_SYSTEM_TIMEOUT
+    seconds. Returns a list of solutions, each a dict of target -> value
+    leaving out the targets which stay free, and the name of the method.
+    """
+
+    try:
+        # sparse polynomials, parallel_poly_from_expr's dense ones are slow in many variables
+        ring, polys = sring(exprs, *targets, field=True)
+    except PolynomialError:
+        ring, polys = None, None
+
+    try:
+        with time_limit(config.SOLVE_SYSTEM_TIMEOUT):
+            if polys is not None and all(sum(monom) <= 1 for poly in polys for monom in poly.itermonoms()):
+                return _solve_linear(ring, polys, targets), 'linear'
+            if polys is not None:
+                solutions = _solve_zero_dimensional(exprs, targets)
+                if solutions is not None:
+                    return [dict(zip(targets, solution)) for solution in solutions], 'groebner'
+            solutions = nonlinsolve(exprs, targets)
+            if not isinstance(solutions, FiniteSet):
+                raise errors.InvalidParams('the system has no finite set of solutions.')
+            return _checked(exprs, targets, solutions), 'nonlinsolve'
+    except TimeLimitExceeded:
+        raise errors.ComputationTimeout(
+            'The system could not be solved within its time budget of ' + str(config.SOLVE_SYSTEM_TIMEOUT) + ' seconds.')
+
+
+def _checked(exprs, targets, solutions):
+    # nonlinsolve's solutions which satisfy every equation, shaped like the linear ones: free targets are left out.
+    # It may return e.g. ImageSet's, which aren't expressions, or parametrizations which ignore an equation
+    checked = []
+    for solution in solutions:
+        if any(_is_set(value) for value in solution):
+            raise errors.InvalidParams('the solutions of the system can not be written as expressions.')
+        substitutions = dict(zip(targets, solution))
+        if any(_not_zero(expr.subs(substitutions)) for expr in exprs):
+            continue
+        checked.append(dict((target, value) for target, value in substitutions.items() if value != target))
+
+    if solutions and not checked:
+        raise errors.InvalidParams('the system could not be solved.')
+    return checked
+
+
+def _is_set(value):
+    return any(isinstance(node, Set) for node in preorder_traversal(value))
+
+
+def _not_zero(residual):
+    # equals is None when it can't tell, such solutions are kept
+    return residual != 0 and residual.equals(0) is False
+
+
+def _solve_zero_dimensional(exprs, targets):
+    # None for systems with infinitely many solutions, e.g. x*y = 1, which nonlinsolve parametrizes
+    try:
+        return solve_poly_system(exprs, *targets) or []
+    except NotImplementedError:
+        return None
+
+
+def _solve_linear(ring, polys, targets):
+    n = len(targets)
+
+    # the augmented matrix, with the constant terms in column n
+    rows = []
+    for poly in polys:
+        row = {}
+        for monom, coeff in poly.terms():
+            if any(monom):
+                row[monom.index(1)] = coeff
+            else:
+                row[n] = -coeff
+        rows.append(row)
+
+    reduced, pivots, inconsistent = linalg.rref(rows, n, ring.domain)
+    if inconsistent:
+        return []
+
+    # pivot variables in terms of the free ones, like solve does
+    to_sympy = ring.domain.to_sympy
+    solution = {}
+    for row, pivot in zip(reduced, pivots):
+        value = to_sympy(row.get(n, ring.domain.zero))
+        for col, coeff in row.items():
+            if col != pivot and col != n:
+                value -= to_sympy(coeff) * targets[col]
+        solution[targets[pivot]] = value
+
+    return [solution]
+
+
+def _as_poly(expr, target):
+    # None when expr isn't a polynomial in target, e.g. has target in a denominator
+    try:
+        return Poly(expr, target)
+    except PolynomialError:
+        return None
+
+
+def _tidy(solution):
+    # solve cancels common factors, e.g. (y - 1)/(y**2 - 1) is 1/(y + 1)
+    cancelled = cancel(solution)
+    return cancelled if count_ops(cancelled) < count_ops(solution) else solution
@@ -0,0 +1,228 @@
+"""
+Canonical results on local disk, shared by every process of a host and kept
+across restarts. The store is an SQLite database in WAL mode, so any number
+of processes read it while one of them writes. It sits behind the in-memory
+operations.result_cache: a miss there looks here before computing.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import sympy
+from symserver import config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS results ('
+    ' key TEXT PRIMARY KEY,'
+    ' version TEXT NOT NULL,'
+    ' value BLOB NOT NULL,'
+    ' size INTEGER NOT NULL,'
+    ' used_at REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS results_used_at ON results (used_at, size)',
+    # the running total of results.size, so puts needn't scan the table
+    'CREATE TABLE IF NOT EXISTS totals ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' size INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO totals (id, size) SELECT 0, coalesce(sum(size), 0) FROM results',
+)
+
+
+def open_store():
+    """Returns the store of SYMSERVER_RESULT_STORE, None when it is disabled."""
+
+    if not config.RESULT_STORE or config.RESULT_STORE_BYTES <= 0:
+        return None
+
+    return ResultStore(config.RESULT_STORE, config.RESULT_STORE_BYTES)
+
+
+def code_version():
+    """
+    Hashes the server's sources and the versions of python and SymPy. Results
+    computed by other code may be shaped or pickled differently, so the store
+    only returns the ones stored by the same version.
+    """
+
+    sha = hashlib.sha1((sys.version + sympy.__version__).encode('utf-8'))
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.py'):
+            sha.update(name.encode('utf-8'))
+            with open(os.path.join(directory, name), 'rb') as f:
+                sha.update(f.read())
+
+    return sha.hexdigest()
+
+
+class ResultStore(object):
+    """
+    A persistent, size bounded store of pickled results which evicts the least
+    recently used entries once their total size exceeds `max_bytes`. Recency
+    is only recorded every `touch_interval` seconds per entry, so hits rarely
+    write. It's a cache: when the database fails, it logs and misses.
+    """
+
+    def __init__(self, path, max_bytes, version=None, touch_interval=60, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version = version or code_version()
+        self.touch_interval = touch_interval
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self._local = threading.local()
+        self._inherited = []
+
+    def get(self, key, default=None):
+        try:
+            row = self._connection().execute(
+                'SELECT value, used_at FROM results WHERE key = ? AND version = ?', (key, self.version)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+
+            value = pickle.loads(row[0])
+
+            now = self.clock()
+            if now - row[1] > self.touch_interval:
+                self._connection().execute('UPDATE results SET used_at = ? WHERE key = ?', (now, key))
+        except Exception:
+            self._failed('read')
+            return default
+
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            logger.debug('result of %s is not picklable, not storing it', key, exc_info=True)
+            return
+
+        if len(blob) > self.max_bytes:
+            return
+
+        try:
+            connection = self._connection()
+            with _transaction(connection):
+                replaced = connection.execute('SELECT size FROM results WHERE key = ?', (key,)).fetchone()
+                connection.execute(
+                    'INSERT OR REPLACE INTO results (key, version, value, size, used_at) VALUES (?, ?, ?, ?, ?)',
+                    (key, self.version, sqlite3.Binary(blob), len(blob), self.clock()))
+                _add_size(connection, len(blob) - (replaced[0] if replaced else 0))
+                self._evict(connection)
+        except Exception:
+            self._failed('write')
+
+    def clear(self):
+        try:
+            connection = self._connection()
+            with _transaction(connection):
+                connection.execute('DELETE FROM results')
+                connection.execute('UPDATE totals SET size = 0')
+        except Exception:
+            self._failed('write')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM results').fetchone()[0]
+
+    def stats(self):
+        try:
+            size, weight = self._connection().execute('SELECT count(*), total(size) FROM results').fetchone()
+        except Exception:
+            self._failed('read')
+            size, weight = None, None
+
+        return dict(
+            path=self.path,
+            size=size,
+            weight=weight,
+            maxWeight=self.max_bytes,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            errors=self.errors,
+        )
+
+    def _evict(self, connection):
+        # caller must be in a transaction. Evicts down to 90% of max_bytes, so
+        # the next puts don't have to evict again right away
+        total = connection.execute('SELECT size FROM totals').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes * 0.9
+        victims = []
+        evicted = 0
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY used_at'):
+            if evicted >= excess:
+                break
+            victims.append((key,))
+            evicted += size
+
+        connection.executemany('DELETE FROM results WHERE key = ?', victims)
+        _add_size(connection, -evicted)
+        self.evictions += len(victims)
+
+    def _connection(self):
+        # one connection per thread and process: SQLite connections must not
+        # be used across a fork, nor closed by the child, so those are kept
+        connection = getattr(self._local, 'connection', None)
+
+        if connection is not None and self._local.pid != os.getpid():
+            self._inherited.append(connection)
+            connection = None
+
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+
+        return connection
+
+    def _connect(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        # autocommit, writes take the write lock up front in _transaction
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    def _failed(self, action):
+        self.errors += 1
+        logger.warning('result store %s failed to %s', self.path, action, exc_info=True)
+
+
+def _add_size(connection, size):
+    connection.execute('UPDATE totals SET size = size + ?', (size,))
+
+
+@contextlib.contextmanager
+def _transaction(connection):
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
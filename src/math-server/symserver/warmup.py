@@ -0,0 +1,126 @@
+import contextlib
+import json
+import logging
+import threading
+import time
+from symserver import config
+from symserver import metrics
+from symserver import operations
+
+logger = logging.getLogger(__name__)
+
+# representative requests, one or more per code path of operations.OPERATIONS
+REQUESTS = [
+    {'operation': 'derivative', 'expr': 'sin(x)*exp(x**2)/(1 + x)', 'variables': ['x'], 'wrt': ['x', 'x']},
+    {'operation': 'gradient', 'expr': 'x**2*y + log(y)', 'variables': ['x', 'y'], 'wrt': ['x', 'y']},
+    {'operation': 'hessian', 'expr': 'exp(x*y)*sin(x)', 'variables': ['x', 'y'], 'wrt': ['x', 'y']},
+    {'operation': 'jacobian', 'expr': ['x*y', 'sin(x)*exp(y)'], 'variables': ['x', 'y'], 'wrt': ['x', 'y']},
+    {'operation': 'integral', 'expr': '(x**2 + 1)/(x**3 - x)', 'variables': ['x'], 'wrt': 'x'},
+    {'operation': 'integral', 'expr': 'x*sin(x) + exp(x)*cos(x)', 'variables': ['x'], 'wrt': 'x'},
+    {'operation': 'integral', 'expr': 'sqrt(1 - x**2)', 'variables': ['x'], 'wrt': 'x', 'leftBound': 0, 'rightBound': 1},
+    {'operation': 'solveFor', 'expr': 'x**2 + 3*x = exp(y)', 'variables': ['x', 'y'], 'target_var': ['x']},
+    {'operation': 'solveFor', 'expr': 'exp(x) = y', 'variables': ['x', 'y'], 'target_var': ['x']},
+    {'operation': 'solveFor', 'expr': ['x + 2*y = 3', 'x - y = a'], 'variables': ['x', 'y', 'a'], 'target_var': ['x', 'y']},
+    {'operation': 'expandExpr', 'expr': '(x + y)**3*(x - 1)', 'variables': ['x', 'y']},
+    {'operation': 'simplifyExpr', 'expr': 'sin(x)**2 + cos(x)**2 + (x**2 - 1)/(x - 1)', 'variables': ['x']},
+    {'operation': 'factorExpr', 'expr': 'x**3 - x**2 - x + 1', 'variables': ['x']},
+    {'operation': 'evaluate', 'expr': 'sin(x)*y', 'variables': ['x', 'y'], 'values': {'x': [1, 2], 'y': [3, 4]}},
+    {'operation': 'sample', 'expr': 'tan(x)', 'variables': ['x'], 'wrt': 'x', 'leftBound': -3, 'rightBound': 3},
+    {'operation': 'det', 'matrix': [['a', '1'], ['1/2', '2']], 'variables': ['a']},
+    {'operation': 'inverse', 'matrix': [[1.5, 2], [3, 5]], 'variables': []},
+    {'operation': 'eigenvals', 'matrix': [['2', '1'], ['1', '2']], 'variables': []},
+]
+
+_state = 'cold'  # cold, warming or warm
+_timings = {}  # phase -> seconds
+_lock = threading.Lock()
+
+
+def warm_up(requests=None):
+    """
+    Imports and exercises every code path of operations.handle_request once,
+    so SymPy's lazy initialisation (e.g. of its integration tables and
+    printers) happens here instead of in the first requests. Run it before
+    forking, e.g. in a gunicorn master with preload_app, and the workers
+    start warm. Returns the seconds every phase took.
+    """
+
+    global _state
+
+    with _lock:
+        if _state != 'cold':
+            return dict(_timings)
+        _state = 'warming'
+
+    if requests is None:
+        requests = load_requests()
+
+    start = time.monotonic()
+    try:
+        with _phase('import'):
+            _import_lazy_modules()
+
+        for request_json in requests:
+            with _phase(request_json.get('operation', 'unknown')):
+                try:
+                    with metrics.suppressed():
+                        operations.handle_request(request_json)
+                except Exception:
+                    logger.exception('warm-up request failed: %s', json.dumps(request_json))
+    finally:
+        _timings['total'] = time.monotonic() - start
+        _state = 'warm'
+
+    logger.info('warmed up in %.2fs: %s', _timings['total'], ', '.join(
+        '%s %.2fs' % (phase, seconds) for phase, seconds in _timings.items() if phase != 'total'))
+
+    return dict(_timings)
+
+
+def start():
+    """Warms up in a background thread, e.g. for the development server."""
+
+    thread = threading.Thread(target=warm_up, name='symserver-warmup')
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def is_ready():
+    """False while warming up. A process which never warms up is always ready."""
+    return _state != 'warming'
+
+
+def timings():
+    return dict(_timings)
+
+
+def load_requests():
+    """The requests of SYMSERVER_WARMUP_REQUESTS, a JSON file with a list of them, or REQUESTS."""
+
+    if not config.WARMUP_REQUESTS:
+        return REQUESTS
+
+    with open(config.WARMUP_REQUESTS) as f:
+        return json.load(f)
+
+
+@contextlib.contextmanager
+def _phase(name):
+    # adds the time spent in the block to the phase's timing
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _timings[name] = _timings.get(name, 0) + time.monotonic() - start
+
+
+def _import_lazy_modules():
+    # modules SymPy only imports the first time they are needed
+    import mpmath
+    import numpy
+    import sympy.integrals.meijerint
+    import sympy.integrals.risch
+    import sympy.printing.latex
+    import sympy.simplify.fu
+    import sympy.solvers.solveset
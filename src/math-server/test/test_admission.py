@@ -0,0 +1,178 @@
+import threading
+import unittest
+from unittest import mock
+from symserver import admission
+from symserver import errors
+from symserver import operations
+from symserver.admission import Scheduler
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def expand_request(expr):
+    return {'operation': 'expandExpr', 'expr': expr, 'variables': ['x', 'y', 'z']}
+
+
+class TestEstimates(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(admission, 'history', admission.History(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_expanding_costs_more(self):
+        cheap = operations.prepare(expand_request('(x + 1)**2'))
+        expensive = operations.prepare(expand_request('(x + y + z + 1)**30'))
+
+        self.assertLess(admission.estimate(cheap) * 100, admission.estimate(expensive))
+
+    def test_learns_from_past_latencies(self):
+        job = operations.prepare(expand_request('(x + y)**3'))
+        similar = operations.prepare(expand_request('(x + z)**3'))
+
+        admission.history.record(job, 2.5)
+
+        self.assertEqual(admission.estimate(job), 2.5)
+        self.assertEqual(admission.estimate(similar), 2.5)
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_admits_up_to_the_slots(self):
+        scheduler = Scheduler(2)
+
+        tickets = [scheduler.submit(0.1) for _ in range(3)]
+
+        self.assertEqual([ticket.future.done() for ticket in tickets], [True, True, False])
+        scheduler.release(tickets[0])
+        self.assertTrue(tickets[2].future.done())
+
+    def test_cheap_jobs_go_first(self):
+        clock = FakeClock()
+        scheduler = Scheduler(1, clock=clock)
+        running = scheduler.submit(1)
+
+        expensive = scheduler.submit(10)
+        clock.now = 1
+        cheap = scheduler.submit(0.01)
+        scheduler.release(running)
+
+        self.assertTrue(cheap.future.done())
+        self.assertFalse(expensive.future.done())
+
+    def test_expensive_jobs_are_not_starved(self):
+        clock = FakeClock()
+        scheduler = Scheduler(1, clock=clock)
+        running = scheduler.submit(1)
+
+        expensive = scheduler.submit(10)
+        clock.now = 20
+        cheap = scheduler.submit(0.01)
+        scheduler.release(running)
+
+        self.assertTrue(expensive.future.done())
+        self.assertFalse(cheap.future.done())
+
+    def test_refuses_expensive_jobs(self):
+        with self.assertRaises(errors.RequestTooExpensive) as cm:
+            Scheduler(1, max_cost=5).submit(6)
+
+        self.assertEqual(errors.describe(cm.exception)[1], 413)
+
+    def test_limits_clients(self):
+        scheduler = Scheduler(1, client_limit=2)
+        first = scheduler.submit(0.1, 'a')
+        scheduler.submit(0.1, 'a')
+
+        with self.assertRaises(errors.TooManyRequests) as cm:
+            scheduler.submit(0.1, 'a')
+        self.assertEqual(errors.describe(cm.exception)[1], 429)
+
+        scheduler.submit(0.1, 'b')
+        scheduler.release(first)
+        scheduler.submit(0.1, 'a')
+
+    def test_sheds_load_over_the_backlog(self):
+        scheduler = Scheduler(1, max_backlog=10)
+        scheduler.submit(100)  # running, not waiting
+        scheduler.submit(8)
+
+        with self.assertRaises(errors.TooManyRequests):
+            scheduler.submit(3)
+        scheduler.submit(1)
+
+    def test_cancelled_waiters_release_their_slot(self):
+        scheduler = Scheduler(1)
+        running = scheduler.submit(1)
+        gone = scheduler.submit(1)
+        gone.future.cancel()
+        waiting = scheduler.submit(1)
+
+        scheduler.release(running)
+        self.assertFalse(waiting.future.done())
+        scheduler.release(gone)
+        self.assertTrue(waiting.future.done())
+        self.assertEqual(scheduler.stats()['running'], 1)
+
+
+class TestHandleRequestAdmission(unittest.TestCase):
+
+    def setUp(self):
+        for patcher in (mock.patch.object(admission, '_scheduler', None),
+                        mock.patch.object(admission, 'history', admission.History(100))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        operations.result_cache.clear()
+
+    def test_refuses_expensive_requests(self):
+        with mock.patch('symserver.config.ADMISSION_MAX_COST', 0.1):
+            with self.assertRaises(errors.RequestTooExpensive):
+                operations.handle_request(expand_request('(x + y + z + 1)**40'))
+
+            operations.handle_request(expand_request('(x + 1)**2'))
+
+    def test_cache_hits_skip_admission(self):
+        operations.handle_request(expand_request('(x + 1)**3'))
+
+        with mock.patch.object(admission, 'submit', side_effect=AssertionError('admitted')):
+            operations.handle_request(expand_request('(x + 1)**3'))
+
+    def test_limits_concurrency_per_client(self):
+        started = threading.Event()
+        proceed = threading.Event()
+
+        def executor(job):
+            started.set()
+            proceed.wait(10)
+            return operations.execute(job)
+
+        with mock.patch('symserver.config.ADMISSION_CLIENT_LIMIT', 1), mock.patch('symserver.config.ADMISSION_SLOTS', 2):
+            thread = threading.Thread(target=operations.handle_request,
+                                      args=(expand_request('(x + 2)**5'), executor), kwargs=dict(client='a'))
+            thread.start()
+            started.wait(10)
+
+            with self.assertRaises(errors.TooManyRequests):
+                operations.handle_request(expand_request('(x + 3)**5'), client='a')
+            operations.handle_request(expand_request('(x + 3)**5'), client='b')
+
+            proceed.set()
+            thread.join()
+
+    def test_interrupted_computations_release_their_slot(self):
+        with self.assertRaises(KeyboardInterrupt):
+            with admission.admitted(operations.prepare(expand_request('(x + 4)**5'))):
+                raise KeyboardInterrupt()
+
+        self.assertEqual(admission.get_scheduler().stats()['running'], 0)
+
+    def test_disabled(self):
+        with mock.patch('symserver.config.ADMISSION', 0), mock.patch('symserver.config.ADMISSION_MAX_COST', 0.001):
+            operations.handle_request(expand_request('(x + y)**9'))
@@ -0,0 +1,84 @@
+import json
+import unittest
+from unittest import mock
+from symserver import errors
+from symserver.app import app
+
+
+class TestApp(unittest.TestCase):
+
+    def setUp(self):
+        self.client = app.test_client()
+        patcher = mock.patch('symserver.config.POOL_SIZE', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, url, body):
+        return self.client.post(url, data=json.dumps(body), content_type='application/json')
+
+    def test_happy_path(self):
+        res = self.post('/api/math', {
+            'operation': 'expandExpr',
+            'expr': '(x + 1)**2',
+            'variables': ['x']
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json().get('resultAsPython'), 'x**2 + 2*x + 1')
+
+    def test_invalid_params(self):
+        res = self.post('/api/math', {'operation': 'foo'})
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.get_json().get('errorType'), 'InvalidParams')
+
+    def test_timeout(self):
+        timeout = errors.ComputationTimeout('The request exceeded its time budget of 20 seconds.')
+
+        with mock.patch('symserver.operations.handle_request', side_effect=timeout):
+            res = self.post('/api/math', {'operation': 'integral'})
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.get_json(), {
+            'error': 'The request exceeded its time budget of 20 seconds.',
+            'errorType': 'ComputationTimeout',
+            'message': 'The request exceeded its time budget of 20 seconds.',
+        })
+
+    def test_profile_header(self):
+        res = self.client.post('/api/math', data=json.dumps({
+            'operation': 'expandExpr',
+            'expr': '(x + 1)**2',
+            'variables': ['x']
+        }), content_type='application/json', headers={'X-Symserver-Profile': '1'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.get_json()['profile']['top'])
+
+    def test_metrics(self):
+        self.post('/api/math', {'operation': 'expandExpr', 'expr': '(x + 1)**2', 'variables': ['x']})
+
+        res = self.client.get('/metrics')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.content_type.startswith('text/plain'))
+        self.assertIn('symserver_requests_total{operation="expandExpr"}', res.get_data(as_text=True))
+
+    def test_batch(self):
+        res = self.post('/api/math/batch', [
+            {'operation': 'expandExpr', 'expr': '(x + 1)**2', 'variables': ['x']},
+            {'operation': 'foo'},
+        ])
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.get_json()['results'][0]['resultAsPython'], 'x**2 + 2*x + 1')
+        self.assertEqual(res.get_json()['results'][1]['status'], 400)
+
+    def test_batch_stream(self):
+        res = self.post('/api/math/batch?stream=true', [
+            {'operation': 'expandExpr', 'expr': '(x + 1)**2', 'variables': ['x']},
+        ])
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(json.loads(res.get_data(as_text=True).splitlines()[0])['index'], 0)
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from symserver import admission
+from symserver import asgi
+from symserver import engine
+from symserver import operations
+
+
+def call(scope, body=b''):
+    """Sends one request through the ASGI app, returns (status, headers, body)."""
+
+    messages = [dict(type='http.request', body=body, more_body=False)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(asgi.app(scope, receive, send))
+    finally:
+        loop.close()
+
+    start = sent[0]
+    headers = dict((name.decode(), value.decode()) for name, value in start['headers'])
+    return start['status'], headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def http(method, path, body=None, headers=(), query=b''):
+    scope = dict(
+        type='http',
+        method=method,
+        path=path,
+        query_string=query,
+        headers=[(b'content-type', b'application/json')] + [(k.encode(), v.encode()) for k, v in headers],
+    )
+    return call(scope, json.dumps(body).encode() if body is not None else b'')
+
+
+def expand_request(expr='(x + 1)**2'):
+    return {'operation': 'expandExpr', 'expr': expr, 'variables': ['x']}
+
+
+class TestAsgiApp(unittest.TestCase):
+
+    def setUp(self):
+        for patcher in (mock.patch('symserver.config.POOL_SIZE', 0), mock.patch.object(admission, '_scheduler', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        operations.result_cache.clear()
+
+    def test_happy_path(self):
+        status, headers, body = http('POST', '/api/math', expand_request())
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], 'application/json')
+        self.assertEqual(json.loads(body.decode())['resultAsPython'], 'x**2 + 2*x + 1')
+
+    def test_invalid_params(self):
+        status, _, body = http('POST', '/', {'operation': 'foo'})
+
+        self.assertEqual(status, 400)
+        self.assertEqual(json.loads(body.decode())['errorType'], 'InvalidParams')
+
+    def test_missing_body(self):
+        status, _, body = http('POST', '/api/math')
+
+        self.assertEqual(status, 400)
+        self.assertEqual(json.loads(body.decode())['message'], 'A request body is required.')
+
+    def test_unknown_routes(self):
+        self.assertEqual(http('GET', '/nope')[0], 404)
+        self.assertEqual(http('GET', '/api/math')[0], 405)
+
+    def test_health(self):
+        status, _, body = http('GET', '/_health')
+
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body.decode())['ready'])
+
+    def test_metrics(self):
+        http('POST', '/api/math', expand_request())
+
+        status, headers, body = http('GET', '/metrics')
+
+        self.assertEqual(status, 200)
+        self.assertTrue(headers['content-type'].startswith('text/plain'))
+        self.assertIn('symserver_requests_total{operation="expandExpr"}', body.decode())
+
+    def test_batch(self):
+        status, _, body = http('POST', '/api/math/batch', [expand_request(), {'operation': 'foo'}])
+
+        results = json.loads(body.decode())['results']
+        self.assertEqual(status, 200)
+        self.assertEqual(results[0]['resultAsPython'], 'x**2 + 2*x + 1')
+        self.assertEqual(results[1]['status'], 400)
+
+    def test_batch_stream(self):
+        status, headers, body = http('POST', '/api/math/batch', [expand_request(), expand_request('x')],
+                                     headers=[('Accept', 'application/x-ndjson')])
+
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], 'application/x-ndjson')
+        self.assertEqual(sorted(line['index'] for line in lines), [0, 1])
+
+    def test_cors(self):
+        status, headers, _ = http('OPTIONS', '/api/math', headers=[
+            ('Origin', 'http://example.com'),
+            ('Access-Control-Request-Headers', 'content-type'),
+        ])
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['access-control-allow-origin'], '*')
+        self.assertEqual(headers['access-control-allow-headers'], 'content-type')
+
+    def test_lifespan(self):
+        messages = [dict(type='lifespan.startup'), dict(type='lifespan.shutdown')]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        loop.run_until_complete(asgi.app(dict(type='lifespan'), receive, send))
+
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+
+class FakePool(object):
+    """Resolves the futures of submitted jobs when told to."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, job):
+        future = Future()
+        self.submitted.append((job, future))
+        return future
+
+    def finish(self):
+        for job, future in self.submitted:
+            future.set_result(operations.execute(job))
+
+
+class TestAsgiDispatch(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FakePool()
+        for patcher in (mock.patch.object(engine, 'get_pool', return_value=self.pool),
+                        mock.patch.object(admission, '_scheduler', None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        operations.result_cache.clear()
+
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def finish_soon(self, delay=0.05):
+        # the pool's futures resolve on another thread, like engine.WorkerPool's
+        self.loop.call_later(delay, lambda: self.loop.run_in_executor(None, self.pool.finish))
+
+    def test_awaits_the_pool(self):
+        self.finish_soon()
+
+        response = self.loop.run_until_complete(asgi.handle_request(expand_request()))
+
+        self.assertEqual(response['resultAsPython'], 'x**2 + 2*x + 1')
+        self.assertEqual(len(self.pool.submitted), 1)
+
+    def test_coalesces_identical_requests(self):
+        self.finish_soon()
+
+        responses = self.loop.run_until_complete(asyncio.gather(
+            *[asgi.handle_request(expand_request()) for _ in range(5)], loop=self.loop))
+
+        self.assertEqual(len(self.pool.submitted), 1)
+        self.assertEqual(set(response['resultAsPython'] for response in responses), {'x**2 + 2*x + 1'})
+        self.assertEqual(asgi._computing, {})
+
+    def test_cache_hits_dont_wait_for_computations(self):
+        self.finish_soon()
+        self.loop.run_until_complete(asgi.handle_request(expand_request()))
+        self.pool.submitted = []
+
+        async def both():
+            slow = asyncio.ensure_future(asgi.handle_request(expand_request('(x + 9)**9')), loop=self.loop)
+            start = time.monotonic()
+            cached = await asgi.handle_request(expand_request())
+            answered_in = time.monotonic() - start
+            self.finish_soon(0.2)
+            await slow
+            return cached, answered_in
+
+        cached, answered_in = self.loop.run_until_complete(both())
+
+        self.assertEqual(cached['resultAsPython'], 'x**2 + 2*x + 1')
+        self.assertLess(answered_in, 0.2)
+        self.assertEqual(len(self.pool.submitted), 1)
+
+    def test_prints_off_the_loop(self):
+        threads = []
+
+        def respond(job, result):
+            threads.append(threading.current_thread())
+            return respond.original(job, result)
+
+        respond.original = operations.respond
+        self.finish_soon()
+        with mock.patch.object(operations, 'respond', respond):
+            self.loop.run_until_complete(asgi.handle_request(expand_request()))
+
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_batches_leave_the_default_threads_to_requests(self):
+        self.finish_soon()
+        self.loop.run_until_complete(asgi.handle_request(expand_request()))
+        self.pool.submitted = []
+        self.loop.set_default_executor(ThreadPoolExecutor(1))
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            return dict(type='http.request', body=json.dumps([expand_request('(x + 7)**2')]).encode())
+
+        scope = dict(type='http', method='POST', path='/api/math/batch', query_string=b'',
+                     headers=[(b'content-type', b'application/json')])
+
+        async def both():
+            batched = asyncio.ensure_future(asgi.app(scope, receive, send), loop=self.loop)
+            while not self.pool.submitted:
+                await asyncio.sleep(0.01)
+            start = time.monotonic()
+            cached = await asgi.handle_request(expand_request())
+            answered_in = time.monotonic() - start
+            self.finish_soon()
+            await batched
+            return cached, answered_in
+
+        with mock.patch('symserver.config.BATCH_THREADS', 1), mock.patch.object(asgi, '_batch_executor', None):
+            cached, answered_in = self.loop.run_until_complete(both())
+
+        self.assertEqual(cached['resultAsPython'], 'x**2 + 2*x + 1')
+        self.assertLess(answered_in, 0.5)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn(b'x**2 + 14*x + 49', b''.join(message.get('body', b'') for message in sent[1:]))
+
+    def test_stores_results_off_the_dispatch_thread(self):
+        stored = threading.Event()
+        threads = {}
+
+        def store_result(job, result):
+            threads['store'] = threading.current_thread()
+            stored.set()
+
+        def dispatch():
+            # like the pool's dispatch thread, busy with the next jobs
+            threads['dispatch'] = threading.current_thread()
+            self.pool.finish()
+            stored.wait(5)
+
+        thread = threading.Thread(target=dispatch)
+        self.loop.call_later(0.05, thread.start)
+        with mock.patch.object(operations, 'store_result', store_result):
+            self.loop.run_until_complete(asgi.handle_request(expand_request('(x + 5)**2')))
+        thread.join()
+
+        self.assertTrue(stored.is_set())
+        self.assertIsNot(threads['store'], threads['dispatch'])
@@ -0,0 +1,230 @@
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+from symserver import admission
+from symserver import engine
+from symserver import errors
+from symserver import metrics
+from symserver import operations
+from symserver.batch import handle_batch
+from symserver.batch import stream_batch
+from symserver.metrics import Registry
+
+
+def slow_simplify(expr):
+    time.sleep(1)
+    return expr
+
+
+def expand_request(expr):
+    return {
+        'operation': 'expandExpr',
+        'expr': expr,
+        'variables': ['x']
+    }
+
+
+class ThreadPool(object):
+    """Computes submitted jobs in threads, counting how many compute at once."""
+
+    def __init__(self):
+        self.computing = 0
+        self.max_computing = 0
+        self.lock = threading.Lock()
+
+    def submit(self, job):
+        future = Future()
+        threading.Thread(target=self.compute, args=(job, future)).start()
+        return future
+
+    def compute(self, job, future):
+        with self.lock:
+            self.computing += 1
+            self.max_computing = max(self.max_computing, self.computing)
+        time.sleep(0.05)
+        with self.lock:
+            self.computing -= 1
+        future.set_result(operations.execute(job))
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(admission, '_scheduler', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        operations.result_cache.clear()
+
+    def test_happy_path(self):
+        result = handle_batch([
+            expand_request('(x + 1)**2'),
+            expand_request('(x + 2)**2'),
+        ])
+
+        self.assertEqual(
+            [item.get('resultAsPython') for item in result['results']],
+            ['x**2 + 2*x + 1', 'x**2 + 4*x + 4'],
+        )
+
+    def test_wrapped_requests(self):
+        result = handle_batch({'requests': [expand_request('x')]})
+
+        self.assertEqual(result['results'][0].get('resultAsPython'), 'x')
+
+    def test_dedupes_identical_requests(self):
+        first = expand_request('(x + 1)**2')
+        second = expand_request('(1 + x)**2')
+
+        with mock.patch.object(operations, 'execute', wraps=operations.execute) as execute:
+            result = handle_batch([first, second])
+
+        self.assertEqual(execute.call_count, 1)
+        self.assertIs(result['results'][0]['requestParams'], first)
+        self.assertIs(result['results'][1]['requestParams'], second)
+
+    def test_failing_item_does_not_abort_batch(self):
+        result = handle_batch([
+            {'operation': 'foo'},
+            'not a request',
+            expand_request('(x + 1)**2'),
+        ])
+
+        self.assertEqual(result['results'][0]['errorType'], 'InvalidParams')
+        self.assertEqual(result['results'][0]['status'], 400)
+        self.assertEqual(result['results'][1]['errorType'], 'InvalidParams')
+        self.assertEqual(result['results'][2]['resultAsPython'], 'x**2 + 2*x + 1')
+
+    def test_throws_on_no_list(self):
+        with self.assertRaises(errors.InvalidParams):
+            handle_batch({'operation': 'expandExpr'})
+
+    def test_throws_on_too_many_requests(self):
+        with mock.patch('symserver.config.BATCH_MAX_SIZE', 1):
+            with self.assertRaises(errors.InvalidParams):
+                handle_batch([expand_request('x'), expand_request('x')])
+
+    def test_pool(self):
+        pool = engine.WorkerPool(2, timeout=10)
+        self.addCleanup(pool.close)
+
+        result = handle_batch([
+            expand_request('(x + %d)**2' % i) for i in range(4)
+        ] + [{'operation': 'derivative', 'expr': 'x', 'variables': ['x']}], pool=pool)
+
+        self.assertEqual(result['results'][3]['resultAsPython'], 'x**2 + 6*x + 9')
+        self.assertEqual(result['results'][4]['errorType'], 'InvalidParams')
+        self.assertIsNotNone(operations.cached_result(operations.prepare(expand_request('(x + 3)**2'))))
+
+    def test_uncached_operations_with_different_inputs(self):
+        result = handle_batch([
+            {'operation': 'evaluate', 'expr': 'x', 'variables': ['x'], 'values': {'x': [1]}, 'encoding': 'json'},
+            {'operation': 'evaluate', 'expr': 'x', 'variables': ['x'], 'values': {'x': [2]}, 'encoding': 'json'},
+        ])
+
+        self.assertEqual([item['result']['values'] for item in result['results']], [[1.0], [2.0]])
+
+
+class TestBatchAdmission(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(admission, '_scheduler', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        operations.result_cache.clear()
+
+    def test_computes_within_the_slots(self):
+        pool = ThreadPool()
+
+        with mock.patch('symserver.config.ADMISSION_SLOTS', 2):
+            result = handle_batch([expand_request('(x + %d)**2' % i) for i in range(6)], pool=pool)
+
+        self.assertEqual(result['results'][5]['resultAsPython'], 'x**2 + 10*x + 25')
+        self.assertEqual(pool.max_computing, 2)
+        self.assertEqual(admission.get_scheduler().stats()['running'], 0)
+
+    def test_waits_within_the_client_limit(self):
+        pool = ThreadPool()
+
+        with mock.patch('symserver.config.ADMISSION_SLOTS', 4), mock.patch('symserver.config.ADMISSION_CLIENT_LIMIT', 2):
+            lines = list(stream_batch([expand_request('(x + %d)**3' % i) for i in range(6)], pool=pool, client='a'))
+
+        self.assertEqual(len(lines), 6)
+        self.assertFalse(any('errorType' in line for line in lines))
+        self.assertEqual(pool.max_computing, 2)
+
+    def test_counts_against_the_client_limit(self):
+        with mock.patch('symserver.config.ADMISSION_CLIENT_LIMIT', 1):
+            ticket = admission.get_scheduler().submit(0.1, 'a')
+            result = handle_batch([expand_request('(x + 7)**2')], client='a')
+            admission.get_scheduler().release(ticket)
+
+        self.assertEqual(result['results'][0]['status'], 429)
+
+
+class TestStreamBatch(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(admission, '_scheduler', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        operations.result_cache.clear()
+
+    def test_happy_path(self):
+        lines = list(stream_batch([
+            expand_request('(x + 1)**2'),
+            {'operation': 'foo'},
+            expand_request('(1 + x)**2'),
+        ], window=1))
+
+        items = sorted((json.loads(line) for line in lines), key=lambda item: item['index'])
+
+        self.assertTrue(all(line.endswith('\n') for line in lines))
+        self.assertEqual([item['index'] for item in items], [0, 1, 2])
+        self.assertEqual(items[0]['resultAsPython'], 'x**2 + 2*x + 1')
+        self.assertEqual(items[1]['status'], 400)
+        self.assertEqual(items[2]['requestParams'], expand_request('(1 + x)**2'))
+
+    def test_validates_before_streaming(self):
+        with self.assertRaises(errors.InvalidParams):
+            stream_batch({'operation': 'expandExpr'})
+
+    def test_yields_each_item_before_computing_the_next_without_a_pool(self):
+        computed = []
+
+        def execute(job):
+            computed.append(job.request_json['expr'])
+            return execute.original(job)
+
+        execute.original = operations.execute
+        with mock.patch.object(operations, 'execute', execute):
+            lines = stream_batch([expand_request('(x + 1)**2'), expand_request('(x + 2)**2')], window=10)
+
+            self.assertEqual(json.loads(next(lines))['index'], 0)
+            self.assertEqual(computed, ['(x + 1)**2'])
+            self.assertEqual(json.loads(next(lines))['index'], 1)
+
+    def test_times_the_whole_stream(self):
+        with mock.patch.object(metrics, 'registry', Registry()):
+            lines = stream_batch([expand_request('(x + 4)**2')])
+            self.assertNotIn('symserver_requests_total{operation="batch"}', metrics.render())
+
+            list(lines)
+            self.assertIn('symserver_requests_total{operation="batch"} 1', metrics.render())
+
+    def test_yields_as_items_complete(self):
+        # workers are forked, so they see the patched operation
+        with mock.patch.dict(operations.OPERATIONS, {'simplifyExpr': (None, slow_simplify, operations.render_expression)}):
+            pool = engine.WorkerPool(2, timeout=10)
+        self.addCleanup(pool.close)
+
+        with mock.patch('symserver.config.ADMISSION_SLOTS', 2):
+            lines = stream_batch([
+                {'operation': 'simplifyExpr', 'expr': 'x', 'variables': ['x']},
+                expand_request('x + 1'),
+            ], pool=pool)
+
+        self.assertEqual(json.loads(next(lines))['index'], 1)
+        self.assertEqual(json.loads(next(lines))['index'], 0)
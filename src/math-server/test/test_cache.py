@@ -0,0 +1,79 @@
+import unittest
+from symserver.cache import LRUCache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_happy_path(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = LRUCache(2, ttl=10, clock=clock)
+        cache.put('a', 1)
+
+        clock.now = 5
+        self.assertEqual(cache.get('a'), 1)
+
+        clock.now = 11
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(len(cache), 0)
+
+    def test_zero_size_disables(self):
+        cache = LRUCache(0)
+        cache.put('a', 1)
+
+        self.assertEqual(cache.get('a'), None)
+
+    def test_clear(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.clear()
+
+        self.assertEqual(cache.stats()['size'], 0)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_max_weight(self):
+        cache = LRUCache(10, max_weight=5, weigh=len)
+        cache.put('a', 'xx')
+        cache.put('b', 'xx')
+        cache.put('c', 'xx')
+
+        self.assertNotIn('a', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.weight, 4)
+
+    def test_replacing_updates_weight(self):
+        cache = LRUCache(10, max_weight=5, weigh=len)
+        cache.put('a', 'xxx')
+        cache.put('a', 'x')
+
+        self.assertEqual(cache.weight, 1)
@@ -0,0 +1,60 @@
+import unittest
+from symserver import canonical
+from sympy import Symbol
+
+
+class TestParse(unittest.TestCase):
+
+    def test_reuses_parsed_tree(self):
+        first = canonical.parse('x**2 + 1')
+        second = canonical.parse('x**2  +  1')
+
+        self.assertIs(first, second)
+
+    def test_equivalent_inputs_share_key(self):
+        keys = set(
+            canonical.structural_key(canonical.parse(raw))
+            for raw in ['x**2+1', '1 + x**2', 'x ** 2 + 1']
+        )
+
+        self.assertEqual(len(keys), 1)
+
+
+class TestCanonicalForm(unittest.TestCase):
+
+    def test_renames_variables(self):
+        fx = canonical.CanonicalForm(canonical.parse('sin(x)*x'), ['x'])
+        ft = canonical.CanonicalForm(canonical.parse('sin(t)*t'), ['t'])
+
+        self.assertEqual(fx.expr, ft.expr)
+        self.assertEqual(fx.key('derivative', fx.symbol('x')), ft.key('derivative', ft.symbol('t')))
+
+    def test_position_in_variables_matters(self):
+        first = canonical.CanonicalForm(canonical.parse('x - y'), ['x', 'y'])
+        second = canonical.CanonicalForm(canonical.parse('x - y'), ['y', 'x'])
+
+        self.assertNotEqual(first.key('expandExpr'), second.key('expandExpr'))
+
+    def test_ignores_unused_variables(self):
+        first = canonical.CanonicalForm(canonical.parse('x**2'), ['x'])
+        second = canonical.CanonicalForm(canonical.parse('x**2'), ['y', 'x', 'z'])
+
+        self.assertEqual(first.key('expandExpr'), second.key('expandExpr'))
+
+    def test_required_variables(self):
+        form = canonical.CanonicalForm(canonical.parse('x**2'), ['x'], required=['y'])
+
+        self.assertEqual(form.from_canonical(form.symbol('y')), Symbol('y'))
+
+    def test_round_trip(self):
+        expr = canonical.parse('x + exp(y)')
+        form = canonical.CanonicalForm(expr, ['x', 'y'])
+
+        self.assertNotEqual(form.expr, expr)
+        self.assertEqual(form.from_canonical([form.expr]), [expr])
+
+    def test_does_not_capture_placeholder_names(self):
+        expr = canonical.parse('x + _v0')
+        form = canonical.CanonicalForm(expr, ['x'])
+
+        self.assertEqual(form.expr, expr)
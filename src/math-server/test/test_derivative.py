@@ -1,5 +1,7 @@
 import unittest
+from unittest import mock
 from symserver import errors
+from symserver import operations
 from symserver.operations import derivative
 
 
@@ -176,3 +178,63 @@ class TestDerivative(unittest.TestCase):
 
         result = derivative(input)
         self.assertEqual(result.get('resultAsLatex'), r"\frac{1}{x \log{\left (10 \right )}}")  # log here is actually ln, make sure to switch in PrettyMath or the answer will be wrong
+
+
+class TestDerivativeChain(unittest.TestCase):
+
+    def setUp(self):
+        operations.derivative_cache.clear()
+        operations.result_cache.clear()
+
+    def test_next_order_costs_one_diff(self):
+        input = {
+            'expr': 'x**5 * y**3',
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'x']
+        }
+
+        derivative(input)
+
+        with mock.patch.object(operations, 'diff', wraps=operations.diff) as diff:
+            result = derivative(dict(input, wrt=['x', 'x', 'x']))
+
+        self.assertEqual(diff.call_count, 1)
+        self.assertEqual(result.get('resultAsPython'), '60*x**2*y**3')
+
+    def test_next_order_reuses_other_processes_results(self):
+        input = {
+            'operation': 'derivative',
+            'expr': 'x**5 * y**2',
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'x']
+        }
+
+        operations.handle_request(input)
+        operations.derivative_cache.clear()  # e.g. computed by another worker of the pool
+
+        with mock.patch.object(operations, 'diff', wraps=operations.diff) as diff:
+            result = operations.handle_request(dict(input, wrt=['x', 'x', 'x']))
+
+        self.assertEqual(diff.call_count, 1)
+        self.assertEqual(result.get('resultAsPython'), '60*x**2*y**2')
+
+    def test_mixed_partials_share_intermediates(self):
+        input = {
+            'expr': 'x**5 * y**3',
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'x']
+        }
+
+        derivative(input)
+
+        with mock.patch.object(operations, 'diff', wraps=operations.diff) as diff:
+            result = derivative(dict(input, wrt=['y', 'x', 'x']))
+
+        self.assertEqual(diff.call_count, 1)
+        self.assertEqual(result.get('resultAsPython'), '60*x**3*y**2')
+
+    def test_order_of_mixed_partials_shares_key(self):
+        first = operations.prepare_derivative({'expr': 'x*y', 'variables': ['x', 'y'], 'wrt': ['x', 'y']})
+        second = operations.prepare_derivative({'expr': 'x*y', 'variables': ['x', 'y'], 'wrt': ['y', 'x']})
+
+        self.assertEqual(first.key, second.key)
@@ -0,0 +1,132 @@
+import time
+import unittest
+from unittest import mock
+from symserver import engine
+from symserver import errors
+from symserver import operations
+
+
+def sleep_forever(expr):
+    time.sleep(60)
+
+
+def spin_forever(expr):
+    while True:
+        pass
+
+
+def spin_swallowing_errors(expr):
+    # like SymPy's heuristics, which catch Exception and try something else
+    while True:
+        try:
+            spin_forever(expr)
+        except Exception:
+            pass
+
+
+def explode(expr):
+    raise errors.InvalidParams('boom')
+
+
+def expand_job():
+    return operations.prepare({
+        'operation': 'expandExpr',
+        'expr': '(x + 1)**2',
+        'variables': ['x']
+    })
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def make_pool(self, compute, **kwargs):
+        # workers are forked, so they see the patched operation
+        with mock.patch.dict(operations.OPERATIONS, {'expandExpr': (None, compute, None)}):
+            pool = engine.WorkerPool(1, **kwargs)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_happy_path(self):
+        pool = self.make_pool(operations.compute_expandExpr, timeout=10)
+        job = expand_job()
+
+        self.assertEqual(pool.run(job), operations.execute(job))
+
+    def test_handle_request_executor(self):
+        pool = self.make_pool(operations.compute_expandExpr, timeout=10)
+        operations.result_cache.clear()
+
+        json = {
+            'operation': 'expandExpr',
+            'expr': '(y + 1)**2',
+            'variables': ['y']
+        }
+
+        result = operations.handle_request(json, executor=pool.run)
+
+        self.assertEqual(result.get('resultAsPython'), 'y**2 + 2*y + 1')
+
+    def test_propagates_errors(self):
+        pool = self.make_pool(explode, timeout=10)
+
+        with self.assertRaises(errors.InvalidParams):
+            pool.run(expand_job())
+
+    def test_wall_clock_timeout_replaces_worker(self):
+        pool = self.make_pool(sleep_forever, timeout=0.5)
+        stuck = pool._workers[0].process
+
+        with self.assertRaises(errors.ComputationTimeout):
+            pool.run(expand_job())
+
+        self.assertFalse(stuck.is_alive())
+        self.assertTrue(pool._workers[0].process.is_alive())
+
+    def test_cpu_limit(self):
+        pool = self.make_pool(spin_forever, timeout=30, cpu_limit=1)
+        started = time.monotonic()
+
+        with self.assertRaises(errors.ComputationTimeout):
+            pool.run(expand_job())
+
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_cpu_limit_is_not_swallowed(self):
+        pool = self.make_pool(spin_swallowing_errors, timeout=30, cpu_limit=1)
+        started = time.monotonic()
+
+        with self.assertRaisesRegex(errors.ComputationTimeout, 'cpu budget'):
+            pool.run(expand_job())
+
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_queue_timeout(self):
+        pool = self.make_pool(sleep_forever, timeout=5, queue_timeout=0.2)
+        pool.submit(expand_job())
+
+        with self.assertRaises(errors.ServerBusy):
+            pool.run(expand_job())
+
+    def test_replaces_workers_over_the_memory_limit(self):
+        pool = self.make_pool(operations.compute_expandExpr, timeout=10, max_rss=1)
+        first = pool._workers[0].process
+        job = expand_job()
+
+        self.assertEqual(pool.run(job), operations.execute(job))
+        self.assertFalse(first.is_alive())
+        self.assertEqual(pool.run(job), operations.execute(job))
+
+    def test_keeps_workers_under_the_memory_limit(self):
+        pool = self.make_pool(operations.compute_expandExpr, timeout=10, max_rss=1024 ** 4)
+        first = pool._workers[0].process
+
+        pool.run(expand_job())
+
+        self.assertIs(pool._workers[0].process, first)
+
+    def test_recovers_from_crashed_worker(self):
+        pool = self.make_pool(operations.compute_expandExpr, timeout=10)
+        pool._workers[0].process.terminate()
+        pool._workers[0].process.join()
+        job = expand_job()
+
+        self.assertEqual(pool.run(job), operations.execute(job))
@@ -0,0 +1,220 @@
+import base64
+import unittest
+from unittest import mock
+import numpy
+from symserver import arrays
+from symserver import errors
+from symserver import numeric
+from symserver.operations import handle_request
+
+
+def decode_result(result):
+    encoded = result.get('result')
+    return numpy.frombuffer(base64.b64decode(encoded['data']), dtype=encoded['dtype'])
+
+
+class TestEvaluate(unittest.TestCase):
+
+    def test_happy_path(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x**2 + y',
+            'variables': ['x', 'y'],
+            'values': {'x': [1, 2, 3], 'y': [10, 20, 30]},
+            'encoding': 'json'
+        }
+
+        result = handle_request(input)
+
+        self.assertEqual(result.get('result'), {'dtype': 'float64', 'shape': [3], 'values': [11.0, 24.0, 39.0]})
+        self.assertEqual(result.get('parsedExprAsLatex'), 'x^{2} + y')
+        self.assertNotIn('values', result.get('requestParams'))
+
+    def test_base64_columns(self):
+        x = numpy.linspace(0, 1, 1000)
+        input = {
+            'operation': 'evaluate',
+            'expr': 'sin(x) * exp(x)',
+            'variables': ['x'],
+            'values': {'x': arrays.encode(x)}
+        }
+
+        result = decode_result(handle_request(input))
+
+        numpy.testing.assert_allclose(result, numpy.sin(x) * numpy.exp(x))
+
+    def test_int_columns(self):
+        x = numpy.arange(4, dtype='<i4')
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x / 2',
+            'variables': ['x'],
+            'values': {'x': {'dtype': 'int32', 'data': base64.b64encode(x.tobytes()).decode('ascii')}}
+        }
+
+        result = decode_result(handle_request(input))
+
+        numpy.testing.assert_allclose(result, [0, 0.5, 1, 1.5])
+
+    def test_constant(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': '2',
+            'variables': ['x'],
+            'values': {'x': [1, 2]},
+            'encoding': 'json'
+        }
+
+        result = handle_request(input)
+
+        self.assertEqual(result.get('result').get('values'), [2.0, 2.0])
+
+    def test_non_finite_values(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'log(x)',
+            'variables': ['x'],
+            'values': {'x': [1, 0, -1]},
+            'encoding': 'json'
+        }
+
+        result = handle_request(input)
+
+        self.assertEqual(result.get('result').get('values'), [0.0, None, None])
+
+    def test_different_values_are_not_shared(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x',
+            'variables': ['x'],
+            'values': {'x': [1]},
+            'encoding': 'json'
+        }
+
+        first = handle_request(input)
+        second = handle_request(dict(input, values={'x': [2]}))
+
+        self.assertEqual(first.get('result').get('values'), [1.0])
+        self.assertEqual(second.get('result').get('values'), [2.0])
+
+    def test_throws_on_missing_values(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x + y',
+            'variables': ['x', 'y'],
+            'values': {'x': [1]}
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            handle_request(input)
+
+    def test_throws_on_undeclared_variables(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x + y',
+            'variables': ['x'],
+            'values': {'x': [1], 'y': [2]}
+        }
+
+        with self.assertRaises(errors.InvalidParams) as cm:
+            handle_request(input)
+        self.assertIn('variables y have values', str(cm.exception))
+
+    def test_keys_leave_out_the_values(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x',
+            'variables': ['x'],
+            'values': {'x': [1]}
+        }
+
+        with mock.patch.object(numeric.canonical, 'digest') as digest:
+            handle_request(input)
+
+        digest.assert_not_called()
+
+    def test_throws_on_uneven_columns(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x + y',
+            'variables': ['x', 'y'],
+            'values': {'x': [1], 'y': [1, 2]}
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            handle_request(input)
+
+    def test_throws_on_bad_values(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x',
+            'variables': ['x'],
+            'values': {'x': ['a']}
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            handle_request(input)
+
+
+class TestEvaluatorCache(unittest.TestCase):
+
+    def setUp(self):
+        numeric.evaluator_cache.clear()
+        numeric.evaluator_handles.clear()
+
+    def test_reuses_compiled_function(self):
+        input = {
+            'operation': 'evaluate',
+            'expr': 'x**2',
+            'variables': ['x'],
+            'values': {'x': [1, 2]}
+        }
+
+        handle_request(input)
+        handle_request(dict(input, values={'x': [3]}))
+
+        self.assertEqual(numeric.evaluator_cache.misses, 1)
+        self.assertEqual(numeric.evaluator_cache.hits, 1)
+
+    def test_alpha_equivalent_expressions_share_function(self):
+        handle_request({'operation': 'evaluate', 'expr': 'x**2', 'variables': ['x'], 'values': {'x': [1]}})
+        handle_request({'operation': 'evaluate', 'expr': 't**2', 'variables': ['t'], 'values': {'t': [1]}})
+
+        self.assertEqual(len(numeric.evaluator_cache), 1)
+
+    def test_handle(self):
+        first = handle_request({
+            'operation': 'evaluate',
+            'expr': 'x - y',
+            'variables': ['x', 'y'],
+            'values': {'x': [1], 'y': [1]}
+        })
+
+        with mock.patch.object(numeric.canonical, 'parse') as parse:
+            second = handle_request({
+                'operation': 'evaluate',
+                'handle': first.get('handle'),
+                'values': {'x': [5, 6], 'y': [1, 2]},
+                'encoding': 'json'
+            })
+
+        parse.assert_not_called()
+        self.assertEqual(second.get('handle'), first.get('handle'))
+        self.assertEqual(second.get('result').get('values'), [4.0, 4.0])
+
+    def test_throws_on_unknown_handle(self):
+        input = {
+            'operation': 'evaluate',
+            'handle': 'foo',
+            'values': {'x': [1]}
+        }
+
+        with self.assertRaises(errors.UnknownHandle):
+            handle_request(input)
+
+    def test_evicts_by_memory(self):
+        with mock.patch.object(numeric.evaluator_cache, 'max_weight', 1):
+            handle_request({'operation': 'evaluate', 'expr': 'x + 1', 'variables': ['x'], 'values': {'x': [1]}})
+            handle_request({'operation': 'evaluate', 'expr': 'x + 2', 'variables': ['x'], 'values': {'x': [1]}})
+
+        self.assertEqual(len(numeric.evaluator_cache), 1)
@@ -0,0 +1,26 @@
+import unittest
+from symserver import errors
+from symserver.operations import gradient
+
+
+class TestGradient(unittest.TestCase):
+
+    def test_happy_path(self):
+        input = {
+            'expr': 'x**2 * y',
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'y']
+        }
+
+        result = gradient(input)
+
+        self.assertEqual(result.get('resultAsPython'), 'Matrix([[2*x*y], [x**2]])')
+
+    def test_throws_on_no_wrt(self):
+        input = {
+            'expr': 'x**2',
+            'variables': ['x']
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            gradient(input)
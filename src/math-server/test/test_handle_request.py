@@ -1,5 +1,7 @@
 import unittest
+from unittest import mock
 from symserver import errors
+from symserver import operations
 from symserver.operations import handle_request
 
 
@@ -28,3 +30,92 @@ class TestHandleRequest(unittest.TestCase):
 
         with self.assertRaises(errors.InvalidParams):
             handle_request(json)
+
+
+    def test_throws_on_missing_expr(self):
+        params = dict(variables=['x'], wrt=['x'], target_var=['x'], values={'x': [1]}, leftBound=0, rightBound=1)
+
+        for operation in ['derivative', 'gradient', 'hessian', 'jacobian', 'integral', 'solveFor', 'expandExpr',
+                          'evaluate', 'sample']:
+            for expr in [None, 1, [None]]:
+                json = dict(params, operation=operation)
+                if expr is not None:
+                    json['expr'] = expr
+
+                with self.assertRaises(errors.InvalidParams, msg=operation + ' ' + repr(expr)):
+                    handle_request(json)
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        operations.result_cache.clear()
+
+    def test_cached_result_matches_uncached(self):
+        json = {
+            'operation': 'derivative',
+            'expr': 'x**3',
+            'variables': ['x'],
+            'wrt': ['x']
+        }
+
+        uncached = operations.derivative(json)
+        first = handle_request(json)
+        second = handle_request(json)
+
+        self.assertEqual(first, uncached)
+        self.assertEqual(second, uncached)
+        self.assertEqual(operations.result_cache.hits, 1)
+        self.assertEqual(operations.result_cache.misses, 1)
+
+    def test_equivalent_requests_share_entry(self):
+        first = {
+            'operation': 'expandExpr',
+            'expr': '(x + 1)**2',
+            'variables': ['x', 'y']
+        }
+        second = {
+            'operation': 'expandExpr',
+            'expr': ' (x  + 1)**2',
+            'variables': ['y', 'x']
+        }
+
+        handle_request(first)
+        result = handle_request(second)
+
+        self.assertEqual(operations.result_cache.hits, 1)
+        self.assertIs(result.get('requestParams'), second)
+
+    def test_operation_switch(self):
+        json = {
+            'operation': 'factorExpr',
+            'expr': 'x**2 + 2*x + 1',
+            'variables': ['x']
+        }
+
+        with mock.patch.object(operations.config, 'RESULT_CACHE_OPERATIONS', ['derivative']):
+            handle_request(json)
+            handle_request(json)
+
+        self.assertEqual(len(operations.result_cache), 0)
+
+    def test_alpha_equivalent_requests_share_entry(self):
+        first = {
+            'operation': 'derivative',
+            'expr': 'x**2 * exp(x)',
+            'variables': ['x'],
+            'wrt': ['x']
+        }
+        second = {
+            'operation': 'derivative',
+            'expr': 't**2 * exp(t)',
+            'variables': ['t'],
+            'wrt': ['t']
+        }
+
+        handle_request(first)
+        result = handle_request(second)
+
+        self.assertEqual(operations.result_cache.hits, 1)
+        self.assertEqual(result, operations.derivative(second))
+        self.assertEqual(result.get('resultAsPython'), 't**2*exp(t) + 2*t*exp(t)')
@@ -0,0 +1,57 @@
+import unittest
+from unittest import mock
+from symserver import errors
+from symserver import operations
+from symserver.operations import hessian
+
+
+class TestHessian(unittest.TestCase):
+
+    def setUp(self):
+        operations.derivative_cache.clear()
+
+    def test_happy_path(self):
+        input = {
+            'expr': 'x**3 * y**2',
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'y']
+        }
+
+        result = hessian(input)
+
+        self.assertEqual(result.get('resultAsPython'), 'Matrix([[6*x*y**2, 6*x**2*y], [6*x**2*y, 2*x**3]])')
+
+    def test_computes_upper_triangle(self):
+        input = {
+            'expr': 'x**3 * y**2 * z',
+            'variables': ['x', 'y', 'z'],
+            'wrt': ['x', 'y', 'z']
+        }
+
+        with mock.patch.object(operations, 'diff', wraps=operations.diff) as diff:
+            hessian(input)
+
+        # 3 first partials and 6 second partials
+        self.assertEqual(diff.call_count, 9)
+
+    def test_cse(self):
+        input = {
+            'expr': 'exp(x*y)',
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'y']
+        }
+
+        result = hessian(input)
+
+        replacements = result.get('resultAsCse').get('replacements')
+        self.assertIn(['_cse1', 'exp(_cse0)'], replacements)
+        self.assertNotIn('exp', result.get('resultAsCse').get('result'))
+
+    def test_throws_on_no_variables(self):
+        input = {
+            'expr': 'x**2',
+            'wrt': ['x']
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            hessian(input)
@@ -0,0 +1,165 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from symserver import budget
+from symserver import errors
+from symserver import integration
+from symserver.budget import TimeLimitExceeded
+from symserver.budget import time_limit
+from symserver.operations import integral
+from sympy import Integral
+from sympy import Piecewise
+from sympy import Symbol
+from sympy import erfi
+from sympy import exp
+from sympy import sin
+from sympy import sqrt
+
+
+class TestTiers(unittest.TestCase):
+
+    def setUp(self):
+        self.x = Symbol('x')
+
+    def test_rational(self):
+        result, tier = integration.antiderivative(self.x**2 + 1 / self.x, self.x)
+
+        self.assertEqual(tier, 'rational')
+        self.assertEqual(result.diff(self.x).expand(), self.x**2 + 1 / self.x)
+
+    def test_manual(self):
+        result, tier = integration.antiderivative(self.x * sin(self.x), self.x)
+
+        self.assertEqual(tier, 'manual')
+        self.assertEqual((result.diff(self.x) - self.x * sin(self.x)).simplify(), 0)
+
+    def test_skips_results_defined_on_part_of_the_domain(self):
+        result, tier = integration.antiderivative(sqrt(1 - self.x**2), self.x)
+
+        self.assertNotEqual(tier, 'manual')
+        self.assertFalse(result.has(Piecewise))
+        self.assertEqual((result.diff(self.x) - sqrt(1 - self.x**2)).simplify(), 0)
+
+    def test_falls_back_to_risch(self):
+        result, tier = integration.antiderivative(exp(self.x**2), self.x)
+
+        self.assertEqual(tier, 'risch')
+        self.assertTrue(result.has(erfi))
+
+    def test_slow_tier_is_skipped(self):
+        def slow(expr, wrt):
+            time.sleep(5)
+
+        with mock.patch.object(integration, 'CHEAP_TIERS', (('slow', slow),)), \
+                mock.patch.object(integration.config, 'INTEGRAL_TIER_TIMEOUT', 0.1):
+            start = time.monotonic()
+            _, tier = integration.antiderivative(self.x**2, self.x)
+
+        self.assertEqual(tier, 'risch')
+        self.assertLess(time.monotonic() - start, 2)
+
+    def test_timed_out_tier_skips_the_rest(self):
+        tried = []
+
+        def slow(expr, wrt):
+            tried.append('slow')
+            time.sleep(5)
+
+        def never(expr, wrt):
+            tried.append('never')
+
+        with mock.patch.object(integration, 'CHEAP_TIERS', (('slow', slow), ('never', never))), \
+                mock.patch.object(integration.config, 'INTEGRAL_TIER_TIMEOUT', 0.1):
+            _, tier = integration.antiderivative(self.x**2, self.x)
+
+        self.assertEqual(tier, 'risch')
+        self.assertEqual(tried, ['slow'])
+
+    def test_without_budgets_off_the_main_thread(self):
+        results = {}
+
+        def integrate_in_thread():
+            results['antiderivative'] = integration.antiderivative(self.x * sin(self.x), self.x)
+            results['definite'] = integration.definite_integral(self.x**2, self.x, 0, 3)
+
+        with mock.patch.object(budget, '_warned', False), mock.patch.object(budget, 'logger') as logger:
+            thread = threading.Thread(target=integrate_in_thread)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(logger.warning.call_count, 1)
+        self.assertEqual(results['antiderivative'][1], 'risch')
+        self.assertEqual(results['definite'][1], 'quadrature')
+        self.assertAlmostEqual(float(results['definite'][0]), 9)
+
+    def test_definite(self):
+        result, tier = integration.definite_integral(self.x**2, self.x, 0, 3)
+
+        self.assertEqual(tier, 'risch')
+        self.assertEqual(result, 9)
+
+    def test_quadrature_fallback(self):
+        def unevaluated(expr, limits):
+            return Integral(expr, limits)
+
+        with mock.patch.object(integration, 'integrate', unevaluated):
+            result, tier = integration.definite_integral(self.x**2, self.x, 0, 3)
+
+        self.assertEqual(tier, 'quadrature')
+        self.assertAlmostEqual(float(result), 9)
+
+    def test_quadrature_errors_are_invalid_params(self):
+        def unevaluated(expr, limits):
+            return Integral(expr, limits)
+
+        with mock.patch.object(integration, 'integrate', unevaluated), \
+                mock.patch.object(integration.mpmath, 'quad', side_effect=ZeroDivisionError('division by zero')):
+            with self.assertRaises(errors.InvalidParams):
+                integration.definite_integral(self.x**2, self.x, 0, 3)
+
+    def test_symbolic_bounds_are_not_numeric(self):
+        a = Symbol('a')
+
+        result, tier = integration.definite_integral(self.x, self.x, 0, a)
+
+        self.assertEqual(tier, 'risch')
+        self.assertEqual(result, a**2 / 2)
+
+
+class TestIntegralTier(unittest.TestCase):
+
+    def test_reports_tier(self):
+        input = {
+            'expr': 'x*sin(x)',
+            'variables': ['x'],
+            'wrt': 'x'
+        }
+
+        result = integral(input)
+
+        self.assertEqual(result.get('tier'), 'manual')
+        self.assertEqual(result.get('resultAsPython'), '-x*cos(x) + sin(x)')
+
+
+    def test_antiderivatives_hold_on_the_whole_domain(self):
+        input = {
+            'expr': 'sqrt(4 - x**2)',
+            'variables': ['x'],
+            'wrt': 'x'
+        }
+
+        result = integral(input)
+
+        self.assertEqual(result.get('resultAsPython'), 'x*sqrt(-x**2 + 4)/2 + 2*asin(x/2)')
+
+class TestTimeLimit(unittest.TestCase):
+
+    def test_interrupts(self):
+        with self.assertRaises(TimeLimitExceeded):
+            with time_limit(0.1):
+                time.sleep(5)
+
+    def test_no_limit(self):
+        with time_limit(None):
+            time.sleep(0.01)
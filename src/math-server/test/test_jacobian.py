@@ -0,0 +1,31 @@
+import unittest
+from symserver import errors
+from symserver.operations import jacobian
+
+
+class TestJacobian(unittest.TestCase):
+
+    def test_happy_path(self):
+        input = {
+            'expr': ['x*y', 'sin(x)*exp(y)'],
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'y']
+        }
+
+        result = jacobian(input)
+
+        self.assertEqual(result.get('resultAsPython'), 'Matrix([[y, x], [exp(y)*cos(x), exp(y)*sin(x)]])')
+        self.assertEqual(result.get('resultAsCse'), {
+            'replacements': [['_cse0', 'exp(y)']],
+            'result': 'Matrix([[y, x], [_cse0*cos(x), _cse0*sin(x)]])',
+        })
+
+    def test_throws_on_single_expr(self):
+        input = {
+            'expr': 'x*y',
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'y']
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            jacobian(input)
@@ -0,0 +1,92 @@
+import random
+import unittest
+from symserver import linalg
+from sympy import Matrix
+from sympy import Poly
+from sympy import QQ
+from sympy import Rational
+from sympy import Symbol
+from sympy.polys.domains import ZZ
+
+
+class TestRref(unittest.TestCase):
+
+    def rows(self, matrix):
+        return [dict((c, QQ(value)) for c, value in enumerate(row) if value) for row in matrix]
+
+    def test_full_rank(self):
+        reduced, pivots, rest = linalg.rref(self.rows([[2, 1, 3], [1, -1, 0]]), 2, QQ)
+
+        self.assertEqual(pivots, [0, 1])
+        self.assertEqual(reduced, [{0: QQ(1), 2: QQ(1)}, {1: QQ(1), 2: QQ(1)}])
+        self.assertEqual(rest, [])
+
+    def test_fractions(self):
+        reduced, pivots, _ = linalg.rref([{0: QQ(1, 2), 1: QQ(1, 3), 2: QQ(1)}, {0: QQ(1), 1: QQ(-1, 5)}], 2, QQ)
+
+        self.assertEqual(reduced, [{0: QQ(1), 2: QQ(6, 13)}, {1: QQ(1), 2: QQ(30, 13)}])
+
+    def test_rank_deficient(self):
+        reduced, pivots, rest = linalg.rref(self.rows([[1, 2, 1, 1], [2, 4, 2, 2], [1, 0, -1, 0]]), 3, QQ)
+
+        self.assertEqual(pivots, [0, 1])
+        self.assertEqual(reduced, [{0: QQ(1), 2: QQ(-1)}, {1: QQ(1), 2: QQ(1), 3: QQ(1, 2)}])
+        self.assertEqual(rest, [])
+
+    def test_inconsistent(self):
+        _, pivots, rest = linalg.rref(self.rows([[1, 1, 1], [1, 1, 2]]), 2, QQ)
+
+        self.assertEqual(pivots, [0])
+        self.assertEqual(rest, [{2: QQ(1)}])
+
+    def test_fraction_field(self):
+        a = Symbol('a')
+        field = ZZ.frac_field(a)
+        rows = [{0: field.convert(a), 1: field.one, 2: field.one}, {0: field.one, 1: -field.one}]
+
+        reduced, pivots, _ = linalg.rref(rows, 2, field)
+
+        self.assertEqual(pivots, [0, 1])
+        self.assertEqual(field.to_sympy(reduced[0][2]), 1 / (a + 1))
+
+
+class TestMatrixOperations(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(7)
+        self.n = 8
+        self.matrix = Matrix(self.n, self.n, lambda i, j: Rational(random.randint(-9, 9), random.randint(1, 5)))
+        self.rows = [dict((j, QQ.convert(self.matrix[i, j])) for j in range(self.n) if self.matrix[i, j])
+                     for i in range(self.n)]
+
+    def to_matrix(self, rows, ncols):
+        return Matrix(len(rows), ncols, lambda i, j: QQ.to_sympy(rows[i].get(j, QQ.zero)))
+
+    def test_det(self):
+        self.assertEqual(QQ.to_sympy(linalg.det(self.rows, self.n, QQ)), self.matrix.det())
+
+    def test_det_needs_row_swaps(self):
+        self.assertEqual(linalg.det([{1: QQ(1)}, {0: QQ(1)}], 2, QQ), QQ(-1))
+
+    def test_det_singular(self):
+        self.assertEqual(linalg.det([{0: QQ(1), 1: QQ(2)}, {0: QQ(2), 1: QQ(4)}], 2, QQ), QQ(0))
+
+    def test_inverse(self):
+        inverse = linalg.inverse(self.rows, self.n, QQ)
+
+        self.assertEqual(self.to_matrix(inverse, self.n), self.matrix.inv())
+
+    def test_inverse_singular(self):
+        self.assertIsNone(linalg.inverse([{0: QQ(1), 1: QQ(2)}, {0: QQ(2), 1: QQ(4)}], 2, QQ))
+
+    def test_charpoly(self):
+        x = Symbol('x')
+
+        coeffs = linalg.charpoly(self.rows, self.n, QQ)
+
+        self.assertEqual(Poly([QQ.to_sympy(c) for c in coeffs], x), self.matrix.charpoly(x).as_poly(x))
+
+    def test_matmul(self):
+        product = linalg.matmul(self.rows, self.rows, self.n, QQ)
+
+        self.assertEqual(self.to_matrix(product, self.n), self.matrix * self.matrix)
@@ -0,0 +1,100 @@
+import unittest
+from symserver import errors
+from symserver.operations import handle_request
+
+
+class TestMatrixOperations(unittest.TestCase):
+
+    def compute(self, operation, matrix, variables=()):
+        return handle_request({
+            'operation': operation,
+            'matrix': matrix,
+            'variables': list(variables),
+        })
+
+    def test_det(self):
+        result = self.compute('det', [['a', 'b'], ['c', 'd']], variables=['a', 'b', 'c', 'd'])
+
+        self.assertEqual(result.get('resultAsPython'), 'a*d - b*c')
+
+    def test_det_algebraic(self):
+        result = self.compute('det', [['sqrt(2)', '1'], ['1', 'sqrt(2)']])
+
+        self.assertEqual(result.get('resultAsPython'), '1')
+
+    def test_inverse(self):
+        result = self.compute('inverse', [['1', '2'], ['3', '4']])
+
+        self.assertEqual(result.get('resultAsPython'), 'Matrix([[-2, 1], [3/2, -1/2]])')
+
+    def test_inverse_floats(self):
+        result = self.compute('inverse', [[2.0, 0], [0, 4]])
+
+        self.assertEqual(result.get('resultAsPython'), 'Matrix([[0.500000000000000, 0], [0, 0.250000000000000]])')
+
+    def test_throws_on_singular(self):
+        with self.assertRaises(errors.InvalidParams):
+            self.compute('inverse', [[1, 2], [2, 4]])
+
+    def test_rref(self):
+        result = self.compute('rref', [['1', '2', '3'], ['2', '4', '6']])
+
+        self.assertEqual(result.get('resultAsPython'), 'Matrix([[1, 2, 3], [0, 0, 0]])')
+        self.assertEqual(result.get('pivots'), [0])
+
+    def test_charpoly(self):
+        result = self.compute('charpoly', [['a', '1'], ['1', 'a']], variables=['a'])
+
+        self.assertEqual(result.get('resultAsPython'), 'a**2 - 2*a*lamda + lamda**2 - 1')
+        self.assertEqual(result.get('resultAsLatex'), 'a^{2} - 2 a \\lambda + \\lambda^{2} - 1')
+
+    def test_charpoly_can_be_sent_back(self):
+        result = self.compute('charpoly', [[1, 2], [3, 4]])
+
+        sent_back = handle_request({
+            'operation': 'expandExpr',
+            'expr': result.get('resultAsPython'),
+            'variables': ['lamda'],
+        })
+
+        self.assertEqual(sent_back.get('resultAsPython'), 'lamda**2 - 5*lamda - 2')
+
+    def test_eigenvals(self):
+        result = self.compute('eigenvals', [['a', '1'], ['1', 'a']], variables=['a'])
+
+        self.assertEqual(result.get('resultAsPython'), '{a - 1: 1, a + 1: 1}')
+
+    def test_eigenvals_without_formula(self):
+        companion = [[0, 0, 0, 0, -1], [1, 0, 0, 0, 1], [0, 1, 0, 0, 0], [0, 0, 1, 0, 0], [0, 0, 0, 1, 0]]
+
+        result = self.compute('eigenvals', companion)
+
+        self.assertIn('CRootOf(lamda**5 - lamda + 1, 0): 1', result.get('resultAsPython'))
+
+    def test_throws_on_non_square(self):
+        with self.assertRaises(errors.InvalidParams):
+            self.compute('det', [[1, 2]])
+
+    def test_throws_on_ragged_rows(self):
+        with self.assertRaises(errors.InvalidParams):
+            self.compute('det', [[1, 2], [3]])
+
+
+class TestMatmul(unittest.TestCase):
+
+    def test_happy_path(self):
+        result = handle_request({
+            'operation': 'matmul',
+            'matrices': [[['1', 'x']], [['2'], ['3']], [['1', '1/2']]],
+            'variables': ['x'],
+        })
+
+        self.assertEqual(result.get('resultAsPython'), 'Matrix([[3*x + 2, 3*x/2 + 1]])')
+
+    def test_throws_on_shapes(self):
+        with self.assertRaises(errors.InvalidParams):
+            handle_request({
+                'operation': 'matmul',
+                'matrices': [[[1, 2]], [[1, 2]]],
+                'variables': [],
+            })
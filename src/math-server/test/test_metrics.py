@@ -0,0 +1,160 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from symserver import errors
+from symserver import metrics
+from symserver import operations
+from symserver.metrics import Registry
+
+
+def record_in_child(directory):
+    with mock.patch('symserver.config.METRICS_DIR', directory):
+        metrics.registry.clear()
+        metrics.registry.count('symserver_requests_total', operation='derivative')
+        metrics.registry.observe('symserver_request_seconds', 0.2, operation='derivative')
+        metrics.flush()
+
+
+def sample(text, line_prefix):
+    # the value of the first line of the exposition starting with line_prefix
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.split(' ')[-1])
+    return None
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(metrics, 'registry', Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counters(self):
+        metrics.registry.count('symserver_requests_total', operation='integral')
+        metrics.registry.count('symserver_requests_total', operation='integral')
+        metrics.registry.count('symserver_errors_total', operation='integral', type='InvalidParams')
+
+        text = metrics.render()
+
+        self.assertIn('# TYPE symserver_requests_total counter', text)
+        self.assertEqual(sample(text, 'symserver_requests_total{operation="integral"}'), 2)
+        self.assertEqual(sample(text, 'symserver_errors_total{operation="integral",type="InvalidParams"}'), 1)
+
+    def test_histograms_are_cumulative(self):
+        metrics.registry.observe('symserver_phase_seconds', 0.003, operation='derivative', phase='latex')
+        metrics.registry.observe('symserver_phase_seconds', 0.3, operation='derivative', phase='latex')
+        metrics.registry.observe('symserver_phase_seconds', 100, operation='derivative', phase='latex')
+
+        text = metrics.render()
+        labels = 'operation="derivative",phase="latex"'
+
+        self.assertEqual(sample(text, 'symserver_phase_seconds_bucket{' + labels + ',le="0.001"}'), 0)
+        self.assertEqual(sample(text, 'symserver_phase_seconds_bucket{' + labels + ',le="0.005"}'), 1)
+        self.assertEqual(sample(text, 'symserver_phase_seconds_bucket{' + labels + ',le="0.5"}'), 2)
+        self.assertEqual(sample(text, 'symserver_phase_seconds_bucket{' + labels + ',le="+Inf"}'), 3)
+        self.assertEqual(sample(text, 'symserver_phase_seconds_count{' + labels + '}'), 3)
+        self.assertAlmostEqual(sample(text, 'symserver_phase_seconds_sum{' + labels + '}'), 100.303)
+
+    def test_escapes_labels(self):
+        metrics.registry.count('symserver_requests_total', operation='a"b\\c')
+
+        self.assertIn('symserver_requests_total{operation="a\\"b\\\\c"} 1', metrics.render())
+
+    def test_gauges(self):
+        metrics.registry.gauge('symserver_pool_queue_depth', lambda: 3)
+
+        self.assertEqual(sample(metrics.render(), 'symserver_pool_queue_depth'), 3)
+
+
+class TestHandleRequestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(metrics, 'registry', Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        operations.result_cache.clear()
+
+    def test_records_requests_and_phases(self):
+        operations.handle_request({
+            'operation': 'derivative',
+            'expr': 'x**7 + sin(x)*17',
+            'variables': ['x'],
+            'wrt': ['x'],
+        })
+
+        text = metrics.render()
+
+        self.assertEqual(sample(text, 'symserver_requests_total{operation="derivative"}'), 1)
+        self.assertEqual(sample(text, 'symserver_cache_lookups_total{operation="derivative",outcome="miss"}'), 1)
+        self.assertEqual(sample(text, 'symserver_request_seconds_count{operation="derivative"}'), 1)
+        self.assertEqual(sample(text, 'symserver_expression_size_count{operation="derivative"}'), 1)
+        for phase in ('parse_expr', 'compute', 'latex', 'str'):
+            self.assertGreaterEqual(
+                sample(text, 'symserver_phase_seconds_count{operation="derivative",phase="' + phase + '"}'), 1)
+
+    def test_records_errors_by_type(self):
+        with self.assertRaises(errors.InvalidParams):
+            operations.handle_request({'operation': 'integral', 'variables': ['x']})
+        with self.assertRaises(errors.InvalidParams):
+            operations.handle_request({'operation': 'nope'})
+
+        text = metrics.render()
+
+        self.assertEqual(sample(text, 'symserver_errors_total{operation="integral",type="InvalidParams"}'), 1)
+        self.assertEqual(sample(text, 'symserver_errors_total{operation="unknown",type="InvalidParams"}'), 1)
+
+    def test_suppressed(self):
+        with metrics.suppressed():
+            operations.handle_request({'operation': 'expandExpr', 'expr': '(x + 7)**2', 'variables': ['x']})
+
+        self.assertEqual(metrics.registry.counters, {})
+
+
+class TestMetricsAcrossProcesses(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for patcher in (mock.patch('symserver.config.METRICS_DIR', self.directory),
+                        mock.patch.object(metrics, 'registry', Registry())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_sums_the_processes(self):
+        child = multiprocessing.Process(target=record_in_child, args=(self.directory,))
+        child.start()
+        child.join()
+        metrics.registry.count('symserver_requests_total', operation='derivative')
+        metrics.registry.observe('symserver_request_seconds', 0.02, operation='derivative')
+
+        text = metrics.render()
+
+        self.assertEqual(sample(text, 'symserver_requests_total{operation="derivative"}'), 2)
+        self.assertEqual(sample(text, 'symserver_request_seconds_count{operation="derivative"}'), 2)
+        self.assertEqual(sample(text, 'symserver_request_seconds_bucket{operation="derivative",le="0.025"}'), 1)
+
+    def test_ignores_gauges_of_exited_processes(self):
+        child = multiprocessing.Process(target=record_in_child, args=(self.directory,))
+        child.start()
+        child.join()
+
+        path = os.path.join(self.directory, str(child.pid) + '.json')
+        with open(path) as f:
+            snapshot = json.load(f)
+        snapshot['gauges']['symserver_pool_queue_depth'] = 5
+        with open(path, 'w') as f:
+            json.dump(snapshot, f)
+        metrics.registry.gauge('symserver_pool_queue_depth', lambda: 1)
+
+        self.assertEqual(sample(metrics.render(), 'symserver_pool_queue_depth'), 1)
+
+    def test_clear_directory(self):
+        metrics.flush()
+        metrics.clear_directory()
+
+        self.assertEqual(os.listdir(self.directory), [])
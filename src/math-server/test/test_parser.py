@@ -0,0 +1,96 @@
+import unittest
+from symserver import errors
+from symserver import parser
+from sympy import Symbol
+from sympy import srepr
+from sympy.parsing.sympy_parser import parse_expr
+
+
+class TestParser(unittest.TestCase):
+
+    def test_same_trees_as_parse_expr(self):
+        for raw in [
+            'x**2 + 3*x - 2',
+            '(x**2+x)/x',
+            'sin(x)*exp(x**2)/(1 + x)',
+            'log(x, 10)',
+            'ln(x)',
+            '-x**2',
+            '2**-1',
+            '2**3**2',
+            '1.5*x',
+            '1e-20',
+            '.5',
+            '1/2',
+            'x/y/z',
+            'x*y%z*2',
+            'x!',
+            'oo - pi/2 + E**x + I*x',
+            'diff(sin(x)*x, x)',
+            'diff(x**3, x, 2)',
+            'Derivative(x**2, x)',
+            'integrate(x**2, x)',
+            'integrate(x, (x, 0, 1))',
+            'Integral(exp(-x**2), (x, -oo, oo))',
+            'Rational(1, 3)',
+            'beta(x, y)',
+            'Sum(1/k**2, (k, 1, oo))',
+            'summation(k, (k, 1, (n)))',
+            'Product(k + 1, (k, 1, n))',
+            'limit(sin(x)/x, x, 0)',
+            '-(-x) + +x',
+            'x - (y - 1)',
+            'atan2(y, x)',
+            'Min(x, 2)',
+            '3.141592653589793238462',
+        ]:
+            self.assertEqual(srepr(parser.parse(raw)), srepr(parse_expr(raw)), raw)
+
+    def test_names(self):
+        self.assertEqual(parser.parse('beta'), Symbol('beta'))
+        self.assertEqual(parser.parse('gamma + 1'), Symbol('gamma') + 1)
+
+    def test_errors_have_positions(self):
+        for raw, position in [
+            ('x + (1', 6),
+            ('x + 1)', 5),
+            ('2x', 1),
+            ('x +', 3),
+            ('x ^ 2', 2),
+            ('sin + 1', 0),
+            ('x + lambda', 4),
+            ('pi(x)', 0),
+            ('f(x, y)', 0),
+            ('x + abs(x)', 4),
+            ('sin(foo(x))', 4),
+            ('Sum(k, (k, 1, n) + 1)', 17),
+            ('(x, y)', 2),
+            ('log()', 0),
+            ('', 0),
+        ]:
+            with self.assertRaises(errors.InvalidParams, msg=raw) as cm:
+                parser.parse(raw)
+            self.assertEqual(cm.exception.position, position, raw)
+            self.assertIn('at position ' + str(position), str(cm.exception))
+
+    def test_evaluates_no_python(self):
+        for raw in ['__import__("os").system("true")', 'x.__class__', '[x]', 'lambda: 1', 'x if y else z']:
+            with self.assertRaises(errors.InvalidParams, msg=raw):
+                parser.parse(raw)
+
+    def test_limits_nesting(self):
+        parser.parse('(' * parser.MAX_DEPTH + 'x' + ')' * parser.MAX_DEPTH)
+
+        with self.assertRaises(errors.InvalidParams):
+            parser.parse('(' * 1000 + 'x' + ')' * 1000)
+        with self.assertRaises(errors.InvalidParams):
+            parser.parse('-' * 1000 + 'x')
+
+    def test_describe_includes_position(self):
+        with self.assertRaises(errors.InvalidParams) as cm:
+            parser.parse('x + (1')
+
+        body, code = errors.describe(cm.exception)
+
+        self.assertEqual(code, 400)
+        self.assertEqual(body['position'], 6)
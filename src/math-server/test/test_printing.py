@@ -0,0 +1,120 @@
+import threading
+import unittest
+from unittest import mock
+from symserver import errors
+from symserver import operations
+from symserver import printing
+from symserver.cache import LRUCache
+from sympy import Float
+from sympy import ImmutableMatrix
+from sympy import Integral
+from sympy import Rational
+from sympy import exp
+from sympy import latex
+from sympy import oo
+from sympy import sin
+from sympy import symbols
+
+x, y = symbols('x y')
+
+
+def expand_request(**params):
+    request = {
+        'operation': 'expandExpr',
+        'expr': '(x + 2)**3',
+        'variables': ['x'],
+    }
+    request.update(params)
+    return request
+
+
+class TestPrinting(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(printing, 'print_cache', LRUCache(100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prints_like_latex_and_str(self):
+        for obj in [
+            x**2 + sin(x)/3,
+            Float('2.5')*x,
+            Rational(1, 3),
+            oo,
+            Integral(exp(-x**2), (x, 0, oo)),
+            ImmutableMatrix([[x, 1.0], [y, 2]]),
+            [x, 1/x],
+            (x,),
+            [],
+            [{x: y + 1.5}],
+        ]:
+            for _ in range(2):  # printed, then from the cache
+                self.assertEqual(printing.python(obj), str(obj))
+                self.assertEqual(printing.latex(obj), latex(obj))
+
+    def test_memoizes(self):
+        expr = x**3 + 6*x**2 + 12*x + 8
+
+        first = printing.latex(expr)
+
+        self.assertEqual(printing.latex(x**3 + 6*x**2 + 12*x + 8), first)
+        self.assertEqual(printing.print_cache.hits, 1)
+
+    def test_equal_expressions_of_other_types_print_apart(self):
+        self.assertEqual(printing.python([x + 1]), '[x + 1]')
+        self.assertEqual(printing.python([x + 1.0]), '[x + 1.0]')
+        self.assertEqual(printing.python((x + 1,)), '(x + 1,)')
+
+    def test_printers_per_thread(self):
+        outputs = []
+
+        def print_expr():
+            outputs.append(printing.python(Float('0.5')*x + y))
+
+        threads = [threading.Thread(target=print_expr) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outputs, ['0.5*x + y'] * 4)
+
+
+class TestFormats(unittest.TestCase):
+
+    def test_both_by_default(self):
+        response = operations.handle_request(expand_request())
+
+        self.assertEqual(response['resultAsPython'], 'x**3 + 6*x**2 + 12*x + 8')
+        self.assertIn('resultAsLatex', response)
+        self.assertIn('parsedExprAsLatex', response)
+
+    def test_only_the_requested_formats(self):
+        response = operations.handle_request(expand_request(formats=['python']))
+        self.assertEqual(response['resultAsPython'], 'x**3 + 6*x**2 + 12*x + 8')
+        self.assertNotIn('resultAsLatex', response)
+        self.assertNotIn('parsedExprAsLatex', response)
+
+        response = operations.handle_request(expand_request(formats=['latex']))
+        self.assertNotIn('resultAsPython', response)
+        self.assertEqual(response['parsedExprAsLatex'], '\\left(x + 2\\right)^{3}')
+
+        response = operations.handle_request(expand_request(formats=[]))
+        self.assertEqual(set(response), {'requestParams'})
+
+    def test_matrix_without_python(self):
+        response = operations.handle_request({
+            'operation': 'gradient',
+            'expr': 'x*y',
+            'variables': ['x', 'y'],
+            'wrt': ['x', 'y'],
+            'formats': ['latex'],
+        })
+
+        self.assertNotIn('resultAsCse', response)
+        self.assertIn('resultAsLatex', response)
+
+    def test_invalid_formats(self):
+        for formats in ['latex', ['latex', 'mathml'], [None]]:
+            with self.assertRaises(errors.InvalidParams, msg=formats):
+                operations.handle_request(expand_request(formats=formats))
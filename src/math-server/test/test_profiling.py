@@ -0,0 +1,136 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from symserver import engine
+from symserver import operations
+from symserver import profiling
+
+
+class FakeJob(object):
+
+    def __init__(self, profile=False):
+        self.operation = 'integral'
+        self.key = 'abcdef0123456789'
+        self.profile = profile
+        self.profile_report = None
+
+
+def spin(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def integral_request():
+    return {
+        'operation': 'integral',
+        'expr': 'x*exp(x)',
+        'variables': ['x'],
+        'wrt': 'x',
+    }
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch('symserver.config.PROFILE_DIR', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requested(self):
+        self.assertTrue(profiling.requested({'X-Symserver-Profile': 'true'}))
+        self.assertFalse(profiling.requested({'X-Symserver-Profile': '0'}))
+        self.assertFalse(profiling.requested({}))
+
+        with mock.patch('symserver.config.PROFILE_SAMPLE_RATE', 1):
+            self.assertTrue(profiling.requested({}))
+
+        with mock.patch('symserver.config.PROFILE_HEADER', ''):
+            self.assertFalse(profiling.requested({'X-Symserver-Profile': '1'}))
+
+    def test_profiled_request(self):
+        operations.handle_request(integral_request())  # cached, but a profiled request computes anyway
+
+        response = operations.handle_request(integral_request(), profile=True)
+        profile = response['profile']
+
+        self.assertEqual(response['resultAsPython'], 'x*exp(x) - exp(x)')
+        self.assertTrue(profile['top'])
+        self.assertLessEqual(len(profile['top']), 20)
+        self.assertIn('compute_integral', ' '.join(row['function'] for row in profile['top']))
+        self.assertTrue(os.path.exists(profile['file']))
+
+    def test_unprofiled_request(self):
+        self.assertNotIn('profile', operations.handle_request(integral_request()))
+
+    def test_profile_comes_back_from_the_pool(self):
+        pool = engine.WorkerPool(1, timeout=30)
+        self.addCleanup(pool.close)
+
+        response = operations.handle_request(integral_request(), executor=pool.run, profile=True)
+
+        self.assertTrue(response['profile']['top'])
+
+    def test_logs_slow_computations(self):
+        job = FakeJob()
+
+        with mock.patch('symserver.config.PROFILE_SLOW_SECONDS', 0.1), \
+                self.assertLogs('symserver.profiling', 'WARNING') as logs:
+            with profiling.profiled(job):
+                spin(0.3)
+
+        self.assertIn('spin', logs.output[0])
+        self.assertIsNone(job.profile_report)
+
+        [name] = os.listdir(self.directory)
+        self.assertTrue(name.endswith('-integral-abcdef012345.folded'))
+        with open(os.path.join(self.directory, name)) as f:
+            self.assertIn('(spin) ', f.read())
+
+    def test_fast_computations_are_not_logged(self):
+        with mock.patch('symserver.config.PROFILE_SLOW_SECONDS', 10), \
+                mock.patch.object(profiling.logger, 'warning') as warning:
+            with profiling.profiled(FakeJob()):
+                pass
+
+        warning.assert_not_called()
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_keeps_the_newest_profiles(self):
+        with mock.patch('symserver.config.PROFILE_MAX_FILES', 2):
+            for _ in range(4):
+                with profiling.profiled(FakeJob(profile=True)):
+                    pass
+
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_samples_nothing_by_default(self):
+        with mock.patch.object(profiling, 'get_sampler') as get_sampler:
+            with profiling.profiled(FakeJob()):
+                pass
+
+        get_sampler.assert_not_called()
+
+    def test_where_hides_directories(self):
+        package = os.path.dirname(os.path.dirname(os.path.abspath(profiling.__file__)))
+
+        self.assertEqual(profiling._where(profiling.__file__, 1, 'f'), 'symserver/profiling.py:1(f)')
+        self.assertEqual(profiling._where(os.path.join(package, 'server.py'), 2, 'g'), 'server.py:2(g)')
+        self.assertEqual(profiling._where(os.__file__, 3, 'h'), os.path.relpath(os.__file__, sys.base_prefix) + ':3(h)')
+        self.assertEqual(profiling._where('/somewhere/else/app.py', 4, 'i'), 'app.py:4(i)')
+        self.assertEqual(profiling._where('<string>', 5, '<module>'), '<string>:5(<module>)')
+
+    def test_summarize_samples(self):
+        a, b, c = ('f.py', 1, 'a'), ('f.py', 2, 'b'), ('f.py', 3, 'c')
+        stacks = {(a, b): 3, (a, c): 1}
+
+        rows = profiling.summarize_samples(stacks, 2)
+
+        self.assertEqual(rows[0], dict(function='f.py:1(a)', samples=0, cumulativeSamples=1))
+        self.assertEqual(rows[1], dict(function='f.py:2(b)', samples=0.75, cumulativeSamples=0.75))
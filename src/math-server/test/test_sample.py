@@ -0,0 +1,77 @@
+import unittest
+from symserver import errors
+from symserver.operations import handle_request
+
+
+def sample(expr, left, right, pixels=400, **params):
+    return handle_request(dict({
+        'operation': 'sample',
+        'expr': expr,
+        'variables': ['x'],
+        'wrt': 'x',
+        'leftBound': left,
+        'rightBound': right,
+        'pixels': pixels,
+    }, **params))
+
+
+class TestSample(unittest.TestCase):
+
+    def test_happy_path(self):
+        result = sample('x**2', -1, 1)
+        segment = result.get('segments')[0]
+
+        self.assertEqual(len(result.get('segments')), 1)
+        self.assertEqual(segment[0], [-1.0, 1.0])
+        self.assertEqual(segment[-1], [1.0, 1.0])
+        self.assertLess(len(segment), 400)
+        self.assertEqual(result.get('discontinuities'), [])
+
+    def test_line_needs_two_points(self):
+        result = sample('2*x + 1', 0, 1)
+
+        self.assertEqual(result.get('segments'), [[[0.0, 1.0], [1.0, 3.0]]])
+
+    def test_pole(self):
+        result = sample('1/x', -1, 1)
+
+        self.assertEqual(len(result.get('segments')), 2)
+        self.assertEqual(len(result.get('discontinuities')), 1)
+        self.assertAlmostEqual(result.get('discontinuities')[0], 0)
+
+    def test_jump(self):
+        result = sample('floor(x)', 0, 1.5)
+
+        self.assertEqual(len(result.get('segments')), 2)
+        self.assertAlmostEqual(result.get('discontinuities')[0], 1)
+
+    def test_steep_but_continuous(self):
+        result = sample('exp(x)', -50, 50)
+
+        self.assertEqual(len(result.get('segments')), 1)
+
+    def test_undefined_region(self):
+        result = sample('sqrt(x)', -1, 1)
+        segment = result.get('segments')[0]
+
+        self.assertEqual(len(result.get('segments')), 1)
+        self.assertAlmostEqual(segment[0][0], 0, places=6)
+
+    def test_symbolic_bounds(self):
+        result = sample('tan(x)', '-pi', 'pi')
+
+        self.assertEqual(len(result.get('discontinuities')), 2)
+
+    def test_throws_on_other_variables(self):
+        with self.assertRaises(errors.InvalidParams):
+            sample('x + y', 0, 1)
+
+    def test_throws_on_bad_bounds(self):
+        with self.assertRaises(errors.InvalidParams):
+            sample('x', 1, 0)
+        with self.assertRaises(errors.InvalidParams):
+            sample('x', 'y', 1)
+
+    def test_throws_on_bad_pixels(self):
+        with self.assertRaises(errors.InvalidParams):
+            sample('x', 0, 1, pixels=1)
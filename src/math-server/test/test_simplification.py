@@ -0,0 +1,84 @@
+import time
+import unittest
+from unittest import mock
+from symserver import errors
+from symserver import simplification
+from symserver.operations import derivative
+from symserver.operations import solveFor
+from sympy import Symbol
+from sympy import cos
+from sympy import sin
+
+
+class TestSimplifyResult(unittest.TestCase):
+
+    def setUp(self):
+        self.x = Symbol('x')
+        self.expr = 2 * self.x / (self.x - 1) - (self.x**2 - 1) / (self.x - 1)**2
+
+    def test_none(self):
+        self.assertEqual(simplification.simplify_result(self.expr, 'none'), self.expr)
+
+    def test_cheap(self):
+        self.assertEqual(simplification.simplify_result(self.expr, 'cheap'), 1)
+
+    def test_full(self):
+        expr = sin(self.x)**2 * self.x + cos(self.x)**2 * self.x + 1
+
+        self.assertEqual(simplification.simplify_result(expr, 'full'), self.x + 1)
+
+    def test_small_results_are_left_alone(self):
+        with mock.patch.object(simplification, 'simplify') as simplify:
+            simplification.simplify_result(self.x + 1, 'full')
+
+        simplify.assert_not_called()
+
+    def test_slow_full_settles_for_cheap(self):
+        def slow_simplify(expr):
+            time.sleep(5)
+
+        with mock.patch.object(simplification, 'simplify', slow_simplify), \
+                mock.patch.object(simplification.config, 'SIMPLIFY_TIMEOUT', 0.1):
+            start = time.monotonic()
+            result = simplification.simplify_result(self.expr, 'full')
+
+        self.assertEqual(result, 1)
+        self.assertLess(time.monotonic() - start, 2)
+
+
+class TestSimplifyParam(unittest.TestCase):
+
+    def test_derivative(self):
+        input = {
+            'expr': '(x**2 - 1)/(x - 1)',
+            'variables': ['x'],
+            'wrt': ['x'],
+            'simplify': 'full'
+        }
+
+        result = derivative(input)
+
+        self.assertEqual(result.get('resultAsPython'), '1')
+
+    def test_solveFor(self):
+        input = {
+            'expr': 'x*(y**2 - 1) = y - 1',
+            'variables': ['x', 'y'],
+            'target_var': ['x'],
+            'simplify': 'cheap'
+        }
+
+        result = solveFor(input)
+
+        self.assertEqual(result.get('resultAsPython'), '[1/(y + 1)]')
+
+    def test_throws_on_unknown_policy(self):
+        input = {
+            'expr': 'x**2',
+            'variables': ['x'],
+            'wrt': ['x'],
+            'simplify': 'aggressive'
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            derivative(input)
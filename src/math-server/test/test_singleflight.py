@@ -0,0 +1,206 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from symserver import errors
+from symserver import operations
+from symserver import singleflight
+from symserver.singleflight import SingleFlight
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.005)
+
+
+class Leader(object):
+    """A compute function which blocks until released, counting its calls."""
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run_in_threads(flights, compute, count, lookup=lambda: None):
+    outcomes = [None] * count
+
+    def target(i):
+        try:
+            outcomes[i] = flights.run('key', compute, lookup)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_followers_share_the_result(self):
+        flights = SingleFlight()
+        compute = Leader(result=42)
+
+        threads, outcomes = run_in_threads(flights, compute, 5)
+        wait_until(lambda: flights.followers == 4)
+        compute.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(outcomes, [42] * 5)
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual(flights.stats()['inFlight'], 0)
+
+    def test_followers_share_deterministic_errors(self):
+        flights = SingleFlight()
+        compute = Leader(error=errors.InvalidParams('nope'))
+
+        threads, outcomes = run_in_threads(flights, compute, 3)
+        wait_until(lambda: flights.followers == 2)
+        compute.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(isinstance(outcome, errors.InvalidParams) for outcome in outcomes))
+        self.assertEqual(compute.calls, 1)
+
+    def test_followers_retry_after_transient_errors(self):
+        flights = SingleFlight()
+        crash = Leader(error=errors.WorkerCrashed('crashed'))
+
+        threads, outcomes = run_in_threads(flights, crash, 1)
+        wait_until(lambda: crash.calls == 1)
+        # joins the crashing flight, then computes on its own
+        retried = Leader(result=7)
+        retried.release.set()
+
+        follower_threads, follower_outcomes = run_in_threads(flights, retried, 1)
+        wait_until(lambda: flights.followers == 1)
+        crash.release.set()
+        for thread in threads + follower_threads:
+            thread.join()
+
+        self.assertIsInstance(outcomes[0], errors.WorkerCrashed)
+        self.assertEqual(follower_outcomes, [7])
+
+    def test_follower_gives_up_on_a_stuck_leader(self):
+        flights = SingleFlight(timeout=0.1)
+        stuck = Leader(result=1)
+
+        threads, _ = run_in_threads(flights, stuck, 1)
+        wait_until(lambda: stuck.calls == 1)
+
+        self.assertEqual(flights.run('key', lambda: 2, lambda: None), 2)
+
+        stuck.release.set()
+        threads[0].join()
+
+
+class TestSingleFlightAcrossProcesses(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'key.lock')
+        self.flights = SingleFlight(lock_dir=self.directory, timeout=5)
+
+    def test_waits_for_the_lock_holder_and_looks_up_its_result(self):
+        # flock locks of separately opened files conflict like another process' would
+        fd = singleflight._try_lock(self.path)
+        stored = []
+        compute = Leader(result='computed')
+        compute.release.set()
+
+        threads, outcomes = run_in_threads(self.flights, compute, 1, lookup=lambda: stored[0] if stored else None)
+        wait_until(lambda: self.flights.leaders == 1)
+        time.sleep(0.05)
+        stored.append('shared')
+        singleflight._release(self.path, fd)
+        threads[0].join()
+
+        self.assertEqual(outcomes, ['shared'])
+        self.assertEqual(compute.calls, 0)
+        self.assertEqual(self.flights.waits, 1)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_computes_when_the_lock_holder_stored_nothing(self):
+        fd = singleflight._try_lock(self.path)
+        threading.Timer(0.05, singleflight._release, (self.path, fd)).start()
+
+        self.assertEqual(self.flights.run('key', lambda: 'computed', lambda: None), 'computed')
+
+    def test_lock_of_a_dead_process_is_released(self):
+        pid = os.fork()
+        if pid == 0:
+            singleflight._try_lock(self.path)
+            os._exit(0)  # dies holding the lock, without unlinking its file
+        os.waitpid(pid, 0)
+
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(self.flights.run('key', lambda: 'computed', lambda: None), 'computed')
+
+
+class TestHandleRequestSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        operations.result_cache.clear()
+
+    def test_concurrent_identical_requests_compute_once(self):
+        json = {
+            'operation': 'expandExpr',
+            'expr': '(x + 5)**2',
+            'variables': ['x']
+        }
+        release = threading.Event()
+        calls = []
+
+        def executor(job):
+            calls.append(job.key)
+            release.wait(5)
+            return operations.execute(job)
+
+        followers = operations.flights.followers
+        responses = []
+        threads = [
+            threading.Thread(target=lambda: responses.append(operations.handle_request(json, executor=executor)))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: operations.flights.followers == followers + 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(responses), 3)
+        self.assertTrue(all(response == responses[0] for response in responses))
+
+    def test_disabled(self):
+        json = {
+            'operation': 'expandExpr',
+            'expr': '(x + 6)**2',
+            'variables': ['x']
+        }
+
+        with mock.patch.object(operations.flights, 'run') as run, \
+                mock.patch('symserver.config.SINGLE_FLIGHT', 0):
+            operations.handle_request(json)
+
+        run.assert_not_called()
@@ -0,0 +1,110 @@
+import math
+import time
+import unittest
+from unittest import mock
+from symserver import config
+from symserver import errors
+from symserver import operations
+from symserver import sizes
+from sympy import Add
+from sympy import expand
+from sympy import sympify
+
+
+def expand_request(expr, **params):
+    request = {'operation': 'expandExpr', 'expr': expr, 'variables': ['x', 'y', 'z']}
+    request.update(params)
+    return request
+
+
+class TestSizes(unittest.TestCase):
+
+    def test_expanded_terms(self):
+        for raw in ['(x + 1)**2*(y + 2)**3', '(x + y)**10', '(a + b + c)**3', 'sin(x)*(x + 1)**3 + x', '1/(x + 1)**2']:
+            expr = sympify(raw)
+            self.assertEqual(sizes.expanded_terms(expr), len(Add.make_args(expand(expr))), raw)
+
+        self.assertEqual(sizes.expanded_terms(sympify('(x + y + z + 1)**40')), 12341)
+
+    def test_largest_expansion(self):
+        self.assertEqual(sizes.largest_expansion(sympify('exp((x + y)**10)')), 11)
+        self.assertEqual(sizes.largest_expansion(sympify('1/(x + y + 1)**3')), 10)
+        self.assertEqual(sizes.largest_expansion(sympify('sin(x) + 1')), 2)
+
+    def test_coefficient_digits(self):
+        for raw in ['(x + 1)**100', '(3*x - 7*y/2 + 5)**30', '(x + 2)**10*(x - 3)**5']:
+            expr = sympify(raw)
+            largest = max(max(abs(term.as_coeff_Mul()[0].p), term.as_coeff_Mul()[0].q)
+                          for term in Add.make_args(expand(expr)))
+            self.assertGreaterEqual(sizes.coefficient_digits(expr), math.log10(largest), raw)
+
+        self.assertAlmostEqual(sizes.coefficient_digits(sympify('(x + 1)**1000')), 1000 * math.log10(2))
+        self.assertEqual(sizes.coefficient_digits(sympify('exp(x)*y')), 0)
+
+    def test_large_coefficients_cost_more(self):
+        small = sizes.expansion_cost(sympify('(x + 1)**1000'))
+        large = sizes.expansion_cost(sympify('(123456789*x + 987654321)**1000'))
+
+        self.assertLess(small, 1100)
+        self.assertGreater(large, 5 * small)
+
+    def test_huge_counts_are_approximate(self):
+        terms = sizes.expanded_terms(sympify('(x + y + z)**1000000 * (a + b + c + d)**100000000'))
+
+        self.assertIsInstance(terms, float)
+        self.assertGreater(terms, 1e30)
+
+
+class TestExpansionGuards(unittest.TestCase):
+
+    def setUp(self):
+        operations.result_cache.clear()
+
+    def test_refuses_expansions_over_the_limit(self):
+        for operation in ('expandExpr', 'factorExpr'):
+            with self.assertRaises(errors.RequestTooExpensive) as cm:
+                operations.handle_request(dict(expand_request('(x + y + z + 1)**400'), operation=operation))
+            self.assertIn('up to 10827401 terms', str(cm.exception))
+
+        with mock.patch('symserver.config.EXPAND_MAX_TERMS', 0):
+            operations.prepare(expand_request('(x + y + z + 1)**400'))
+
+        with self.assertRaises(errors.RequestTooExpensive) as cm:
+            operations.prepare(expand_request('(123456789*x + 987654321)**2000'))
+        self.assertIn('2001 terms of up to 18591 digits', str(cm.exception))
+
+    def test_admitted_expansions_finish_in_time(self):
+        # the largest expansions under the default limit, by terms and by digits
+        for raw in ['(x + y + z + 1)**37', '(123456789*x + 987654321)**1150']:
+            operations.prepare(expand_request(raw))
+
+            start = time.process_time()
+            operations.handle_request(expand_request(raw))
+            self.assertLess(time.process_time() - start, config.POOL_CPU_LIMIT / 2, raw)
+
+        for raw in ['(x + y + z + 1)**38', '(123456789*x + 987654321)**1200']:
+            with self.assertRaises(errors.RequestTooExpensive, msg=raw):
+                operations.prepare(expand_request(raw))
+
+    def test_summarizes_large_results(self):
+        with mock.patch('symserver.config.RESULT_MAX_TERMS', 10), mock.patch('symserver.config.RESULT_SUMMARY_TERMS', 3):
+            response = operations.handle_request(expand_request('(x + y)**12'))
+
+        self.assertTrue(response['truncated'])
+        self.assertEqual(response['terms'], 13)
+        self.assertEqual(response['resultAsPython'], 'x**12 + 12*x**11*y + 66*x**10*y**2 + ...')
+        self.assertTrue(response['resultAsLatex'].endswith(' + \\ldots'))
+
+    def test_small_results_are_whole(self):
+        response = operations.handle_request(expand_request('(x + y)**2'))
+
+        self.assertNotIn('truncated', response)
+        self.assertEqual(response['resultAsPython'], 'x**2 + 2*x*y + y**2')
+
+    def test_refuses_large_results_without_truncate(self):
+        with mock.patch('symserver.config.RESULT_MAX_TERMS', 10):
+            with self.assertRaises(errors.RequestTooExpensive):
+                operations.handle_request(expand_request('(x + y)**12', truncate=False))
+
+        with self.assertRaises(errors.InvalidParams):
+            operations.handle_request(expand_request('(x + y)**12', truncate='yes'))
@@ -0,0 +1,91 @@
+import unittest
+from unittest import mock
+from symserver import errors
+from symserver import solvers
+from symserver.operations import solveFor
+from sympy import CRootOf
+from sympy import Symbol
+from sympy import exp
+from sympy import log
+from sympy import sqrt
+
+
+class TestSolveFor(unittest.TestCase):
+
+    def setUp(self):
+        self.x = Symbol('x')
+        self.y = Symbol('y')
+
+    def assertSolves(self, expr, expected, method):
+        with mock.patch.object(solvers, 'solve', wraps=solvers.solve) as solve:
+            solutions, used = solvers.solve_for(expr, self.x)
+
+        self.assertEqual(solutions, expected)
+        self.assertEqual(used, method)
+        self.assertEqual(solve.called, method == 'solve')
+
+    def test_linear(self):
+        self.assertSolves(2 * self.x - 3 * self.y + 1, [3 * self.y / 2 - 1 / 2], 'linear')
+
+    def test_linear_cancels(self):
+        self.assertSolves(self.x * (self.y**2 - 1) - (self.y - 1), [1 / (self.y + 1)], 'linear')
+
+    def test_quadratic(self):
+        self.assertSolves(self.x**2 - 2, [-sqrt(2), sqrt(2)], 'quadratic')
+
+    def test_symbolic_coefficients_are_solved_like_solve(self):
+        a, b, c = Symbol('a'), Symbol('b'), Symbol('c')
+
+        solutions, method = solvers.solve_for(a * self.x**2 + b * self.x + c, self.x)
+
+        self.assertEqual(method, 'solve')
+        self.assertEqual(str(solutions), '[(-b + sqrt(-4*a*c + b**2))/(2*a), -(b + sqrt(-4*a*c + b**2))/(2*a)]')
+        self.assertSolves(self.x**2 - exp(self.y), [-sqrt(exp(self.y)), sqrt(exp(self.y))], 'solve')
+
+    def test_polynomial(self):
+        self.assertSolves(self.x**3 - 6 * self.x**2 + 11 * self.x - 6, [1, 2, 3], 'polynomial')
+
+    def test_polynomial_without_formula(self):
+        expected = [CRootOf(self.x**5 - self.x + 1, i) for i in range(5)]
+
+        self.assertSolves(self.x**5 - self.x + 1, expected, 'solve')
+
+    def test_not_polynomial(self):
+        self.assertSolves(exp(self.x) - self.y, [log(self.y)], 'solve')
+
+    def test_numeric(self):
+        solutions, method = solvers.solve_for(self.x**5 - self.x + 1, self.x, numeric=True)
+
+        self.assertEqual(method, 'numeric')
+        self.assertEqual(len(solutions), 5)
+        self.assertAlmostEqual(float(solutions[0]), -1.1673039782614187)
+
+    def test_numeric_needs_numeric_coefficients(self):
+        with self.assertRaises(errors.InvalidParams):
+            solvers.solve_for(self.x**2 - self.y, self.x, numeric=True)
+
+
+class TestSolveForMethod(unittest.TestCase):
+
+    def test_reports_method(self):
+        input = {
+            'expr': 'x**2 + 3*x = -2',
+            'variables': ['x'],
+            'target_var': ['x']
+        }
+
+        result = solveFor(input)
+
+        self.assertEqual(result.get('method'), 'quadratic')
+        self.assertEqual(result.get('resultAsPython'), '[-2, -1]')
+
+    def test_throws_on_bad_numeric(self):
+        input = {
+            'expr': 'x**2 = 2',
+            'variables': ['x'],
+            'target_var': ['x'],
+            'numeric': 'yes'
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            solveFor(input)
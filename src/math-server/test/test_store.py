@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+from sympy import Symbol
+from sympy import sin
+from symserver import operations
+from symserver.store import ResultStore
+from test.test_cache import FakeClock
+
+
+def put_in_child(path, key, value):
+    ResultStore(path, 1024 * 1024, version='v1').put(key, value)
+
+
+class TestResultStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'store', 'results.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def make_store(self, max_bytes=1024 * 1024, **kwargs):
+        kwargs.setdefault('version', 'v1')
+        return ResultStore(self.path, max_bytes, **kwargs)
+
+    def test_happy_path(self):
+        store = self.make_store()
+        x = Symbol('x')
+        store.put('a', dict(result=sin(x)**2, tier='manual'))
+
+        self.assertEqual(store.get('a'), dict(result=sin(x)**2, tier='manual'))
+        self.assertEqual(store.get('b'), None)
+        self.assertEqual(store.hits, 1)
+        self.assertEqual(store.misses, 1)
+
+    def test_survives_reopening(self):
+        self.make_store().put('a', [1, 2])
+
+        self.assertEqual(self.make_store().get('a'), [1, 2])
+
+    def test_ignores_other_versions(self):
+        self.make_store().put('a', 1)
+
+        self.assertEqual(self.make_store(version='v2').get('a'), None)
+
+    def test_evicts_least_recently_used(self):
+        clock = FakeClock()
+        store = self.make_store(max_bytes=2500, clock=clock, touch_interval=0)
+        for key in 'abc':
+            clock.now += 1
+            store.put(key, b'x' * 1000)
+            clock.now += 1
+            store.get('a')
+
+        self.assertIsNotNone(store.get('a'))
+        self.assertIsNone(store.get('b'))
+        self.assertIsNotNone(store.get('c'))
+        self.assertEqual(store.evictions, 1)
+
+    def test_keeps_a_running_total(self):
+        store = self.make_store(max_bytes=2500)
+        store.put('a', b'x' * 1000)
+        store.put('a', b'x' * 500)
+        for key in 'bcd':
+            store.put(key, b'x' * 700)
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+
+        total = connection.execute('SELECT size FROM totals').fetchone()[0]
+
+        self.assertEqual(total, connection.execute('SELECT sum(size) FROM results').fetchone()[0])
+        self.assertLessEqual(total, 2500)
+
+    def test_puts_under_the_limit_dont_scan(self):
+        store = self.make_store()
+        store.put('a', 1)
+        statements = []
+        store._connection().set_trace_callback(lambda statement: statements.append(statement))
+
+        store.put('b', 2)
+
+        self.assertFalse([statement for statement in statements if 'sum(size)' in statement or 'ORDER BY' in statement])
+
+    def test_skips_values_larger_than_the_store(self):
+        store = self.make_store(max_bytes=100)
+        store.put('a', b'x' * 1000)
+
+        self.assertEqual(len(store), 0)
+
+    def test_shared_across_processes(self):
+        child = multiprocessing.Process(target=put_in_child, args=(self.path, 'a', 42))
+        child.start()
+        child.join()
+
+        self.assertEqual(self.make_store().get('a'), 42)
+
+    def test_misses_on_unreadable_entries(self):
+        store = self.make_store()
+        store.put('a', 1)
+
+        connection = sqlite3.connect(self.path)
+        connection.execute('UPDATE results SET value = ?', (b'not a pickle',))
+        connection.commit()
+        connection.close()
+
+        with self.assertLogs('symserver.store', 'WARNING'):
+            self.assertEqual(store.get('a'), None)
+        self.assertEqual(store.errors, 1)
+
+
+class TestHandleRequestStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        store = ResultStore(os.path.join(self.directory, 'results.sqlite'), 1024 * 1024)
+        patcher = mock.patch.object(operations, 'result_store', store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.directory)
+        operations.result_cache.clear()
+
+    def test_result_cache_falls_back_to_store(self):
+        json = {
+            'operation': 'expandExpr',
+            'expr': '(x + 2)**2',
+            'variables': ['x']
+        }
+
+        first = operations.handle_request(json)
+        operations.result_cache.clear()
+
+        with mock.patch.object(operations, 'execute') as execute:
+            second = operations.handle_request(json)
+
+        execute.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(operations.result_store.hits, 1)
+        self.assertEqual(len(operations.result_cache), 1)
@@ -0,0 +1,138 @@
+import random
+import time
+import unittest
+from unittest import mock
+from symserver import errors
+from symserver import solvers
+from symserver.operations import solveFor
+from sympy import Rational
+from sympy import exp
+from sympy import sin
+from sympy import sqrt
+from sympy import symbols
+
+
+class TestSolveSystem(unittest.TestCase):
+
+    def setUp(self):
+        self.x, self.y, self.z, self.a, self.b = symbols('x y z a b')
+
+    def test_linear(self):
+        x, y, a, b = self.x, self.y, self.a, self.b
+
+        solutions, method = solvers.solve_system([a * x + y - 1, x - b * y - 2], [x, y])
+
+        self.assertEqual(method, 'linear')
+        self.assertEqual(solutions, [{x: (b + 2) / (a * b + 1), y: (1 - 2 * a) / (a * b + 1)}])
+
+    def test_linear_underdetermined(self):
+        x, y, z = self.x, self.y, self.z
+
+        solutions, _ = solvers.solve_system([x + 2 * y + z - 1, 2 * x + 4 * y + 2 * z - 2, x - z], [x, y, z])
+
+        self.assertEqual(solutions, [{x: z, y: Rational(1, 2) - z}])
+
+    def test_linear_inconsistent(self):
+        solutions, _ = solvers.solve_system([self.x + self.y - 1, self.x + self.y - 2], [self.x, self.y])
+
+        self.assertEqual(solutions, [])
+
+    def test_linear_large(self):
+        random.seed(1)
+        xs = symbols('x0:30')
+        exprs = [sum(random.randint(-9, 9) * x for x in xs) - random.randint(-9, 9) for _ in xs]
+
+        solutions, _ = solvers.solve_system(exprs, xs)
+
+        self.assertEqual([expr.subs(solutions[0]) for expr in exprs], [0] * len(xs))
+
+    def test_polynomial(self):
+        x, y = self.x, self.y
+
+        solutions, method = solvers.solve_system([x**2 + y**2 - 1, x - y], [x, y])
+
+        self.assertEqual(method, 'groebner')
+        self.assertEqual(solutions, [{x: -sqrt(2) / 2, y: -sqrt(2) / 2}, {x: sqrt(2) / 2, y: sqrt(2) / 2}])
+
+    def test_polynomial_underdetermined(self):
+        x, y = self.x, self.y
+
+        solutions, method = solvers.solve_system([x * y - 1], [x, y])
+
+        self.assertEqual(method, 'nonlinsolve')
+        self.assertEqual(solutions, [{x: 1 / y}])
+
+    def test_checks_nonlinsolve_solutions(self):
+        x, y = self.x, self.y
+
+        with self.assertRaises(errors.InvalidParams):
+            solvers.solve_system([sin(x) - y, x + y - 1], [x, y])
+
+    def test_refuses_solutions_which_are_sets(self):
+        with self.assertRaises(errors.InvalidParams):
+            solvers.solve_system([exp(self.x) - self.y, self.y - 2], [self.x, self.y])
+
+    def test_nonlinear(self):
+        x, y = self.x, self.y
+
+        solutions, method = solvers.solve_system([sqrt(x) - y, y - 2], [x, y])
+
+        self.assertEqual(method, 'nonlinsolve')
+        self.assertEqual(solutions, [{x: 4, y: 2}])
+
+    def test_time_budget(self):
+        def slow_nonlinsolve(exprs, targets):
+            time.sleep(5)
+
+        with mock.patch.object(solvers, 'nonlinsolve', slow_nonlinsolve), \
+                mock.patch.object(solvers.config, 'SOLVE_SYSTEM_TIMEOUT', 0.1):
+            with self.assertRaises(errors.ComputationTimeout):
+                solvers.solve_system([exp(self.x) - self.y, self.y - 2], [self.x, self.y])
+
+
+class TestSolveForSystem(unittest.TestCase):
+
+    def test_happy_path(self):
+        input = {
+            'expr': ['x + y = 3', 'x - y = 1'],
+            'variables': ['x', 'y'],
+            'target_var': ['x', 'y']
+        }
+
+        result = solveFor(input)
+
+        self.assertEqual(result.get('resultAsPython'), '[{x: 2, y: 1}]')
+        self.assertEqual(result.get('method'), 'linear')
+
+    def test_underdetermined(self):
+        input = {
+            'expr': ['x**2 + y**2 = 1'],
+            'variables': ['x', 'y'],
+            'target_var': ['x', 'y']
+        }
+
+        result = solveFor(input)
+
+        self.assertEqual(result.get('method'), 'nonlinsolve')
+        self.assertIn('{x: sqrt(-y**2 + 1)}', result.get('resultAsPython'))
+
+    def test_throws_on_repeated_target(self):
+        input = {
+            'expr': ['x + y = 3', 'x - y = 1'],
+            'variables': ['x', 'y'],
+            'target_var': ['x', 'x']
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            solveFor(input)
+
+    def test_throws_on_numeric(self):
+        input = {
+            'expr': ['x + y = 3', 'x - y = 1'],
+            'variables': ['x', 'y'],
+            'target_var': ['x', 'y'],
+            'numeric': True
+        }
+
+        with self.assertRaises(errors.InvalidParams):
+            solveFor(input)
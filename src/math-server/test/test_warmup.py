@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from symserver import warmup
+from symserver.app import app
+
+
+class WarmupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(warmup, _state='cold', _timings={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestWarmUp(WarmupTestCase):
+
+    def test_times_phases(self):
+        timings = warmup.warm_up([
+            {'operation': 'derivative', 'expr': 'x**2', 'variables': ['x'], 'wrt': ['x']},
+            {'operation': 'expandExpr', 'expr': '(x + 1)**2', 'variables': ['x']},
+        ])
+
+        self.assertEqual(set(timings), {'import', 'derivative', 'expandExpr', 'total'})
+        self.assertTrue(warmup.is_ready())
+
+    def test_survives_failing_requests(self):
+        timings = warmup.warm_up([{'operation': 'foo'}])
+
+        self.assertIn('foo', timings)
+        self.assertTrue(warmup.is_ready())
+
+    def test_runs_once(self):
+        with mock.patch.object(warmup.operations, 'handle_request') as handle_request:
+            warmup.warm_up([{'operation': 'foo'}])
+            warmup.warm_up([{'operation': 'foo'}])
+
+        self.assertEqual(handle_request.call_count, 1)
+
+    def test_default_requests_succeed(self):
+        with mock.patch.object(warmup.logger, 'exception') as log:
+            warmup.warm_up()
+
+        log.assert_not_called()
+
+    def test_requests_file(self):
+        requests = [{'operation': 'factorExpr', 'expr': 'x**2 - 1', 'variables': ['x']}]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(requests, f)
+        self.addCleanup(os.remove, f.name)
+
+        with mock.patch.object(warmup.config, 'WARMUP_REQUESTS', f.name):
+            self.assertEqual(warmup.load_requests(), requests)
+
+
+class TestHealth(WarmupTestCase):
+
+    def test_not_ready_while_warming(self):
+        client = app.test_client()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_request(request_json):
+            started.set()
+            release.wait(5)
+
+        with mock.patch.object(warmup.operations, 'handle_request', slow_request):
+            thread = warmup.start()
+            started.wait(5)
+            warming = client.get('/_health')
+            release.set()
+            thread.join(5)
+
+        self.assertEqual(warming.status_code, 503)
+        self.assertEqual(warming.get_json(), {'ready': False})
+
+        res = client.get('/_health')
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.get_json()['ready'])
+        self.assertIn('total', res.get_json()['warmup'])
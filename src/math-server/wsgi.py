@@ -1,4 +1,10 @@
+from symserver import config
+from symserver import warmup
 from symserver.app import app
 
+# with gunicorn's preload_app this runs once, in the master, before it forks the workers
+if config.WARMUP:
+    warmup.warm_up()
+
 if __name__ == "__main__":
     app.run()